@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Benchmark BM25 retrieval against exhaustive scoring.
+
+For every indexed CSV and every benchmark query this times exhaustive
+retrieval (``BM25.score`` over the whole corpus, sorted, first k kept)
+against ``BM25.top_k`` (MaxScore pruning), checks that both return the same
+ranking, and reports latency and the number of documents fully scored.
+It also times the approximate --fast path (``BM25.fast_top_k`` over 8-bit
+quantised impacts with an early-termination budget) and reports its
+recall@k against the exact ranking, and times ``BM25.score_many`` ranking
+every query in one batch against the summed per-query ``top_k`` calls
+(postings are decoded before either is timed, so neither pays for it).
+With the mapped engine the SQLite FTS5 backend (``--backend sqlite``) is
+timed too, and its top k is compared with the exact ranking (overlap@k;
+FTS5's bm25() uses a different IDF, so small differences are expected).
+
+The shipped corpora are small, so --scale N replicates every corpus N times
+to show how pruning behaves on larger data packs.  Exits non-zero if any
+ranking differs from the exhaustive one.
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src" / "mobile-best-practices" / "scripts"))
+import core  # noqa: E402
+
+# CI smoke-test queries and the SKILL.md examples
+QUERIES = [
+    "Add search function for search viewmodel", "Refactor screen Search", "add push notification firebase",
+    "android compose viewmodel", "anr main thread", "api key hardcoded reverse engineer", "app crash on rotation",
+    "battery drain background work", "bloc cubit state flutter", "build bottom navigation tab bar",
+    "clean architecture usecase repository", "code smell switch if-else", "compose bom hilt", "compose lazy startup",
+    "compose state hoisting", "compose state lifecycle", "dark mode theme", "handle camera permission runtime",
+    "hilt dependency injection viewmodel", "hilt room retrofit", "how to handle network error retry",
+    "how to store user token securely", "implement login screen with biometric", "implement offline mode cache data",
+    "lazycolumn scroll performance slow", "memory leak android", "memory leak context", "mvvm clean",
+    "mvvm mvi state flow android", "redux hooks navigation react native", "repository factory",
+    "root detection tamper jailbreak", "security", "ssl pinning certificate", "startup time cold launch optimize",
+    "state recomposition lifecycle", "storage encryption api key", "swiftui combine viewmodel", "swiftui navigation",
+    "ui test compose espresso", "unit test viewmodel coroutine mock", "viewmodel hilt", "viewmodel repository",
+]
+
+
+def load_engines(scale, engine):
+    """(name, bm25, csv path, search cols) per indexed CSV."""
+    engines = []
+    for path, cols in core.index_sources():
+        if not path.exists():
+            continue
+        index = core.CsvIndex(path, cols)
+        if engine == "mapped":
+            bm25 = index.bm25
+        else:
+            bm25 = core.BM25()
+            bm25.fit(list(index.documents) * scale)
+        engines.append((str(path.relative_to(core.DATA_DIR)), bm25, path, cols))
+    return engines
+
+
+def timed(fn, repeat):
+    """(result, best-of-*repeat* seconds)."""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def bench(engines, queries, k, repeat, budget, sqlite=None):
+    exhaustive_ms, topk_ms, fast_ms, recalls, mismatches = [], [], [], [], []
+    sqlite_ms, sqlite_overlaps = [], []
+    total_docs = scored_docs = 0
+    batch_ms = 0.0
+    for name, bm25, path, cols in engines:
+        cleaned = [core.clean_query(query) for query in queries]
+        for query in cleaned:
+            bm25.top_k(query, k)  # decode the postings and bounds once, outside the timings
+        batch, t_batch = timed(lambda: bm25.score_many(cleaned, k), repeat)
+        batch_ms += t_batch * 1000
+        if batch != [bm25.top_k(query, k) for query in cleaned]:
+            mismatches.append(f"{name}: score_many (k={k})")
+        for query in queries:
+            query = core.clean_query(query)
+            expected, t_full = timed(lambda: [hit for hit in bm25.score(query)[:k] if hit[1] > 0], repeat)
+            stats = {}
+            got, t_topk = timed(lambda: bm25.top_k(query, k, stats), repeat)
+            if got != expected:
+                mismatches.append(f"{name}: {query!r} (k={k})")
+            approx, t_fast = timed(lambda: bm25.fast_top_k(query, k, budget), repeat)
+            if expected:
+                recalls.append(len({doc for doc, _ in approx} & {doc for doc, _ in expected}) / len(expected))
+            if sqlite is not None:
+                ranked, t_sqlite = timed(lambda: sqlite.rank(path, cols, query, k), repeat)
+                sqlite_ms.append(t_sqlite * 1000)
+                if expected:
+                    sqlite_overlaps.append(len({doc for doc, _ in ranked} & {doc for doc, _ in expected}) / len(expected))
+            exhaustive_ms.append(t_full * 1000)
+            topk_ms.append(t_topk * 1000)
+            fast_ms.append(t_fast * 1000)
+            total_docs += bm25.N
+            scored_docs += stats["scored"]
+    return {
+        "k": k,
+        "queries": len(exhaustive_ms),
+        "docs_exhaustive": total_docs,
+        "docs_scored": scored_docs,
+        "docs_scored_pct": round(100 * scored_docs / max(total_docs, 1), 2),
+        "exhaustive_ms": {"p50": round(statistics.median(exhaustive_ms), 4), "total": round(sum(exhaustive_ms), 2)},
+        "top_k_ms": {"p50": round(statistics.median(topk_ms), 4), "total": round(sum(topk_ms), 2)},
+        "speedup": round(sum(exhaustive_ms) / max(sum(topk_ms), 1e-9), 2),
+        "fast_ms": {"p50": round(statistics.median(fast_ms), 4), "total": round(sum(fast_ms), 2)},
+        "fast_recall": round(statistics.mean(recalls), 4) if recalls else None,
+        "batch_ms": {"total": round(batch_ms, 2)},
+        "batch_speedup": round(sum(topk_ms) / max(batch_ms, 1e-9), 2),
+        "sqlite_ms": {"p50": round(statistics.median(sqlite_ms), 4), "total": round(sum(sqlite_ms), 2)} if sqlite_ms else None,
+        "sqlite_overlap": round(statistics.mean(sqlite_overlaps), 4) if sqlite_overlaps else None,
+        "mismatches": mismatches,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark top-k BM25 retrieval against exhaustive scoring")
+    parser.add_argument("-k", default="5,15,30", help="Comma-separated result counts to benchmark (default: 5,15,30)")
+    parser.add_argument("--scale", type=int, default=1, help="Replicate every corpus N times, fitted in memory (default: 1)")
+    parser.add_argument("--engine", choices=["mapped", "memory"], default="mapped",
+                        help="Use the mapped index files or a BM25 fitted in memory (default: mapped)")
+    parser.add_argument("--budget", type=int, default=core.FAST_POSTINGS_BUDGET,
+                        help=f"Postings budget for the --fast path (default: {core.FAST_POSTINGS_BUDGET})")
+    parser.add_argument("--repeat", type=int, default=3, help="Timing repetitions per query, best kept (default: 3)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    if args.scale > 1:
+        args.engine = "memory"
+    engines = load_engines(args.scale, args.engine)
+    # The SQLite database holds the shipped corpora only, so it is compared with the mapped engine
+    sqlite = core.KnowledgeBase(backend="sqlite").sqlite_index() if args.engine == "mapped" else None
+    results = [bench(engines, QUERIES, int(k), args.repeat, args.budget, sqlite) for k in args.k.split(",")]
+
+    if args.json:
+        print(json.dumps({"scale": args.scale, "engine": args.engine, "results": results}, indent=2))
+    else:
+        print(f"{len(engines)} corpora × {len(QUERIES)} queries, scale ×{args.scale}, {args.engine} engine\n")
+        print(f"{'k':>4}  {'docs scored':>22}  {'exhaustive p50':>15}  {'top_k p50':>10}  {'speedup':>8}"
+              f"  {'fast p50':>10}  {'fast recall':>11}  {'batch total':>12}  {'vs top_k':>8}  {'sqlite p50':>10}  {'sqlite overlap':>14}")
+        for r in results:
+            scored = f"{r['docs_scored']}/{r['docs_exhaustive']} ({r['docs_scored_pct']}%)"
+            recall = "n/a" if r["fast_recall"] is None else f"{r['fast_recall']:.3f}"
+            print(f"{r['k']:>4}  {scored:>22}  {r['exhaustive_ms']['p50']:>12.3f} ms  "
+                  f"{r['top_k_ms']['p50']:>7.3f} ms  {r['speedup']:>7.2f}×  {r['fast_ms']['p50']:>7.3f} ms  {recall:>11}  "
+                  f"{r['batch_ms']['total']:>9.2f} ms  {r['batch_speedup']:>7.2f}×  "
+                  + (f"{r['sqlite_ms']['p50']:>7.3f} ms  {r['sqlite_overlap']:>14.3f}" if r["sqlite_ms"] else f"{'n/a':>10}  {'n/a':>14}"))
+    mismatches = [m for r in results for m in r["mismatches"]]
+    for m in mismatches:
+        print(f"  ✗  ranking differs from exhaustive scoring: {m}", file=sys.stderr)
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Build the prebuilt search indexes shipped next to the CSV data.
+
+For every domain and platform CSV this writes the memory-mapped index file
+that core.py opens instead of fitting BM25 at query time (postings, doc
+lengths, row offsets, the bigram table used by --fuzzy and the Platform
+facet), into data/.index/, together with a manifest.json recording the
+format version and the SHA-256 of every source CSV.  It then computes the
+relation graph linking rows across all the CSVs (shared rare terms and
+library names, on compatible platforms) that ``search.py --related`` and
+blueprint generation follow, and writes it as data/.index/relations.bin.
+
+Files are built in parallel across a process pool; indexes that are already
+current are skipped unless --force is given.  --check builds nothing and
+exits non-zero if any index or the relation graph is missing or stale.  --sqlite also compiles
+every CSV into data/.index/search.sqlite, the FTS5 database used by
+``search.py --backend sqlite``.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src" / "mobile-best-practices" / "scripts"))
+import core  # noqa: E402
+
+MANIFEST_NAME = "manifest.json"
+
+
+def build_one(rel_path, search_cols, data_dir):
+    start = time.perf_counter()
+    entry = core.build_index_file(Path(data_dir) / rel_path, search_cols)
+    entry["seconds"] = round(time.perf_counter() - start, 4)
+    return entry
+
+
+def stale_sources(sources, data_dir):
+    """Relative paths of the sources whose index file is missing or out of date."""
+    return [rel for rel, cols in sources if core._open_index_file(Path(data_dir) / rel, cols) is None]
+
+
+def write_manifest(data_dir, entries):
+    """Write data/.index/manifest.json, keeping entries of indexes not rebuilt."""
+    path = Path(data_dir) / core.INDEX_DIR_NAME / MANIFEST_NAME
+    try:
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        manifest = {}
+    if manifest.get("format_version") != core.INDEX_FORMAT_VERSION:
+        manifest = {"indexes": {}}
+    manifest["format_version"] = core.INDEX_FORMAT_VERSION
+    manifest["generated"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    for rel, entry in entries.items():
+        manifest["indexes"][rel] = {k: v for k, v in entry.items() if k != "seconds"}
+    manifest["indexes"] = dict(sorted(manifest["indexes"].items()))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{MANIFEST_NAME}.tmp")
+    tmp.write_text(json.dumps(manifest, indent=2) + "\n", encoding="utf-8")
+    os.replace(tmp, path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the prebuilt search indexes for the CSV data")
+    parser.add_argument("--data-dir", type=Path, default=core.DATA_DIR, help="Data directory to index (default: src/mobile-best-practices/data)")
+    parser.add_argument("--jobs", "-j", type=int, default=None, help="Worker processes (default: CPU count, 1 = no pool)")
+    parser.add_argument("--force", action="store_true", help="Rebuild every index, even if it is current")
+    parser.add_argument("--check", action="store_true", help="Build nothing; exit 1 if any index is missing or stale")
+    parser.add_argument("--sqlite", action="store_true", help="Also compile the SQLite FTS5 database for --backend sqlite")
+    args = parser.parse_args()
+
+    sources = [(str(path.relative_to(core.DATA_DIR)), cols) for path, cols in core.index_sources()]
+    sources = [(rel, cols) for rel, cols in sources if (args.data_dir / rel).exists()]
+
+    if args.check:
+        stale = stale_sources(sources, args.data_dir)
+        for rel in stale:
+            print(f"  ✗  {rel}: index missing or stale")
+        graph_current = core.relation_graph_current(args.data_dir)
+        if not graph_current:
+            print(f"  ✗  {core.RELATION_GRAPH_NAME}: relation graph missing or stale")
+        if stale or not graph_current:
+            print(f"\n{len(stale) + (not graph_current)} of {len(sources) + 1} files need rebuilding: python3 scripts/build-index.py")
+            sys.exit(1)
+        print(f"✓ All {len(sources)} indexes and the relation graph are current")
+        return
+
+    start = time.perf_counter()
+    pending = sources if args.force else [(rel, cols) for rel, cols in sources
+                                          if rel in set(stale_sources(sources, args.data_dir))]
+    jobs = args.jobs or os.cpu_count() or 1
+    if jobs > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(pending))) as pool:
+            futures = {rel: pool.submit(build_one, rel, cols, args.data_dir) for rel, cols in pending}
+            entries = {rel: future.result() for rel, future in futures.items()}
+    else:
+        entries = {rel: build_one(rel, cols, args.data_dir) for rel, cols in pending}
+
+    for rel, _ in sources:
+        entry = entries.get(rel)
+        if entry is None:
+            print(f"  --  {rel} (current)")
+        else:
+            print(f"  OK  {rel} → {entry['index']} ({entry['rows']} rows, {entry['terms']} terms, "
+                  f"{entry['bytes'] / 1024:.1f} KB, {entry['seconds'] * 1000:.0f} ms)")
+    manifest = write_manifest(args.data_dir, entries)
+    print(f"\nBuilt {len(entries)} of {len(sources)} indexes in {time.perf_counter() - start:.2f}s; manifest: {manifest}")
+
+    if args.force or entries or not core.relation_graph_current(args.data_dir):
+        start = time.perf_counter()
+        graph = core.build_relation_graph(args.data_dir)
+        print(f"Relation graph: {graph['nodes']} rows, {graph['edges']} links in {time.perf_counter() - start:.2f}s "
+              f"({graph['bytes'] / 1024:.1f} KB): {graph['index']}")
+    else:
+        print("Relation graph: current")
+
+    if args.sqlite:
+        start = time.perf_counter()
+        if args.force:
+            (args.data_dir / core.INDEX_DIR_NAME / core.SQLITE_INDEX_NAME).unlink(missing_ok=True)
+        db = core.build_sqlite_index(args.data_dir)
+        print(f"SQLite: compiled {len(db['compiled'])} of {db['sources']} sources in {time.perf_counter() - start:.2f}s "
+              f"({db['bytes'] / 1024:.1f} KB): {db['index']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,35 @@
 #!/usr/bin/env python3
 """
 Check all Reference URLs and Docs URLs in CSVs return HTTP 200.
-Runs with concurrency to be fast. Skips empty URLs and non-http entries.
+Runs on asyncio with keep-alive connections pooled per host, per-host and
+global concurrency limits, and retries with backoff, so large hosts such as
+developer.android.com are not hammered.  Skips empty URLs and non-http entries.
+
+Results are cached (status, time, ETag, Last-Modified): a run only checks new
+URLs, URLs whose cache entry expired, and URLs that failed last time; expired
+URLs are revalidated with conditional requests.  --changed-since <git-ref>
+further limits the run to CSV rows added or edited since that ref.
 Exits with code 1 if any URL returns 4xx/5xx.
 """
 
+import argparse
+import asyncio
 import csv
+import io
+import json
+import os
+import random
+import ssl
+import subprocess
 import sys
-import urllib.request
-import urllib.error
+import time
+from collections import Counter
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urljoin, urlsplit
 
 DATA_DIR = Path(__file__).parent.parent / "src" / "mobile-best-practices" / "data"
+CACHE_FILE = Path(__file__).parent.parent / ".url-cache.json"
+CACHE_TTL_DAYS = 7
 
 # (relative_path, url_column_name)
 FILES_TO_CHECK = [
@@ -49,16 +66,57 @@ HEADERS = {
 }
 
 TIMEOUT = 10
+GLOBAL_CONCURRENCY = 32     # requests in flight across all hosts
+PER_HOST_CONCURRENCY = 4    # requests (and pooled connections) per host
+MAX_RETRIES = 3             # extra attempts on timeouts, 429 and 5xx
+BACKOFF_BASE = 0.5          # seconds; doubles per attempt, plus jitter
+MAX_BACKOFF = 30.0
+MAX_REDIRECTS = 5
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Status codes meaning "this host does not answer HEAD properly"; the host is
+# then switched to GET for every later URL instead of paying two round trips each
+HEAD_REJECTED = {403, 405, 501}
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+# GET bodies larger than this are not drained; the connection is dropped instead
+MAX_DRAIN_BYTES = 256 * 1024
+
+_NETWORK_ERRORS = (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError)
+
+
+def _rows_at_ref(ref, rel_path):
+    """Rows of a data CSV as of git *ref* (empty if the file did not exist there)."""
+    proc = subprocess.run(
+        ["git", "-C", str(DATA_DIR), "show", f"{ref}:./{rel_path}"],
+        capture_output=True, text=True, encoding="utf-8",
+    )
+    if proc.returncode != 0:
+        if "exists on disk, but not in" in proc.stderr or "does not exist in" in proc.stderr:
+            return []
+        raise RuntimeError(f"git show {ref}:{rel_path} failed: {proc.stderr.strip()}")
+    return list(csv.DictReader(io.StringIO(proc.stdout)))
+
+
+def _row_key(row):
+    """Hashable identity of a parsed row (extra unnamed fields arrive as a list)."""
+    return tuple(tuple(v) if isinstance(v, list) else v for v in row.values())
+
 
+def collect_urls(changed_since=None):
+    """Return list of (url, source_label) tuples.
 
-def collect_urls():
-    """Return list of (url, source_label) tuples."""
+    With *changed_since* (a git ref), only rows that are not present verbatim
+    in that revision of the file — i.e. added or edited rows — are included.
+    """
     seen = set()
     results = []
+    old_rows = {}
     for rel_path, col in FILES_TO_CHECK:
         filepath = DATA_DIR / rel_path
         if not filepath.exists():
             continue
+        if changed_since is not None and rel_path not in old_rows:
+            old_rows[rel_path] = Counter(_row_key(row) for row in _rows_at_ref(changed_since, rel_path))
         with open(filepath, encoding="utf-8") as f:
             reader = csv.DictReader(f)
             for i, row in enumerate(reader, 2):
@@ -67,59 +125,358 @@ def collect_urls():
                     continue
                 if url in seen:
                     continue
+                if changed_since is not None and old_rows[rel_path][_row_key(row)]:
+                    continue  # row unchanged since the ref
                 seen.add(url)
                 results.append((url, f"{rel_path}:{col}:row{i}"))
     return results
 
 
-def check_url(url, label):
-    """Returns (url, label, status_code, ok)."""
-    from urllib.parse import urlparse
-    domain = urlparse(url).netloc.lower()
-    if any(skip in domain for skip in SKIP_DOMAINS):
-        return url, label, 0, True  # skip, treated as OK
-
+def load_cache(path):
+    """URL -> {status, ok, checked, etag, last_modified}; empty if missing or unreadable."""
     try:
-        req = urllib.request.Request(url, headers=HEADERS, method="HEAD")
-        with urllib.request.urlopen(req, timeout=TIMEOUT) as resp:
-            code = resp.status
-            return url, label, code, code < 400
-    except urllib.error.HTTPError as e:
-        # Try GET if HEAD not allowed
-        if e.code in (405, 403):
+        with open(path, encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def save_cache(path, cache):
+    """Write the cache atomically so an interrupted run never leaves it corrupt."""
+    tmp = Path(f"{path}.tmp")
+    tmp.write_text(json.dumps(cache, indent=1, sort_keys=True) + "\n", encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def needs_check(entry, now, ttl_seconds):
+    """New, expired, or previously failing URLs are checked; fresh successes are not."""
+    return not entry or not entry.get("ok") or now - entry.get("checked", 0) > ttl_seconds
+
+
+class HostStats:
+    """Request timing and error counters for one host."""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.connections = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def record(self, elapsed):
+        self.requests += 1
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+
+
+class HostPool:
+    """Keep-alive HTTP/1.1 connections to one scheme://host:port.
+
+    At most *limit* requests run against the host at once; each holds one
+    connection, which goes back to the idle list when the response was read
+    cleanly so the next request skips the TCP/TLS handshake.
+    """
+
+    def __init__(self, scheme, host, port, limit, timeout, ssl_context):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.ssl_context = ssl_context if scheme == "https" else None
+        self.semaphore = asyncio.Semaphore(limit)
+        self.idle = []
+        self.head_ok = True
+        self.stats = HostStats()
+        default_port = 443 if scheme == "https" else 80
+        self.host_header = host if port == default_port else f"{host}:{port}"
+
+    async def _connect(self):
+        self.stats.connections += 1
+        return await asyncio.wait_for(
+            asyncio.open_connection(
+                self.host, self.port, ssl=self.ssl_context,
+                server_hostname=self.host if self.ssl_context else None,
+            ),
+            self.timeout,
+        )
+
+    async def request(self, method, target, global_semaphore, extra_headers=None):
+        """Send one request; returns (status, lowercase headers dict)."""
+        async with self.semaphore, global_semaphore:
+            start = time.monotonic()
             try:
-                req = urllib.request.Request(url, headers=HEADERS)
-                with urllib.request.urlopen(req, timeout=TIMEOUT) as resp:
-                    code = resp.status
-                    return url, label, code, code < 400
-            except Exception:
-                pass
-        return url, label, e.code, e.code < 400
-    except Exception as e:
-        return url, label, 0, False
+                if self.idle:
+                    # The server may have closed a pooled connection while it sat
+                    # idle; that fails immediately, so fall back to a fresh one.
+                    try:
+                        return await self._exchange(self.idle.pop(), method, target, extra_headers)
+                    except asyncio.TimeoutError:
+                        raise  # a slow server, not a stale connection
+                    except (OSError, asyncio.IncompleteReadError):
+                        pass
+                return await self._exchange(await self._connect(), method, target, extra_headers)
+            except _NETWORK_ERRORS:
+                self.stats.errors += 1
+                raise
+            finally:
+                self.stats.record(time.monotonic() - start)
 
+    async def _exchange(self, conn, method, target, extra_headers=None):
+        reader, writer = conn
+        head = [f"{method} {target} HTTP/1.1", f"Host: {self.host_header}", "Accept: */*"]
+        head += [f"{k}: {v}" for k, v in HEADERS.items()]
+        head += [f"{k}: {v}" for k, v in (extra_headers or {}).items()]
+        try:
+            writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+            await writer.drain()
+            status, headers = await asyncio.wait_for(_read_head(reader), self.timeout)
+            reusable = await asyncio.wait_for(_drain_body(reader, method, status, headers), self.timeout)
+        except BaseException:
+            writer.close()
+            raise
+        if reusable and headers.get("connection", "").lower() != "close":
+            self.idle.append(conn)
+        else:
+            writer.close()
+        return status, headers
+
+    def close(self):
+        for _, writer in self.idle:
+            writer.close()
+        self.idle.clear()
+
+
+async def _read_head(reader):
+    """Parse the status line and headers of an HTTP/1.x response."""
+    line = await reader.readline()
+    if not line:
+        raise ConnectionResetError("connection closed before response")
+    parts = line.decode("latin-1").split(None, 2)
+    if len(parts) < 2 or not parts[0].startswith("HTTP/"):
+        raise ValueError(f"bad status line: {line[:80]!r}")
+    status = int(parts[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return status, headers
+
+
+async def _drain_body(reader, method, status, headers):
+    """Consume the response body; returns False when the connection can't be reused."""
+    if method == "HEAD" or 100 <= status < 200 or status in (204, 304):
+        return True
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        total = 0
+        while True:
+            size = int((await reader.readline()).split(b";")[0].strip() or b"0", 16)
+            if size == 0:
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass  # trailers
+                return True
+            total += size
+            if total > MAX_DRAIN_BYTES:
+                return False
+            await reader.readexactly(size + 2)
+    if "content-length" in headers:
+        length = int(headers["content-length"])
+        if length > MAX_DRAIN_BYTES:
+            return False
+        await reader.readexactly(length)
+        return True
+    return False  # body delimited by connection close
 
-def main():
-    urls = collect_urls()
-    print(f"Checking {len(urls)} unique URLs (concurrency=10)...\n")
+
+def _retry_after(headers, attempt, backoff):
+    """Seconds to wait before retrying: Retry-After if given, else jittered backoff."""
+    value = headers.get("retry-after", "") if headers else ""
+    if value.isdigit():
+        return min(float(value), MAX_BACKOFF)
+    return min(backoff * (2 ** attempt), MAX_BACKOFF) * (0.5 + random.random() / 2)
+
+
+class UrlChecker:
+    """Checks URLs over per-host keep-alive pools with global and per-host limits."""
+
+    def __init__(self, concurrency=GLOBAL_CONCURRENCY, per_host=PER_HOST_CONCURRENCY,
+                 retries=MAX_RETRIES, timeout=TIMEOUT, backoff=BACKOFF_BASE, skip_domains=SKIP_DOMAINS):
+        self.per_host = per_host
+        self.retries = retries
+        self.timeout = timeout
+        self.backoff = backoff
+        self.skip_domains = skip_domains
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.ssl_context = ssl.create_default_context()
+        self.pools = {}
+        self.validators = {}  # url -> {"etag", "last_modified"} of the final response
+
+    def _pool(self, url):
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        port = parts.port or (443 if scheme == "https" else 80)
+        key = (scheme, parts.hostname, port)
+        if key not in self.pools:
+            self.pools[key] = HostPool(scheme, parts.hostname, port, self.per_host, self.timeout, self.ssl_context)
+        return self.pools[key]
+
+    async def _request(self, pool, method, target, extra_headers=None):
+        """One request with retries on network errors, 429 and 5xx."""
+        for attempt in range(self.retries + 1):
+            headers = None
+            try:
+                status, headers = await pool.request(method, target, self.semaphore, extra_headers)
+                if status not in RETRY_STATUSES or attempt == self.retries:
+                    return status, headers
+            except _NETWORK_ERRORS:
+                if attempt == self.retries:
+                    raise
+            pool.stats.retries += 1
+            await asyncio.sleep(_retry_after(headers, attempt, self.backoff))
+
+    async def fetch_status(self, url, conditional=None):
+        """Final (status, headers) of *url* after redirects (HEAD, or GET on hosts that reject HEAD).
+
+        *conditional* holds the cached ETag / Last-Modified, sent as
+        If-None-Match / If-Modified-Since so unchanged pages answer 304.
+        """
+        extra = {}
+        if conditional:
+            if conditional.get("etag"):
+                extra["If-None-Match"] = conditional["etag"]
+            if conditional.get("last_modified"):
+                extra["If-Modified-Since"] = conditional["last_modified"]
+        status, headers = 0, {}
+        for _ in range(MAX_REDIRECTS + 1):
+            pool = self._pool(url)
+            parts = urlsplit(url)
+            target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+            method = "HEAD" if pool.head_ok else "GET"
+            status, headers = await self._request(pool, method, target, extra)
+            if method == "HEAD" and status in HEAD_REJECTED:
+                pool.head_ok = False
+                status, headers = await self._request(pool, "GET", target, extra)
+            if status in REDIRECT_STATUSES and headers.get("location"):
+                url = urljoin(url, headers["location"])
+                extra = {}  # validators belong to the original URL
+                continue
+            return status, headers
+        return status, headers
+
+    async def check(self, url, label, conditional=None):
+        """Returns (url, label, status_code, ok)."""
+        domain = urlsplit(url).netloc.lower()
+        if any(skip in domain for skip in self.skip_domains):
+            return url, label, 0, True  # skip, treated as OK
+        try:
+            code, headers = await self.fetch_status(url, conditional)
+        except _NETWORK_ERRORS:
+            return url, label, 0, False
+        if code == 304 and conditional:
+            self.validators[url] = {"etag": conditional.get("etag", ""), "last_modified": conditional.get("last_modified", "")}
+        else:
+            self.validators[url] = {"etag": headers.get("etag", ""), "last_modified": headers.get("last-modified", "")}
+        return url, label, code, code < 400
+
+    def close(self):
+        for pool in self.pools.values():
+            pool.close()
+
+    def host_stats(self):
+        """(host, HostStats) pairs, slowest total time first."""
+        stats = [(pool.host_header, pool.stats) for pool in self.pools.values()]
+        return sorted(stats, key=lambda item: item[1].total_time, reverse=True)
+
+
+async def check_urls(urls, checker=None, cache=None):
+    """Check (url, label) pairs concurrently; yields results as they complete.
+
+    With *cache*, cached ETag / Last-Modified values are sent as conditional
+    request headers.
+    """
+    checker = checker or UrlChecker()
+    cache = cache or {}
+    try:
+        for future in asyncio.as_completed([checker.check(url, label, cache.get(url)) for url, label in urls]):
+            yield await future
+    finally:
+        checker.close()
+
+
+async def run(args):
+    try:
+        all_urls = collect_urls(changed_since=args.changed_since)
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        sys.exit(2)
+
+    cache = {} if args.no_cache else load_cache(args.cache)
+    now = time.time()
+    ttl_seconds = args.ttl_days * 86400
+    urls = [(url, label) for url, label in all_urls if needs_check(cache.get(url), now, ttl_seconds)]
+
+    checker = UrlChecker(concurrency=args.concurrency, per_host=args.per_host,
+                         retries=args.retries, timeout=args.timeout)
+    scope = f" changed since {args.changed_since}" if args.changed_since else ""
+    print(f"Checking {len(urls)} of {len(all_urls)} unique URLs{scope} "
+          f"({len(all_urls) - len(urls)} fresh in cache; concurrency={args.concurrency}, per-host={args.per_host})...\n")
 
     broken = []
     ok_count = 0
     skip_count = 0
+    start = time.monotonic()
+
+    async for url, label, code, ok in check_urls(urls, checker, cache):
+        if code == 0 and ok:
+            skip_count += 1
+            continue  # bot-blocked domains are never cached
+        entry = {"status": code, "ok": ok, "checked": now}
+        entry.update(checker.validators.get(url, {}))
+        cache[url] = entry
+        if ok:
+            ok_count += 1
+        else:
+            broken.append((url, label, code))
+            print(f"  FAIL [{code}] {url}\n       ({label})")
+
+    print(f"\n✓ OK: {ok_count}  |  skipped (bot-blocked domains): {skip_count}  |  broken: {len(broken)}"
+          f"  |  cached: {len(all_urls) - len(urls)}  |  {time.monotonic() - start:.1f}s")
+
+    if not args.no_cache:
+        if not args.changed_since:
+            # A full run saw every URL in the data; forget ones that were removed
+            current = {url for url, _ in all_urls}
+            cache = {url: entry for url, entry in cache.items() if url in current}
+        save_cache(args.cache, cache)
+
+    print(f"\nPer-host timing (top {args.top_hosts} by total time):")
+    print(f"  {'host':<40} {'reqs':>5} {'conns':>5} {'retry':>5} {'err':>4} {'avg ms':>7} {'max ms':>7} {'total s':>8}")
+    for host, st in checker.host_stats()[:args.top_hosts]:
+        avg = st.total_time / st.requests * 1000 if st.requests else 0.0
+        print(f"  {host:<40} {st.requests:>5} {st.connections:>5} {st.retries:>5} {st.errors:>4} "
+              f"{avg:>7.0f} {st.max_time * 1000:>7.0f} {st.total_time:>8.1f}")
+
+    return broken
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check Reference/Docs/Source URLs in the CSV data")
+    parser.add_argument("--concurrency", type=int, default=GLOBAL_CONCURRENCY, help="Requests in flight across all hosts")
+    parser.add_argument("--per-host", type=int, default=PER_HOST_CONCURRENCY, help="Requests in flight per host")
+    parser.add_argument("--retries", type=int, default=MAX_RETRIES, help="Retries on timeouts, 429 and 5xx")
+    parser.add_argument("--timeout", type=float, default=TIMEOUT, help="Per-request timeout in seconds")
+    parser.add_argument("--top-hosts", type=int, default=10, help="Hosts shown in the timing table")
+    parser.add_argument("--cache", type=Path, default=CACHE_FILE, help=f"Result cache file (default: {CACHE_FILE.name} at the repo root)")
+    parser.add_argument("--ttl-days", type=float, default=CACHE_TTL_DAYS, help="Recheck cached successes older than this")
+    parser.add_argument("--no-cache", action="store_true", help="Check every URL and leave the cache untouched")
+    parser.add_argument("--changed-since", metavar="GIT_REF", help="Only check URLs in rows added or edited since this git ref")
+    args = parser.parse_args()
 
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        futures = {executor.submit(check_url, url, label): url for url, label in urls}
-        for future in as_completed(futures):
-            url, label, code, ok = future.result()
-            if code == 0 and ok:
-                skip_count += 1
-            elif ok:
-                ok_count += 1
-            else:
-                broken.append((url, label, code))
-                print(f"  FAIL [{code}] {url}\n       ({label})")
-
-    print(f"\n✓ OK: {ok_count}  |  skipped (bot-blocked domains): {skip_count}  |  broken: {len(broken)}")
+    broken = asyncio.run(run(args))
 
     if broken:
         print(f"\n{len(broken)} broken URLs — fix or remove them:")
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Evaluate search relevance and latency against a labelled query set.
+
+scripts/eval/queries.json maps each query (seeded from the CI smoke tests
+and the SKILL.md examples) to the rows a good ranking should return, by
+title, with a graded relevance of 2 (what the query asks for) or 1 (useful
+context).  A query runs against one ``domain``, a ``platform``'s guidelines,
+or every domain (``"domain": "all"``, titles written ``domain/Title``).
+
+Every query is run in every engine mode -- exact BM25, --fuzzy, --fast and
+the SQLite FTS5 backend -- and each mode reports the mean NDCG@k, recall@k
+and MRR over the set together with its p50 / p95 latency.  The means are
+compared with scripts/eval/baseline.json: the script exits non-zero if any
+of them drops by more than --tolerance, naming the queries whose NDCG fell,
+so ranking and speed changes can be checked before they ship.  Improvements
+are reported; --update-baseline records the current numbers once a change
+is intended.  Latency is reported only, never gated.
+"""
+
+import argparse
+import csv
+import json
+import math
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src" / "mobile-best-practices" / "scripts"))
+import core  # noqa: E402
+
+EVAL_DIR = Path(__file__).parent / "eval"
+QUERIES_PATH = EVAL_DIR / "queries.json"
+BASELINE_PATH = EVAL_DIR / "baseline.json"
+MODES = ("exact", "fuzzy", "fast", "sqlite")
+METRICS = ("ndcg", "recall", "mrr")
+
+
+def title(row):
+    """The display title of a result row (the column explain() reports)."""
+    return next((str(row[c]) for c in core._TITLE_COLS if row.get(c)), "")
+
+
+def scope(entry):
+    """``domain`` / ``@platform`` / ``all`` -- the key a query is reported under."""
+    return "@" + entry["platform"] if "platform" in entry else entry["domain"]
+
+
+def known_titles(entry):
+    """Every title the query's source can return, to catch mislabelled entries."""
+    if "platform" in entry:
+        files = [("", core.PLATFORM_CONFIG[entry["platform"]]["file"])]
+    elif entry["domain"] == "all":
+        files = [(domain + "/", config["file"]) for domain, config in core.CSV_CONFIG.items()]
+    else:
+        files = [("", core.CSV_CONFIG[entry["domain"]]["file"])]
+    titles = set()
+    for prefix, name in files:
+        with open(core.DATA_DIR / name, newline="", encoding="utf-8") as f:
+            titles.update(prefix + title(row) for row in csv.DictReader(f))
+    return titles
+
+
+def run(kb, entry, k, fuzzy, fast):
+    """Ranked titles for one query (all-domains titles prefixed with their domain)."""
+    if "platform" in entry:
+        result = kb.search_platform(entry["query"], entry["platform"], k, fuzzy=fuzzy, fast=fast)
+    elif entry["domain"] == "all":
+        result = kb.search_all_domains(entry["query"], k, fuzzy=fuzzy, fast=fast)
+        return [f"{row['Domain']}/{title(row)}" for row in result["results"]]
+    else:
+        result = kb.search(entry["query"], entry["domain"], k, fuzzy=fuzzy, fast=fast)
+    if "error" in result:
+        raise SystemExit(f"{scope(entry)}: {entry['query']!r}: {result['error']}")
+    return [title(row) for row in result["results"]]
+
+
+def score(ranked, relevant, k):
+    """(NDCG@k, recall@k, reciprocal rank) of one ranking; a title counts once."""
+    seen, gains = set(), []
+    for name in ranked[:k]:
+        gains.append(0 if name in seen else relevant.get(name, 0))
+        seen.add(name)
+    dcg = sum((2 ** g - 1) / math.log2(i + 2) for i, g in enumerate(gains))
+    ideal = sum((2 ** g - 1) / math.log2(i + 2) for i, g in enumerate(sorted(relevant.values(), reverse=True)[:k]))
+    found = sum(1 for g in gains if g > 0)
+    first = next((i for i, g in enumerate(gains) if g > 0), None)
+    return dcg / ideal, found / len(relevant), 0.0 if first is None else 1 / (first + 1)
+
+
+def evaluate(queries, k, repeat):
+    kbs = {"python": core.KnowledgeBase(), "sqlite": core.KnowledgeBase(backend="sqlite")}
+    results = {}
+    for mode in MODES:
+        kb = kbs["sqlite" if mode == "sqlite" else "python"]
+        fuzzy, fast = mode == "fuzzy", mode == "fast"
+        for entry in queries:
+            run(kb, entry, k, fuzzy, fast)  # warm the indexes outside the timings
+        per_query, latencies = {}, []
+        for entry in queries:
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                ranked = run(kb, entry, k, fuzzy, fast)
+                times.append(time.perf_counter() - start)
+            latencies.append(min(times) * 1000)
+            ndcg, recall, rr = score(ranked, entry["relevant"], k)
+            per_query[f"{scope(entry)}: {entry['query']}"] = {"ndcg": round(ndcg, 4), "recall": round(recall, 4), "mrr": round(rr, 4)}
+        latencies.sort()
+        results[mode] = {
+            **{m: round(statistics.mean(q[m] for q in per_query.values()), 4) for m in METRICS},
+            "latency_ms": {"p50": round(statistics.median(latencies), 3),
+                           "p95": round(latencies[min(len(latencies) - 1, math.ceil(0.95 * len(latencies)) - 1)], 3)},
+            "queries": per_query,
+        }
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """(regressions, improvements) of the mean metrics against the baseline."""
+    regressions, improvements = [], []
+    for mode, r in results.items():
+        base = baseline["modes"].get(mode)
+        if base is None:
+            continue
+        for m in METRICS:
+            delta = r[m] - base[m]
+            if delta < -tolerance:
+                worse = [q for q, s in r["queries"].items() if s["ndcg"] < base["queries"].get(q, {}).get("ndcg", 0) - 1e-9]
+                regressions.append(f"{mode} {m}@{baseline['k']}: {base[m]:.4f} -> {r[m]:.4f}"
+                                   + (f" (NDCG fell on: {'; '.join(worse)})" if worse else ""))
+            elif delta > tolerance:
+                improvements.append(f"{mode} {m}@{baseline['k']}: {base[m]:.4f} -> {r[m]:.4f}")
+    return regressions, improvements
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate search relevance and latency against a labelled query set")
+    parser.add_argument("-k", type=int, default=10, help="Rank cutoff for NDCG, recall and MRR (default: 10)")
+    parser.add_argument("--repeat", type=int, default=3, help="Timing repetitions per query, best kept (default: 3)")
+    parser.add_argument("--tolerance", type=float, default=0.005,
+                        help="Largest drop in a mean metric accepted before failing (default: 0.005)")
+    parser.add_argument("--update-baseline", action="store_true", help=f"Write the results to {BASELINE_PATH.relative_to(Path(__file__).parent.parent)}")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    queries = json.loads(QUERIES_PATH.read_text(encoding="utf-8"))
+    unknown = [f"{scope(e)}: {e['query']!r}: {name!r}" for e in queries for name in sorted(set(e["relevant"]) - known_titles(e))]
+    for u in unknown:
+        print(f"  ✗  labelled title not found: {u}", file=sys.stderr)
+    if unknown:
+        sys.exit(1)
+
+    results = evaluate(queries, args.k, args.repeat)
+
+    if args.update_baseline:
+        baseline = {"k": args.k, "queries": len(queries),
+                    "modes": {mode: {m: r[m] for m in (*METRICS, "queries")} for mode, r in results.items()}}
+        # One line per query keeps baseline diffs readable
+        text = re.sub(r'\{\s+"ndcg": ([^,]+),\s+"recall": ([^,]+),\s+"mrr": (\S+)\s+\}', r'{"ndcg": \1, "recall": \2, "mrr": \3}',
+                      json.dumps(baseline, indent=2, ensure_ascii=False))
+        BASELINE_PATH.write_text(text + "\n", encoding="utf-8")
+        regressions, improvements = [], []
+    else:
+        baseline = json.loads(BASELINE_PATH.read_text(encoding="utf-8"))
+        if baseline["k"] != args.k:
+            sys.exit(f"Baseline was recorded at k={baseline['k']}; run with -k {baseline['k']} or --update-baseline")
+        regressions, improvements = compare(results, baseline, args.tolerance)
+
+    if args.json:
+        print(json.dumps({"k": args.k, "queries": len(queries), "modes": results,
+                          "regressions": regressions, "improvements": improvements}, indent=2, ensure_ascii=False))
+    else:
+        print(f"{len(queries)} labelled queries, k={args.k}\n")
+        print(f"{'mode':>8}  {f'NDCG@{args.k}':>9}  {f'recall@{args.k}':>10}  {'MRR':>6}  {'p50':>10}  {'p95':>10}")
+        for mode, r in results.items():
+            print(f"{mode:>8}  {r['ndcg']:>9.4f}  {r['recall']:>10.4f}  {r['mrr']:>6.4f}  "
+                  f"{r['latency_ms']['p50']:>7.3f} ms  {r['latency_ms']['p95']:>7.3f} ms")
+        if args.update_baseline:
+            print(f"\nBaseline written to {BASELINE_PATH}")
+    for i in improvements:
+        print(f"  ↑  {i} (run with --update-baseline to keep it)", file=sys.stderr)
+    for r in regressions:
+        print(f"  ✗  quality dropped below baseline: {r}", file=sys.stderr)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
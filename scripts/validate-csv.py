@@ -9,13 +9,26 @@ Validate all CSV files:
   - No duplicate entries (by Name or ID)
   - Reference URL / Docs URL present for each row
   - Source URL present for Android snippets (cs.android.com)
+
+Each file is streamed in a single pass and files are validated in parallel
+across a process pool.  --json / --report emit a machine-readable report
+with per-file timing; --incremental skips files whose content hash matches
+the last successful run.
 """
 
+import argparse
 import csv
+import hashlib
+import io
+import json
+import os
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 DATA_DIR = Path(__file__).parent.parent / "src" / "mobile-best-practices" / "data"
+CACHE_FILE = Path(__file__).parent.parent / ".validate-cache.json"
 
 VALID_SEVERITY = {"Critical", "High", "Medium", "Low"}
 VALID_PLATFORMS = {"Android", "iOS", "Flutter", "React Native", "All", "KMP", ""}
@@ -141,80 +154,119 @@ PLATFORM_EXPECTED = {
 }
 
 
-errors = []
-warnings = []
-total_rows = 0
+class _HashingReader(io.RawIOBase):
+    """Binary file wrapper that hashes bytes as the CSV parser consumes them."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.digest = hashlib.sha256()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = self.raw.readinto(buffer)
+        if n:
+            self.digest.update(memoryview(buffer)[:n])
+        return n
+
+
+def _combined_hash(spec, content_digest):
+    """Hash of a file's content digest plus the spec it is validated against."""
+    digest = hashlib.sha256(json.dumps(spec, sort_keys=True).encode("utf-8"))
+    digest.update(content_digest)
+    return digest.hexdigest()
+
+
+def file_hash(filepath, spec):
+    """Same hash validate_file() records, computed without parsing the CSV."""
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return _combined_hash(spec, digest.digest())
+
 
+def validate_file(rel_path, spec, data_dir=DATA_DIR):
+    """Validate one CSV in a single streaming pass.
 
-def validate_file(rel_path, spec):
-    global total_rows
-    filepath = DATA_DIR / rel_path
+    Returns a report dict: file, rows, cols, errors, warnings, seconds and
+    the content hash (bytes + spec) used by --incremental.
+    """
+    start = time.perf_counter()
+    report = {"file": rel_path, "rows": 0, "cols": 0, "errors": [], "warnings": [], "seconds": 0.0, "hash": None}
+    errors, warnings = report["errors"], report["warnings"]
+    filepath = Path(data_dir) / rel_path
     if not filepath.exists():
         errors.append(f"MISSING FILE: {rel_path}")
-        return
+        return report
 
-    with open(filepath, encoding="utf-8") as f:
-        reader = csv.DictReader(f)
+    with open(filepath, "rb") as raw:
+        hashing = _HashingReader(raw)
+        text = io.TextIOWrapper(io.BufferedReader(hashing), encoding="utf-8")
+        reader = csv.DictReader(text)
         headers = reader.fieldnames or []
-        rows = list(reader)
 
-    # 1. Required columns
-    for col in spec["required"]:
-        if col not in headers:
-            errors.append(f"{rel_path}: missing required column '{col}'")
+        # 1. Required columns
+        for col in spec["required"]:
+            if col not in headers:
+                errors.append(f"{rel_path}: missing required column '{col}'")
 
-    # 2. URL column exists
-    url_col = spec.get("url_col")
-    if url_col and url_col not in headers:
-        errors.append(f"{rel_path}: missing URL column '{url_col}'")
+        # 2. URL column exists
+        url_col = spec.get("url_col")
+        if url_col and url_col not in headers:
+            errors.append(f"{rel_path}: missing URL column '{url_col}'")
 
-    # 3. Row count
-    if len(rows) < spec["min_rows"]:
-        errors.append(
-            f"{rel_path}: only {len(rows)} rows (expected >= {spec['min_rows']})"
-        )
+        # 3. Per-row validation, streamed
+        seen = set()
+        dedup_col = spec.get("dedup_col")
+        sev_col = spec.get("severity_col")
+        source_url_col = spec.get("source_url_col") if spec.get("source_url_col") in headers else None
+        source_url_platform = spec.get("source_url_platform", "Android")
 
-    # 4. Per-row validation
-    seen = set()
-    dedup_col = spec.get("dedup_col")
-    source_url_col = spec.get("source_url_col")
-    source_url_platform = spec.get("source_url_platform", "Android")
+        row_count = 0
+        empty_required = 0
+        bad_severity = []
+        missing_url = []
+        missing_source_url = []
+        duplicates = []
 
-    empty_required = 0
-    bad_severity = []
-    missing_url = []
-    missing_source_url = []
-    duplicates = []
+        for i, row in enumerate(reader, 2):
+            row_count += 1
+            # Empty required fields
+            for col in spec["required"]:
+                if col in row and not (row[col] or "").strip():
+                    empty_required += 1
 
-    for i, row in enumerate(rows, 2):
-        # Empty required fields
-        for col in spec["required"]:
-            if col in row and not row[col].strip():
-                empty_required += 1
+            # Severity values
+            if sev_col and sev_col in row:
+                sev = (row[sev_col] or "").strip()
+                if sev and sev not in VALID_SEVERITY:
+                    bad_severity.append(f"row {i}: '{sev}'")
 
-        # Severity values
-        sev_col = spec.get("severity_col")
-        if sev_col and sev_col in row:
-            sev = row[sev_col].strip()
-            if sev and sev not in VALID_SEVERITY:
-                bad_severity.append(f"row {i}: '{sev}'")
-
-        # Reference URL / Docs URL present per row
-        if url_col and url_col in row and not row[url_col].strip():
-            missing_url.append(i)
-
-        # Source URL for Android snippets
-        if source_url_col and source_url_col in headers:
-            platform = row.get("Platform", "").strip()
-            if platform == source_url_platform and not row.get(source_url_col, "").strip():
-                missing_source_url.append(f"row {i} ({row.get('ID', row.get('Name', '?'))})")
-
-        # Duplicates
-        if dedup_col and dedup_col in row:
-            key = row[dedup_col].strip().lower()
-            if key and key in seen:
-                duplicates.append(f"row {i}: duplicate '{row[dedup_col]}'")
-            seen.add(key)
+            # Reference URL / Docs URL present per row
+            if url_col and url_col in row and not (row[url_col] or "").strip():
+                missing_url.append(i)
+
+            # Source URL for Android snippets
+            if source_url_col:
+                platform = (row.get("Platform") or "").strip()
+                if platform == source_url_platform and not (row.get(source_url_col) or "").strip():
+                    missing_source_url.append(f"row {i} ({row.get('ID', row.get('Name', '?'))})")
+
+            # Duplicates
+            if dedup_col and dedup_col in row:
+                key = (row[dedup_col] or "").strip().lower()
+                if key and key in seen:
+                    duplicates.append(f"row {i}: duplicate '{row[dedup_col]}'")
+                seen.add(key)
+        content_digest = hashing.digest.digest()
+
+    # 4. Row count
+    if row_count < spec["min_rows"]:
+        errors.append(
+            f"{rel_path}: only {row_count} rows (expected >= {spec['min_rows']})"
+        )
 
     if empty_required > 0:
         warnings.append(f"{rel_path}: {empty_required} empty required fields")
@@ -230,29 +282,122 @@ def validate_file(rel_path, spec):
     if duplicates:
         warnings.append(f"{rel_path}: {duplicates[:3]}")
 
-    total_rows += len(rows)
-    print(f"  OK  {rel_path} ({len(rows)} rows, {len(headers)} cols)")
+    report.update(rows=row_count, cols=len(headers), hash=_combined_hash(spec, content_digest),
+                  seconds=round(time.perf_counter() - start, 4))
+    return report
+
+
+def load_cache(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def run_validation(specs, jobs=None, incremental=False, cache_path=CACHE_FILE, data_dir=DATA_DIR):
+    """Validate every file in *specs*; returns the full JSON-serialisable report.
+
+    Files run in parallel across *jobs* processes (1 = in-process).  With
+    *incremental*, files whose hash matches the last successful run reuse
+    that run's report instead of being parsed again.
+    """
+    start = time.perf_counter()
+    cache = load_cache(cache_path) if incremental else {}
+    reports = {}
+    pending = []
+    for rel_path, spec in specs.items():
+        cached = cache.get(rel_path)
+        filepath = Path(data_dir) / rel_path
+        if cached and filepath.exists() and cached.get("hash") == file_hash(filepath, spec):
+            reports[rel_path] = dict(cached, seconds=0.0, skipped=True)
+        else:
+            pending.append(rel_path)
+
+    jobs = jobs or os.cpu_count() or 1
+    if jobs > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(pending))) as pool:
+            futures = {rel: pool.submit(validate_file, rel, specs[rel], data_dir) for rel in pending}
+            for rel, future in futures.items():
+                reports[rel] = future.result()
+    else:
+        for rel in pending:
+            reports[rel] = validate_file(rel, specs[rel], data_dir)
+
+    files = [reports[rel] for rel in specs]
+    if incremental or cache_path.exists():
+        # Only clean files are remembered, so a failing file is always re-validated
+        for report in files:
+            if not report["errors"] and report["hash"]:
+                cache[report["file"]] = {k: v for k, v in report.items() if k not in ("seconds", "skipped")}
+            else:
+                cache.pop(report["file"], None)
+        tmp = Path(f"{cache_path}.tmp")
+        tmp.write_text(json.dumps(cache, indent=1, sort_keys=True) + "\n", encoding="utf-8")
+        os.replace(tmp, cache_path)
+
+    return {
+        "ok": not any(r["errors"] for r in files),
+        "total_rows": sum(r["rows"] for r in files),
+        "files": files,
+        "errors": [e for r in files for e in r["errors"]],
+        "warnings": [w for r in files for w in r["warnings"]],
+        "seconds": round(time.perf_counter() - start, 4),
+    }
+
+
+def print_report(result):
+    print("=" * 60)
+    print("Mobile Best Practices — CSV Validation")
+    print("=" * 60)
+
+    for r in result["files"]:
+        if not r["hash"]:
+            continue  # missing file, reported under errors
+        if r.get("skipped"):
+            print(f"  --  {r['file']} ({r['rows']} rows, unchanged since last successful run)")
+        else:
+            print(f"  OK  {r['file']} ({r['rows']} rows, {r['cols']} cols, {r['seconds'] * 1000:.0f} ms)")
+
+    print(f"\nTotal: {result['total_rows']} entries across {len(result['files'])} CSV files ({result['seconds']:.2f}s)")
+
+    warnings, errors = result["warnings"], result["errors"]
+    if warnings:
+        print(f"\nWarnings ({len(warnings)}):")
+        for w in warnings:
+            print(f"  ⚠  {w}")
+
+    if errors:
+        print(f"\nErrors ({len(errors)}):")
+        for e in errors:
+            print(f"  ✗  {e}")
+    else:
+        print("\n✓ All validations passed!")
+
 
+def main():
+    parser = argparse.ArgumentParser(description="Validate the best-practices CSV data")
+    parser.add_argument("--jobs", "-j", type=int, default=None, help="Worker processes (default: CPU count, 1 = no pool)")
+    parser.add_argument("--incremental", action="store_true", help="Skip files unchanged since the last successful run")
+    parser.add_argument("--cache", type=Path, default=CACHE_FILE, help=f"Hash cache for --incremental (default: {CACHE_FILE.name} at the repo root)")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON instead of text")
+    parser.add_argument("--report", type=Path, help="Also write the JSON report to this file")
+    args = parser.parse_args()
 
-print("=" * 60)
-print("Mobile Best Practices — CSV Validation")
-print("=" * 60)
+    all_specs = {**EXPECTED, **PLATFORM_EXPECTED}
+    result = run_validation(all_specs, jobs=args.jobs, incremental=args.incremental, cache_path=args.cache)
 
-all_specs = {**EXPECTED, **PLATFORM_EXPECTED}
-for rel_path, spec in all_specs.items():
-    validate_file(rel_path, spec)
+    if args.report:
+        args.report.write_text(json.dumps(result, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+    if args.json:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+    else:
+        print_report(result)
 
-print(f"\nTotal: {total_rows} entries across {len(all_specs)} CSV files")
+    if not result["ok"]:
+        sys.exit(1)
 
-if warnings:
-    print(f"\nWarnings ({len(warnings)}):")
-    for w in warnings:
-        print(f"  ⚠  {w}")
 
-if errors:
-    print(f"\nErrors ({len(errors)}):")
-    for e in errors:
-        print(f"  ✗  {e}")
-    sys.exit(1)
-else:
-    print("\n✓ All validations passed!")
+if __name__ == "__main__":
+    main()
@@ -4,19 +4,51 @@
 Mobile Best Practices Core - BM25 search engine for mobile development best practices
 """
 
+import asyncio
+import base64
+import copy
 import csv
+import difflib
+import hashlib
+import http.server
 import json
+import mmap
+import multiprocessing
+import os
 import re
+import sqlite3
+import struct
+import sys
+import threading
+import time
 from pathlib import Path
 from math import log
 from datetime import datetime
-from typing import List, Dict, Any, Tuple, Optional, Union, cast
+from typing import List, Dict, Any, Iterator, Tuple, Optional, Union, cast
+from array import array
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+from heapq import heappush, heapreplace, nlargest, nsmallest
 from itertools import islice
+from functools import lru_cache, wraps
+from concurrent.futures import ProcessPoolExecutor
 
 # ============ CONFIGURATION ============
 DATA_DIR = Path(__file__).parent.parent / "data"
 MAX_RESULTS = 15           # default for single-domain searches
 ALL_DOMAINS_MAX_RESULTS = 30  # default for --all-domains cross-domain search
+# --fast: BM25 impacts quantised to 8 bits, at most this many postings
+# accumulated per query (score-at-a-time early termination)
+IMPACT_LEVELS = 255
+FAST_POSTINGS_BUDGET = 2000
+# --offset / --cursor: full rankings are cached this many seconds, this many at most
+RANKING_CACHE_TTL = 300.0
+RANKING_CACHE_SIZE = 64
+# Metrics histogram bucket bounds: search latency and index builds in seconds,
+# documents fully scored per ranked query
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+BUILD_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+DOCS_SCORED_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 1000)
 
 CSV_CONFIG = {
     "architecture": {
@@ -96,6 +128,9 @@ _PLATFORM_COLS = {
 
 AVAILABLE_PLATFORMS = list(PLATFORM_CONFIG.keys())
 
+# Ranking engines: in-memory BM25 over the mapped index files, or one SQLite FTS5 database
+BACKENDS = ["python", "sqlite"]
+
 # Stack-to-platform mapping for --stack search
 STACK_MAP = {
     "compose": "android",
@@ -256,56 +291,244 @@ def apply_comment_style(code: str, style: str) -> str:
     return "\n".join(final)
 
 
+# ============ TOKEN NORMALISATION ============
+# Abbreviations rewritten to their full form before the length filter, at
+# index time and on queries alike, so "vm" meets "ViewModel"
+_TOKEN_ALIASES = {
+    "vm": "viewmodel", "vms": "viewmodel",
+    "rn": "react native",
+    "kt": "kotlin", "kts": "kotlin",
+    "di": "dependency injection",
+    "db": "database",
+    "js": "javascript",
+    "ts": "typescript",
+    "nav": "navigation",
+    "auth": "authentication",
+    "perf": "performance",
+    "a11y": "accessibility",
+    "i18n": "localization", "l10n": "localization",
+}
+# Left unstemmed: platform names and words whose "s" is not a plural
+_STEM_EXCEPTIONS = frozenset({"ios", "macos", "ipados", "watchos", "tvos", "visionos", "news", "series", "redis"})
+# Shortest stem a suffix may leave behind: plurals / everything else
+_MIN_PLURAL_STEM = 3
+_MIN_STEM = 4
+
+
+def _restores_e(base: str) -> bool:
+    """Whether a too-short -ed / -ing remainder lost a silent e: it ends in
+    one consonant after one vowel ("us", "bas", "typ"), not in w / x / y
+    ("fixed", "paying") or a double vowel ("aimed")."""
+    if len(base) + 1 < _MIN_PLURAL_STEM or base[-1] in "aeiouwxy" or base[-2] not in "aeiouy":
+        return False
+    return len(base) == 2 or base[-3] not in "aeiou"
+
+
+@lru_cache(maxsize=65536)
+def stem(word: str) -> str:
+    """Light suffix stripper for lowercased English tokens.
+
+    Folds plurals, -ed / -ing, -ion / -ation / -ition and a final -e onto
+    one stem ("recomposing", "recomposition" and "recompose" -> "recompos";
+    "encrypted" / "encryption" -> "encrypt"; "caches" / "caching" -> "cach").
+    Short stems keep their silent e instead ("used", "using", "uses" ->
+    "use").  Deliberately lighter than Porter: it only has to make query and
+    index agree, and never removes more than one derivational suffix.
+    """
+    if word in _STEM_EXCEPTIONS or not word.isalpha():
+        return word
+    if word.endswith("ies") and len(word) - 3 >= _MIN_PLURAL_STEM:
+        word = word[:-3] + "y"
+    elif word.endswith("s") and not word.endswith(("ss", "us", "sis")) and len(word) - 1 >= _MIN_PLURAL_STEM:
+        word = word[:-1]
+    if word.endswith("ation") and len(word) - 5 < _MIN_PLURAL_STEM:
+        return word  # "station", "nation": no verb to fold onto
+    for suffix, replacement in (("ation", "at"), ("ition", ""), ("ion", ""), ("ing", ""), ("ed", "")):
+        if not word.endswith(suffix):
+            continue
+        base = word[:-len(suffix)] + replacement
+        if len(base) >= _MIN_STEM:
+            word = base
+            if word[-1] == word[-2] and word[-1] not in "lsz":
+                word = word[:-1]  # running -> run, embedded -> embed
+            break
+        if suffix in ("ing", "ed") and _restores_e(base):
+            return base + "e"  # used -> use, based -> base; the floor applies to the restored stem
+    if word.endswith("e") and len(word) - 1 >= _MIN_STEM:
+        word = word[:-1]
+    return word
+
+
+@lru_cache(maxsize=65536)
+def _word_tokens(word: str) -> Tuple[str, ...]:
+    """Index tokens for one lowercased word: aliases expanded, short words dropped, stemmed."""
+    words = _TOKEN_ALIASES[word].split() if word in _TOKEN_ALIASES else [word]
+    return tuple(stem(w) for w in words if len(w) > 2)
+
+
 # ============ BM25 IMPLEMENTATION ============
 class BM25:
-    """BM25 ranking algorithm for text search"""
+    """BM25 ranking algorithm for text search
+
+    Besides a one-shot ``fit``, the index can be maintained in place with
+    ``add_documents``, ``update_document`` and ``remove_document``.  Removed
+    documents leave a tombstone so the ids of the others never shift.  Those
+    methods replace a touched term's postings lists rather than editing
+    them, so a ``copy`` can be patched while readers keep using the original.
+    """
 
     def __init__(self, k1=1.5, b=0.75):
         self.k1 = k1
         self.b = b
         self.corpus: List[List[str]] = []
+        self.term_freqs: List[Dict[str, int]] = []
         self.doc_lengths: List[int] = []
         self.avgdl: float = 0.0
         self.idf: Dict[str, float] = {}
         self.doc_freqs: Dict[str, int] = {}
+        self.deleted: set = set()
         self.N: int = 0
+        self._total_length: int = 0
+        self._lists: Optional[Dict[str, Tuple[List[int], List[int]]]] = None
+        self._postings: Dict[str, Optional[Tuple[List[int], List[int], float, float]]] = {}
+        self._impacts: Optional[Dict[str, List[Tuple[int, List[int]]]]] = None
+        self._impact_scale = 0.0
 
     def tokenize(self, text):
-        """Lowercase, split, remove punctuation, filter short words"""
+        """Lowercase, split, remove punctuation, expand aliases, filter short words, stem"""
         text = re.sub(r'[^\w\s]', ' ', str(text).lower())
-        return [w for w in text.split() if len(w) > 2]
+        return [token for word in text.split() for token in _word_tokens(word)]
 
     def fit(self, documents):
         """Build BM25 index from documents"""
-        self.corpus = [self.tokenize(doc) for doc in documents]
-        self.N = len(self.corpus)
-        if self.N == 0:
-            return
-            
-        self.doc_lengths = [len(doc) for doc in self.corpus]
-        self.avgdl = sum(self.doc_lengths) / self.N
+        self.__init__(self.k1, self.b)
+        self.add_documents(documents)
 
-        for doc in self.corpus:
-            seen = set()
-            for word in doc:
-                if word not in seen:
-                    self.doc_freqs[word] = self.doc_freqs.get(word, 0) + 1
-                    seen.add(word)
+    def copy(self) -> "BM25":
+        """An independent copy that shares every per-document and per-term list.
 
-        for word, freq in self.doc_freqs.items():
-            self.idf[word] = log((self.N - freq + 0.5) / (freq + 0.5) + 1)
+        Only the containers are copied (in time linear in the number of
+        documents and terms, without touching their contents): the
+        incremental methods replace the lists they change, so patching the
+        copy never disturbs a reader of this index.
+        """
+        clone = copy.copy(self)
+        clone.corpus, clone.term_freqs, clone.doc_lengths = list(self.corpus), list(self.term_freqs), list(self.doc_lengths)
+        clone.idf, clone.doc_freqs, clone.deleted = dict(self.idf), dict(self.doc_freqs), set(self.deleted)
+        clone._lists = dict(self._lists) if self._lists is not None else None
+        clone._postings = {}
+        return clone
+
+    # ── Incremental maintenance ───────────────────────────────────────────────
+
+    def _term_freqs(self, tokens: List[str]) -> Dict[str, int]:
+        term_freqs: Dict[str, int] = {}
+        for word in tokens:
+            term_freqs[word] = term_freqs.get(word, 0) + 1
+        return term_freqs
+
+    def _idf_of(self, word: str) -> float:
+        return log((self.N - self.doc_freqs[word] + 0.5) / (self.doc_freqs[word] + 0.5) + 1)
+
+    def _refresh_stats(self, n_changed: bool, words=()) -> None:
+        """Recompute avgdl and the IDF entries that may have moved.
+
+        IDF depends on N, so adding or removing documents refreshes the whole
+        table (one pass over the vocabulary, no re-tokenising); an update
+        keeps N and only touches the words of the old and new text.
+        """
+        self.avgdl = self._total_length / self.N if self.N else 0.0
+        # Every IDF or bound may have moved: recomputed per term as queries need them
+        self._postings, self._impacts = {}, None
+        if n_changed:
+            self.idf = {word: self._idf_of(word) for word in self.doc_freqs}
+            return
+        for word in words:
+            if word in self.doc_freqs:
+                self.idf[word] = self._idf_of(word)
+            else:
+                self.idf.pop(word, None)
+
+    def _index_tokens(self, idx: int, tokens: List[str]) -> None:
+        term_freqs = self._term_freqs(tokens)
+        self.corpus[idx] = tokens
+        self.term_freqs[idx] = term_freqs
+        self.doc_lengths[idx] = len(tokens)
+        self._total_length += len(tokens)
+        for word, tf in term_freqs.items():
+            self.doc_freqs[word] = self.doc_freqs.get(word, 0) + 1
+            if self._lists is not None:
+                docs, tfs = self._lists.get(word, ([], []))
+                at = bisect_left(docs, idx)
+                self._lists[word] = (docs[:at] + [idx] + docs[at:], tfs[:at] + [tf] + tfs[at:])
+
+    def _unindex(self, idx: int) -> Dict[str, int]:
+        term_freqs = self.term_freqs[idx]
+        for word in term_freqs:
+            self.doc_freqs[word] -= 1
+            if not self.doc_freqs[word]:
+                del self.doc_freqs[word]
+            if self._lists is not None:
+                docs, tfs = self._lists[word]
+                at = bisect_left(docs, idx)
+                if len(docs) > 1:
+                    self._lists[word] = (docs[:at] + docs[at + 1:], tfs[:at] + tfs[at + 1:])
+                else:
+                    del self._lists[word]
+        self._total_length -= self.doc_lengths[idx]
+        self.corpus[idx], self.term_freqs[idx], self.doc_lengths[idx] = [], {}, 0
+        return term_freqs
+
+    def add_documents(self, documents) -> List[int]:
+        """Append documents to the index; returns their ids."""
+        ids = []
+        for doc in documents:
+            idx = len(self.corpus)
+            self.corpus.append([])
+            self.term_freqs.append({})
+            self.doc_lengths.append(0)
+            self._index_tokens(idx, self.tokenize(doc))
+            ids.append(idx)
+        if ids:
+            self.N += len(ids)
+            self._refresh_stats(n_changed=True)
+        return ids
+
+    def update_document(self, idx: int, document) -> None:
+        """Replace the text of document *idx*, adjusting only the affected terms."""
+        if idx in self.deleted:
+            raise KeyError(f"document {idx} was removed")
+        old_words = self._unindex(idx)
+        self._index_tokens(idx, self.tokenize(document))
+        self._refresh_stats(n_changed=False, words=set(old_words) | set(self.term_freqs[idx]))
+
+    def remove_document(self, idx: int) -> None:
+        """Remove document *idx*; other ids are unaffected."""
+        self.remove_documents([idx])
+
+    def remove_documents(self, ids) -> None:
+        """Remove several documents with a single IDF refresh."""
+        removed = 0
+        for idx in ids:
+            if idx in self.deleted:
+                continue
+            self._unindex(idx)
+            self.deleted.add(idx)
+            removed += 1
+        if removed:
+            self.N -= removed
+            self._refresh_stats(n_changed=True)
 
     def score(self, query: str) -> List[Tuple[int, float]]:
         """Score all documents against query"""
         query_tokens = self.tokenize(query)
         scores = []
 
-        for idx, doc in enumerate(self.corpus):
+        for idx, term_freqs in enumerate(self.term_freqs):
+            if idx in self.deleted:
+                continue
             doc_score: float = 0.0
             doc_len = self.doc_lengths[idx]
-            term_freqs = {}
-            for word in doc:
-                term_freqs[word] = term_freqs.get(word, 0) + 1
 
             for token in query_tokens:
                 if token in self.idf:
@@ -319,13 +542,332 @@ class BM25:
 
         return sorted(scores, key=lambda x: x[1], reverse=True)
 
+    # ── Top-k retrieval ────────────────────────────────────────────────────────
+
+    def _posting_list(self, word: str) -> Optional[Tuple[List[int], List[int], float, float]]:
+        """(doc ids, tfs, idf, score upper bound) for *word*, or None if unknown.
+
+        The bound depends on avgdl, so it is computed on first use after each
+        change, in time proportional to the term's postings.
+        """
+        cached = self._postings.get(word, ...)
+        if cached is not ...:
+            return cached
+        if self._lists is None:
+            lists: Dict[str, Tuple[List[int], List[int]]] = {}
+            for idx, term_freqs in enumerate(self.term_freqs):
+                for term, tf in term_freqs.items():
+                    docs, tfs = lists.setdefault(term, ([], []))
+                    docs.append(idx)
+                    tfs.append(tf)
+            self._lists = lists
+        entry = None
+        if word in self._lists:
+            docs, tfs = self._lists[word]
+            entry = (docs, tfs, self.idf[word], _max_impact(self, self.idf[word], docs, tfs))
+        self._postings[word] = entry
+        return entry
+
+    def top_k(self, query: str, k: int, stats: Optional[Dict[str, int]] = None) -> List[Tuple[int, float]]:
+        """The *k* best documents with a positive score, exactly as ``score`` ranks them.
+
+        MaxScore dynamic pruning over the postings: query terms are ordered by
+        their score upper bound, and once the k-th best score reaches the
+        summed bounds of the weakest terms those terms stop producing
+        candidates.  A candidate whose partial score plus the remaining bounds
+        cannot beat the k-th score is dropped without being fully scored.
+        Scores, ties and order match ``score`` bit for bit.  If *stats* is
+        given it receives the number of candidates and fully scored documents.
+        """
+        tokens = self.tokenize(query)
+        lists = {}
+        for token in tokens:
+            if token not in lists:
+                entry = self._posting_list(token)
+                if entry is not None:
+                    lists[token] = entry
+        counts = Counter(token for token in tokens if token in lists)
+        terms = sorted(lists, key=lambda t: lists[t][3] * counts[t])
+        prefix = [0.0]
+        for term in terms:
+            prefix.append(prefix[-1] + lists[term][3] * counts[term])
+
+        k1, b, avgdl, doc_lengths = self.k1, self.b, self.avgdl, self.doc_lengths
+        cursors = {term: 0 for term in terms}
+        heap: List[Tuple[float, int]] = []  # (score, -doc): root is the entry to evict
+        threshold = 0.0
+        essential = 0  # terms[:essential] can no longer lift a document into the top k
+        candidates = scored = 0
+
+        while k > 0:
+            doc = min((lists[t][0][cursors[t]] for t in terms[essential:] if cursors[t] < len(lists[t][0])), default=None)
+            if doc is None:
+                break
+            candidates += 1
+            contributions: Dict[str, float] = {}
+            partial = 0.0
+            for term in terms[essential:]:
+                docs, tfs, idf, _ = lists[term]
+                at = cursors[term]
+                if at < len(docs) and docs[at] == doc:
+                    tf = tfs[at]
+                    contributions[term] = idf * (tf * (k1 + 1)) / (tf + k1 * (1 - b + b * doc_lengths[doc] / avgdl))
+                    partial += contributions[term] * counts[term]
+                    cursors[term] = at + 1
+            if len(heap) == k and (partial + prefix[essential]) * _BOUND_SLACK <= threshold:
+                continue
+            for term in terms[:essential]:
+                docs, tfs, idf, _ = lists[term]
+                at = cursors[term] = bisect_left(docs, doc, cursors[term])
+                if at < len(docs) and docs[at] == doc:
+                    tf = tfs[at]
+                    contributions[term] = idf * (tf * (k1 + 1)) / (tf + k1 * (1 - b + b * doc_lengths[doc] / avgdl))
+
+            # Sum in query-token order, as score() does
+            doc_score = 0.0
+            for token in tokens:
+                if token in contributions:
+                    doc_score = doc_score + contributions[token]
+            scored += 1
+
+            # Documents arrive in id order, so a tie with the k-th score loses
+            if len(heap) < k:
+                heappush(heap, (doc_score, -doc))
+            elif doc_score > threshold:
+                heapreplace(heap, (doc_score, -doc))
+            else:
+                continue
+            if len(heap) == k:
+                threshold = heap[0][0]
+                while essential < len(terms) and prefix[essential + 1] * _BOUND_SLACK <= threshold:
+                    essential += 1
+
+        if stats is not None:
+            stats.update(candidates=candidates, scored=scored)
+        return [(-neg_doc, doc_score) for doc_score, neg_doc in sorted(heap, key=lambda e: (-e[0], -e[1]))]
+
+    def score_many(self, queries: List[str], k: int) -> List[List[Tuple[int, float]]]:
+        """``top_k(query, k)`` for every query, sharing the work the queries have in common.
+
+        All queries are tokenized up front and identical token lists are
+        ranked once.  A term's per-posting contributions are computed on its
+        first walk and reused by every later query, so terms the queries
+        share cost one pass.  Each query is ranked term at a time, strongest
+        bound first, with the MaxScore bounds of ``top_k``: once the terms
+        still to come cannot lift an unseen document to the k-th best
+        partial score, they only update the existing candidates (by binary
+        search when there are few), and candidates that can no longer reach
+        it are dropped.  Queries with few postings (``_PRUNE_MIN_POSTINGS``)
+        are simply accumulated.  Survivors are scored in query-token order,
+        so scores, ties and order match ``top_k`` bit for bit.
+        """
+        impacts: Dict[str, List[float]] = {}
+        memo: Dict[Tuple[str, ...], List[Tuple[int, float]]] = {}
+        results: List[List[Tuple[int, float]]] = []
+        for query in queries:
+            tokens = self.tokenize(query)
+            key = tuple(tokens)
+            if key not in memo:
+                memo[key] = self._accumulate_top_k(tokens, k, impacts)
+            results.append(list(memo[key]))
+        return results
+
+    def _accumulate_top_k(self, tokens: List[str], k: int, impacts: Dict[str, List[float]]) -> List[Tuple[int, float]]:
+        """Term-at-a-time ``top_k`` of tokenized *tokens* for ``score_many``.
+
+        *impacts* caches per-posting contributions across the batch.
+        """
+        lists = {}
+        for token in tokens:
+            if token not in lists:
+                entry = self._posting_list(token)
+                if entry is not None:
+                    lists[token] = entry
+        if k <= 0 or not lists:
+            return []
+        k1, b, avgdl, doc_lengths = self.k1, self.b, self.avgdl, self.doc_lengths
+
+        def impact_of(term: str) -> List[float]:
+            impact = impacts.get(term)
+            if impact is None:
+                docs, tfs, idf, _ = lists[term]
+                impact = impacts[term] = [idf * (tf * (k1 + 1)) / (tf + k1 * (1 - b + b * doc_lengths[doc] / avgdl))
+                                          for doc, tf in zip(docs, tfs)]
+            return impact
+
+        if sum(len(entry[0]) for entry in lists.values()) <= _PRUNE_MIN_POSTINGS:
+            # Sum in query-token order, as score() does
+            totals: Dict[int, float] = {}
+            get = totals.get
+            for token in tokens:
+                if token in lists:
+                    for doc, value in zip(lists[token][0], impact_of(token)):
+                        totals[doc] = get(doc, 0.0) + value
+            return nsmallest(k, totals.items(), key=lambda e: (-e[1], e[0]))
+
+        counts = Counter(token for token in tokens if token in lists)
+        terms = sorted(lists, key=lambda t: lists[t][3] * counts[t])
+        prefix = [0.0]
+        for term in terms:
+            prefix.append(prefix[-1] + lists[term][3] * counts[term])
+
+        def contribution(term: str, doc: int) -> Optional[float]:
+            docs, tfs, idf, _ = lists[term]
+            at = bisect_left(docs, doc)
+            if at == len(docs) or docs[at] != doc:
+                return None
+            impact = impacts.get(term)
+            if impact is not None:
+                return impact[at]
+            tf = tfs[at]
+            return idf * (tf * (k1 + 1)) / (tf + k1 * (1 - b + b * doc_lengths[doc] / avgdl))
+
+        acc: Dict[int, float] = {}
+        threshold = 0.0
+        for i in range(len(terms) - 1, -1, -1):
+            term = terms[i]
+            docs, tfs, idf, _ = lists[term]
+            weight = counts[term]
+            # An unseen document can score at most the bounds of terms[:i + 1]
+            closed = len(acc) >= k and prefix[i + 1] * _BOUND_SLACK < threshold
+            if closed and len(acc) * 4 < len(docs):
+                for doc in acc:
+                    value = contribution(term, doc)
+                    if value is not None:
+                        acc[doc] += value * weight
+            else:
+                impact = impact_of(term)
+                if closed:
+                    for doc, value in zip(docs, impact):
+                        if doc in acc:
+                            acc[doc] += value * weight
+                else:
+                    get = acc.get
+                    for doc, value in zip(docs, impact):
+                        acc[doc] = get(doc, 0.0) + value * weight
+            # The threshold cannot exceed the bounds walked so far; until those
+            # outweigh the terms still to come, updating it prunes nothing
+            if len(acc) >= k and (i == 0 or prefix[i] < prefix[-1] - prefix[i]):
+                # Partial scores only grow, so k documents will score at least this
+                threshold = nlargest(k, acc.values())[-1]
+                rest = prefix[i]
+                acc = {doc: partial for doc, partial in acc.items() if (partial + rest) * _BOUND_SLACK >= threshold}
+
+        # Sum in query-token order, as score() does
+        ranked = []
+        for doc in acc:
+            doc_score = 0.0
+            for token in tokens:
+                if token in lists:
+                    value = contribution(token, doc)
+                    if value is not None:
+                        doc_score = doc_score + value
+            ranked.append((doc, doc_score))
+        return nsmallest(k, ranked, key=lambda e: (-e[1], e[0]))
+
+    # ── Explain ────────────────────────────────────────────────────────────────
+
+    def term_stats(self, query: str) -> List[Dict[str, Any]]:
+        """Per distinct query token: count in the query, document frequency,
+        IDF and MaxScore upper bound (``idf`` and ``bound`` are None for a
+        token outside the vocabulary)."""
+        tokens = self.tokenize(query)
+        counts = Counter(tokens)
+        stats = []
+        for token in counts:
+            entry = self._posting_list(token)
+            stats.append({"token": token, "count": counts[token], "df": len(entry[0]) if entry else 0,
+                          "idf": entry[2] if entry else None, "bound": entry[3] if entry else None})
+        return stats
+
+    def explain(self, query: str, doc: int) -> Dict[str, Any]:
+        """How document *doc* scores for *query*, term by term.
+
+        Returns the document length, its length normalisation
+        ``1 - b + b * dl / avgdl`` and, per distinct query token, its tf in
+        the document and its contribution ``idf * tf * (k1 + 1) / (tf + k1 *
+        norm)``.  ``score`` adds the contributions in query-token order, so it
+        equals the score ``top_k`` ranked the document with.
+        """
+        k1, b = self.k1, self.b
+        doc_len = self.doc_lengths[doc]
+        norm = 1 - b + b * doc_len / self.avgdl
+        terms: Dict[str, Dict[str, Any]] = {}
+        for stat in self.term_stats(query):
+            entry = self._posting_list(stat["token"])
+            tf = 0
+            if entry is not None:
+                docs, tfs = entry[0], entry[1]
+                at = bisect_left(docs, doc)
+                tf = tfs[at] if at < len(docs) and docs[at] == doc else 0
+            contribution = stat["idf"] * (tf * (k1 + 1)) / (tf + k1 * norm) if tf else 0.0
+            terms[stat["token"]] = dict(stat, tf=tf, contribution=contribution)
+        doc_score = 0.0
+        for token in self.tokenize(query):
+            doc_score = doc_score + terms[token]["contribution"]
+        return {"doc_len": doc_len, "avgdl": self.avgdl, "length_norm": norm, "score": doc_score,
+                "terms": list(terms.values())}
+
+    # ── Approximate retrieval ──────────────────────────────────────────────────
+
+    def _impact_list(self, word: str) -> Optional[List[Tuple[int, List[int]]]]:
+        """Impact-ordered postings of *word*: (quantised impact, doc ids) segments, highest first."""
+        if self._impacts is None:
+            entries = {term: self._posting_list(term) for term in self.doc_freqs}
+            top = max((entry[3] for entry in entries.values() if entry), default=0.0)
+            self._impact_scale = top / IMPACT_LEVELS
+            self._impacts = {term: _quantise_postings(self, entry, self._impact_scale)
+                             for term, entry in entries.items() if entry}
+        return self._impacts.get(word)
+
+    def fast_top_k(self, query: str, k: int, budget: int = FAST_POSTINGS_BUDGET,
+                   stats: Optional[Dict[str, int]] = None) -> List[Tuple[int, float]]:
+        """Approximate top *k* by score-at-a-time processing of quantised impacts.
+
+        Every document's contribution to a term is precomputed and quantised
+        to 8 bits, and postings are grouped by impact.  Segments of all query
+        terms are accumulated from the highest impact down, stopping once
+        *budget* postings have been processed, so the cost is bounded no
+        matter how common the query terms are.  Scores are the dequantised
+        sums; ranking can differ slightly from ``top_k``.
+        """
+        tokens = self.tokenize(query)
+        counts = Counter(token for token in tokens if self._impact_list(token))
+        segments = sorted(((impact * count, docs) for token, count in counts.items()
+                           for impact, docs in self._impact_list(token) or ()),
+                          key=lambda segment: -segment[0])
+        accumulators: Dict[int, int] = {}
+        processed = 0
+        for weight, docs in segments:
+            if processed >= budget:
+                break
+            for doc in docs:
+                accumulators[doc] = accumulators.get(doc, 0) + weight
+            processed += len(docs)
+        if stats is not None:
+            stats.update(candidates=len(accumulators), postings=processed,
+                         total_postings=sum(len(docs) for _, docs in segments))
+        best = nsmallest(k, accumulators.items(), key=lambda e: (-e[1], e[0])) if k > 0 else []
+        return [(doc, acc * self._impact_scale) for doc, acc in best]
+
     # ── Fuzzy helpers ──────────────────────────────────────────────────────────
 
-    def _bigrams(self, word: str) -> set:
+    @staticmethod
+    def _bigrams(word: str) -> set:
         """Character bigrams of a word (space-padded) for Dice similarity."""
         padded = f" {word} "
         return {padded[i:i + 2] for i in range(len(padded) - 1)}
 
+    def document_frequencies(self) -> Iterator[Tuple[str, int]]:
+        """(term, document frequency) for the whole vocabulary."""
+        return iter(self.doc_freqs.items())
+
+    def _in_vocabulary(self, word: str) -> bool:
+        return word in self.idf
+
+    def _fuzzy_candidates(self, bigrams: set) -> List[str]:
+        return sorted(self.idf)
+
     def expand_query(self, query: str, threshold: float = 0.60) -> str:
         """Return an expanded query string with fuzzy-matched vocabulary terms.
 
@@ -333,18 +875,18 @@ class BM25:
         closest vocabulary word using Dice coefficient on character bigrams.
         If the best match exceeds *threshold* the matched word is appended to
         the query so the BM25 scorer can pick it up.  Tokens shorter than 4
-        characters are skipped to avoid noisy expansions.
+        characters are skipped to avoid noisy expansions.  Candidates are
+        compared in sorted order, so ties resolve the same way in every run.
         """
         query_tokens = self.tokenize(query)
-        vocab = set(self.idf.keys())
         extra: List[str] = []
 
         for token in query_tokens:
-            if token in vocab or len(token) < 4:
+            if self._in_vocabulary(token) or len(token) < 4:
                 continue
             tok_bg = self._bigrams(token)
             best_word, best_dice = "", 0.0
-            for word in vocab:
+            for word in self._fuzzy_candidates(tok_bg):
                 if abs(len(word) - len(token)) > 3:
                     continue  # skip obviously different lengths early
                 w_bg = self._bigrams(word)
@@ -362,46 +904,1220 @@ class BM25:
         return self.score(self.expand_query(query, threshold))
 
 
-# ============ SEARCH FUNCTIONS ============
+# Upper bounds are compared with a little headroom so that float rounding in
+# a differently ordered sum can never prune a document that would qualify.
+_BOUND_SLACK = 1 + 1e-9
+# score_many ranks a query exhaustively, without pruning bookkeeping, when its
+# terms have at most this many postings in all
+_PRUNE_MIN_POSTINGS = 1024
+
+
+def _quantise_postings(bm25, entry, scale: float) -> List[Tuple[int, List[int]]]:
+    """Group a term's documents by quantised impact, highest first (ids ascending within)."""
+    docs, tfs, idf, _ = entry
+    k1, b, avgdl, doc_lengths = bm25.k1, bm25.b, bm25.avgdl, bm25.doc_lengths
+    segments: Dict[int, List[int]] = {}
+    for doc, tf in zip(docs, tfs):
+        impact = idf * (tf * (k1 + 1)) / (tf + k1 * (1 - b + b * doc_lengths[doc] / avgdl))
+        segments.setdefault(max(1, min(IMPACT_LEVELS, round(impact / scale))), []).append(doc)
+    return sorted(segments.items(), reverse=True)
+
+
+def _max_impact(bm25, idf: float, docs, tfs) -> float:
+    """Largest score contribution a term makes to any document of its postings."""
+    k1, b, avgdl, doc_lengths = bm25.k1, bm25.b, bm25.avgdl, bm25.doc_lengths
+    return max(idf * (tf * (k1 + 1)) / (tf + k1 * (1 - b + b * doc_lengths[doc] / avgdl)) for doc, tf in zip(docs, tfs))
+
+
+# ============ BINARY INDEX ============
+# A fitted BM25 index can be written to a compact little-endian file and
+# mapped back with ``mmap``.  Nothing is deserialised on open: terms are
+# found by binary search over a fixed-width table and postings are decoded
+# straight out of the mapping, so concurrent processes share page-cache
+# pages instead of each holding its own copy.
+#
+#   header      magic, format version, N, vocabulary size, k1, b, avgdl,
+#               impact scale, source (size, mtime_ns, sha256), search-column
+#               hash and the offsets of the sections below
+#   terms       per term: name offset/length, df, postings offset/length, idf,
+#               its largest score contribution (the MaxScore upper bound) and
+#               impact postings offset/length
+#   names       concatenated UTF-8 term names (stemmed tokens), sorted bytewise
+#   postings    per term: varint (doc id delta, tf) pairs
+#   doc_lens    uint32 per document
+#   row_offsets uint64 byte offset of each CSV record, plus end of file
+#   bigrams     character bigram -> ids of the terms containing it, so fuzzy
+#               expansion only compares candidates sharing a bigram
+#   facets      lowercased Platform value -> ids of the rows carrying it
+#   keys        normalised identity value (ID, Name, ... see ``_KEY_COLS``)
+#               -> ids of the rows carrying it, for exact-key ``get``
+#   impacts     per term, for --fast: segments of (uint8 quantised impact,
+#               varint count, varint doc id deltas), highest impact first
+#   row_hashes  uint64 digest of the CSV header and of each record's bytes,
+#               so a refresh finds the changed rows without parsing the rest
+#   doc_terms   uint32 offset per document (plus the end) and, per document,
+#               varint deltas of its sorted term ids: the terms a changed row
+#               used to have, whose document frequencies a refresh adjusts
+#
+# The three lookup tables use one layout: fixed-width entries (name offset and
+# length, first id, id count) sorted by name, a names blob and a uint32 ids
+# array.
+
+INDEX_DIR_NAME = ".index"
+INDEX_FORMAT_VERSION = 8
+_INDEX_MAGIC = b"MBPIDX\x00\x00"
+_INDEX_HEADER = struct.Struct("<8sIIIIIIddddQQ32s32s" + "Q" * 19)
+_INDEX_TERM = struct.Struct("<IIIIIddII")
+_INDEX_KEY = struct.Struct("<IIII")
+
+
+def _encode_varint(value: int, out: bytearray) -> None:
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(buf, pos: int) -> Tuple[int, int]:
+    """(value, position after it) of the varint starting at *pos*."""
+    value = shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def _decode_postings(buf, start: int, end: int):
+    """Yield (doc_id, tf) pairs from a delta/varint-encoded postings list."""
+    pos, doc = start, 0
+    while pos < end:
+        delta, pos = _read_varint(buf, pos)
+        tf, pos = _read_varint(buf, pos)
+        doc += delta
+        yield doc, tf
+
+
+def _columns_hash(search_cols: List[str]) -> bytes:
+    """Identity of the indexed columns (a different set needs its own file)."""
+    return hashlib.sha256("\x1f".join(search_cols).encode("utf-8")).digest()
+
+
+def _index_path(filepath: Path, search_cols: List[str]) -> Path:
+    return filepath.parent / INDEX_DIR_NAME / f"{filepath.stem}-{_columns_hash(search_cols).hex()[:8]}.idx"
+
+
+def _scan_csv(filepath: Path) -> Tuple[List[Dict[str, str]], List[int], array]:
+    """Parse a CSV like ``_load_csv`` and also return each record's byte offset.
+
+    Lines are split on ``\\r\\n``, ``\\r`` or ``\\n`` and normalised to
+    ``\\n`` exactly as text mode does, so the rows are identical; the extra
+    offset list has one entry per row plus the end of the file, and the
+    hashes are ``_record_hashes`` of those records.
+    """
+    data = filepath.read_bytes()
+    line_starts = [0] + [m.end() for m in re.finditer(rb"\r\n|\r|\n", data)]
+    if line_starts[-1] != len(data):
+        line_starts.append(len(data))
+
+    def lines():
+        for start, end in zip(line_starts, line_starts[1:]):
+            yield data[start:end].decode("utf-8").rstrip("\r\n") + "\n"
+
+    reader = csv.DictReader(lines())
+    rows, offsets = [], []
+    reader.fieldnames  # consume the header
+    consumed = reader.line_num
+    for row in reader:
+        # DictReader skips blank records, so start at the first non-empty line
+        start = consumed
+        while start < reader.line_num - 1 and not data[line_starts[start]:line_starts[start + 1]].strip():
+            start += 1
+        rows.append(row)
+        offsets.append(line_starts[start])
+        consumed = reader.line_num
+    offsets.append(len(data))
+    return rows, offsets, _record_hashes(data, offsets)
+
+
+def _record_offsets(data: bytes) -> List[int]:
+    """The record offsets ``_scan_csv`` finds, by a quote-parity scan instead of parsing.
+
+    A line break ends a record only once the quotes before it balance, which
+    holds for standard CSV quoting; ``_parse_record`` rejects a record that a
+    stray quote made the scan get wrong.  Blank lines belong to the record
+    before them.
+    """
+    offsets: List[int] = []
+    pos, balanced, header = 0, True, True
+    for line in data.splitlines(keepends=True):
+        if balanced and line.strip(b"\r\n"):
+            if not header:
+                offsets.append(pos)
+            header = False
+        if line.count(b'"') % 2:
+            balanced = not balanced
+        pos += len(line)
+    offsets.append(len(data))
+    return offsets
+
+
+def _record_hashes(data: bytes, offsets: List[int]) -> array:
+    """64-bit BLAKE2b digests of the header (first) and of every record of CSV *data*."""
+    bounds, view = [0, *offsets], memoryview(data)
+    hashes = array("Q")
+    hashes.frombytes(b"".join(hashlib.blake2b(view[start:end], digest_size=8).digest()
+                              for start, end in zip(bounds, bounds[1:])))
+    return hashes
+
+
+def _parse_record(chunk: bytes) -> List[str]:
+    """Values of the one record in *chunk*, exactly as ``_load_csv`` reads them.
+
+    Raises ``csv.Error`` unless *chunk* holds a single well-formed record
+    (blank lines aside).
+    """
+    lines = (line.decode("utf-8").rstrip("\r\n") + "\n" for line in chunk.splitlines(keepends=True))
+    records = [values for values in csv.reader(lines, strict=True) if values]
+    if len(records) != 1:
+        raise csv.Error(f"expected one record, found {len(records)}")
+    return records[0]
+
+
+def _row_dict(header: List[str], values: List[str]) -> Dict[Any, Any]:
+    """A record as ``csv.DictReader`` builds it: extra values under None, missing columns None."""
+    row: Dict[Any, Any] = dict(zip(header, values))
+    if len(values) > len(header):
+        row[None] = values[len(header):]
+    for col in header[len(values):]:
+        row[col] = None
+    return row
+
+
+def _row_facets(rows: List[Dict[str, str]]) -> Dict[str, List[int]]:
+    """Lowercased Platform value -> ids of the rows that carry it."""
+    facets: Dict[str, List[int]] = {}
+    for idx, row in enumerate(rows):
+        for col, value in row.items():
+            if col and col.lower() == "platform":
+                facets.setdefault(str(value).lower(), []).append(idx)
+    return facets
+
+
+# Identity columns indexed for exact-key lookups: the dedup column of every
+# CSV (see scripts/validate-csv.py) plus the alternative keys agents quote
+_KEY_COLS = ("ID", "Name", "Pattern Name", "Template Name", "Pattern", "Product Type", "Guideline", "Threat", "Issue",
+             "Version Catalog Key")
+
+
+def normalize_key(key: str) -> str:
+    """Lookup form of an identity value: stripped and lowercased, as validate-csv deduplicates."""
+    return str(key or "").strip().lower()
+
+
+def _row_keys(rows: List[Dict[str, str]]) -> Dict[str, List[int]]:
+    """Normalised identity value -> ids of the rows that carry it in any key column."""
+    keys: Dict[str, List[int]] = {}
+    for idx, row in enumerate(rows):
+        for col in _KEY_COLS:
+            key = normalize_key(row.get(col, ""))
+            if key:
+                ids = keys.setdefault(key, [])
+                if not ids or ids[-1] != idx:
+                    ids.append(idx)
+    return keys
+
+
+def _vocabulary_bigrams(words: List[str]) -> Dict[str, List[int]]:
+    """Character bigram -> ids (positions in *words*) of the words containing it."""
+    bigrams: Dict[str, List[int]] = {}
+    for idx, word in enumerate(words):
+        for bigram in BM25._bigrams(word):
+            bigrams.setdefault(bigram, []).append(idx)
+    return bigrams
+
+
+def _pack_keyed_lists(mapping: Dict[str, List[int]]) -> List[bytes]:
+    """Serialise a str -> ids mapping as (entries, names, ids) sections."""
+    table, names, ids = bytearray(), bytearray(), array("I")
+    for key in sorted(mapping):
+        name = key.encode("utf-8")
+        table += _INDEX_KEY.pack(len(names), len(name), len(ids), len(mapping[key]))
+        names += name
+        ids.extend(mapping[key])
+    return [bytes(table), bytes(names), ids.tobytes()]
+
+
+def write_index_file(path: Path, bm25: "BM25", source: Path, search_cols: List[str], row_offsets: List[int],
+                     row_hashes: array, facets: Dict[str, List[int]], keys: Dict[str, List[int]]) -> None:
+    """Serialise a freshly fitted *bm25* over *source* to *path* atomically."""
+    if bm25.deleted:
+        raise ValueError("only a freshly fitted index can be written")
+    postings: Dict[str, bytearray] = {}
+    last_doc: Dict[str, int] = {}
+    for idx, term_freqs in enumerate(bm25.term_freqs):
+        for word, tf in term_freqs.items():
+            buf = postings.setdefault(word, bytearray())
+            _encode_varint(idx - last_doc.get(word, 0), buf)
+            _encode_varint(tf, buf)
+            last_doc[word] = idx
+    words = sorted(postings)  # code point order == UTF-8 byte order
+
+    table, names, blob, impacts = bytearray(), bytearray(), bytearray(), bytearray()
+    for word in words:
+        name = word.encode("utf-8")
+        impact_at = len(impacts)
+        for impact, docs in bm25._impact_list(word) or ():
+            impacts.append(impact)
+            _encode_varint(len(docs), impacts)
+            previous = 0
+            for doc in docs:
+                _encode_varint(doc - previous, impacts)
+                previous = doc
+        table += _INDEX_TERM.pack(len(names), len(name), bm25.doc_freqs[word], len(blob), len(postings[word]),
+                                  bm25.idf[word], bm25._posting_list(word)[3], impact_at, len(impacts) - impact_at)
+        names += name
+        blob += postings[word]
+    bigrams = _vocabulary_bigrams(words)
+
+    term_ids = {word: i for i, word in enumerate(words)}
+    doc_terms, doc_terms_at = bytearray(), array("I")
+    for term_freqs in bm25.term_freqs:
+        doc_terms_at.append(len(doc_terms))
+        previous = 0
+        for term_id in sorted(term_ids[word] for word in term_freqs):
+            _encode_varint(term_id - previous, doc_terms)
+            previous = term_id
+    doc_terms_at.append(len(doc_terms))
+
+    sections = [bytes(table), bytes(names), bytes(blob),
+                array("I", bm25.doc_lengths).tobytes(), array("Q", row_offsets).tobytes(),
+                *_pack_keyed_lists(bigrams), *_pack_keyed_lists(facets), *_pack_keyed_lists(keys), bytes(impacts),
+                array("Q", row_hashes).tobytes(), doc_terms_at.tobytes(), bytes(doc_terms)]
+    offsets, pos = [], _INDEX_HEADER.size
+    for section in sections:
+        pos += -pos % 8
+        offsets.append(pos)
+        pos += len(section)
+    stat = source.stat()
+    header = _INDEX_HEADER.pack(
+        _INDEX_MAGIC, INDEX_FORMAT_VERSION, bm25.N, len(words), len(bigrams), len(facets), len(keys),
+        bm25.k1, bm25.b, bm25.avgdl, bm25._impact_scale,
+        stat.st_size, stat.st_mtime_ns, hashlib.sha256(source.read_bytes()).digest(), _columns_hash(search_cols),
+        *offsets, pos)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(header)
+        for offset, section in zip(offsets, sections):
+            f.write(b"\x00" * (offset - f.tell()))
+            f.write(section)
+    os.replace(tmp, path)
+
+
+class _KeyedLists:
+    """Read side of ``_pack_keyed_lists``: sorted str -> uint32 ids, mapped."""
+
+    def __init__(self, buf: memoryview, count: int, table_at: int, names_at: int, ids_at: int, ids_end: int):
+        self.buf, self.count = buf, count
+        self._table_at, self._names_at = table_at, names_at
+        self.ids = buf[ids_at:ids_end].cast("I")
+
+    def _entry(self, i: int) -> Tuple[int, int, int, int]:
+        return _INDEX_KEY.unpack_from(self.buf, self._table_at + i * _INDEX_KEY.size)
+
+    def _key(self, entry) -> bytes:
+        start = self._names_at + entry[0]
+        return bytes(self.buf[start:start + entry[1]])
+
+    def get(self, key: str) -> memoryview:
+        """Ids stored under *key* (empty if absent), by binary search."""
+        target = key.encode("utf-8")
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            entry = self._entry(mid)
+            name = self._key(entry)
+            if name == target:
+                return self.ids[entry[2]:entry[2] + entry[3]]
+            if name < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return self.ids[0:0]
+
+    def items(self) -> Iterator[Tuple[str, memoryview]]:
+        for i in range(self.count):
+            entry = self._entry(i)
+            yield self._key(entry).decode("utf-8"), self.ids[entry[2]:entry[2] + entry[3]]
+
+
+class MappedBM25:
+    """Read-only BM25 index served from a memory-mapped index file.
+
+    Scores are bit-for-bit identical to ``BM25.score`` on the same corpus.
+    """
+
+    tokenize = BM25.tokenize
+    _bigrams = staticmethod(BM25._bigrams)
+    expand_query = BM25.expand_query
+    score_fuzzy = BM25.score_fuzzy
+    top_k = BM25.top_k
+    score_many = BM25.score_many
+    _accumulate_top_k = BM25._accumulate_top_k
+    term_stats = BM25.term_stats
+    explain = BM25.explain
+    fast_top_k = BM25.fast_top_k
+    deleted: frozenset = frozenset()
+
+    def __init__(self, path: Path):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.buf = memoryview(self._mmap)
+        magic, version = struct.unpack_from("<8sI", self.buf)
+        if magic != _INDEX_MAGIC or version != INDEX_FORMAT_VERSION:
+            raise ValueError(f"{path} is not a version {INDEX_FORMAT_VERSION} index file")
+        (_, _, self.N, self.n_terms, n_bigrams, n_facets, n_keys, self.k1, self.b, self.avgdl, self._impact_scale,
+         self.source_size, self.source_mtime_ns, self.source_sha256, self.columns_hash,
+         terms_at, names_at, postings_at, lens_at, rows_at,
+         bigrams_at, bigram_names_at, bigram_ids_at, facets_at, facet_names_at, facet_ids_at,
+         keys_at, key_names_at, key_ids_at, impacts_at, hashes_at, doc_terms_at, doc_terms_blob_at,
+         end) = _INDEX_HEADER.unpack_from(self.buf)
+        if end != len(self.buf):
+            raise ValueError(f"{path} is truncated")
+        self._terms_at, self._names_at, self._postings_at = terms_at, names_at, postings_at
+        self.doc_lengths = self.buf[lens_at:lens_at + 4 * self.N].cast("I")
+        self.row_offsets = self.buf[rows_at:rows_at + 8 * (self.N + 1)].cast("Q")
+        self.bigrams = _KeyedLists(self.buf, n_bigrams, bigrams_at, bigram_names_at, bigram_ids_at, facets_at)
+        self.facets = _KeyedLists(self.buf, n_facets, facets_at, facet_names_at, facet_ids_at, keys_at)
+        self.keys = _KeyedLists(self.buf, n_keys, keys_at, key_names_at, key_ids_at, impacts_at)
+        self.row_hashes = self.buf[hashes_at:hashes_at + 8 * (self.N + 1)].cast("Q")
+        self._doc_terms_at = self.buf[doc_terms_at:doc_terms_at + 4 * (self.N + 1)].cast("I")
+        self._impacts_at, self._doc_terms_blob_at = impacts_at, doc_terms_blob_at
+        self._vocabulary: Optional[List[str]] = None
+        self._decoded: Dict[str, Optional[Tuple[List[int], List[int], float, float]]] = {}
+        self._decoded_impacts: Dict[str, Optional[List[Tuple[int, List[int]]]]] = {}
+
+    def matches(self, source: Path, search_cols: List[str]) -> bool:
+        """True if this file was built from the current *source* and columns."""
+        if self.columns_hash != _columns_hash(search_cols):
+            return False
+        stat = source.stat()
+        if stat.st_size != self.source_size:
+            return False
+        return (stat.st_mtime_ns == self.source_mtime_ns
+                or hashlib.sha256(source.read_bytes()).digest() == self.source_sha256)
+
+    def _term(self, i: int) -> Tuple[int, int, int, int, int, float, float, int, int]:
+        return _INDEX_TERM.unpack_from(self.buf, self._terms_at + i * _INDEX_TERM.size)
+
+    def _name(self, entry) -> bytes:
+        start = self._names_at + entry[0]
+        return bytes(self.buf[start:start + entry[1]])
+
+    def lookup(self, word: str) -> Optional[Tuple[int, int, int, int, int, float, float, int, int]]:
+        """Term table entry for *word*, by binary search over the sorted names."""
+        key = word.encode("utf-8")
+        lo, hi = 0, self.n_terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            entry = self._term(mid)
+            name = self._name(entry)
+            if name == key:
+                return entry
+            if name < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+    def postings(self, entry) -> Iterator[Tuple[int, int]]:
+        start = self._postings_at + entry[3]
+        return _decode_postings(self.buf, start, start + entry[4])
+
+    def _posting_list(self, word: str) -> Optional[Tuple[List[int], List[int], float, float]]:
+        """Decoded postings of *word* for ``top_k``; kept for the hot vocabulary.
+
+        The cache may be cleared by another thread at any point, so a value
+        is read from it once and never re-read.
+        """
+        cached = self._decoded.get(word, ...)
+        if cached is not ...:
+            return cached
+        entry = self.lookup(word)
+        if entry is None:
+            decoded = None
+        else:
+            pairs = list(self.postings(entry))
+            decoded = ([doc for doc, _ in pairs], [tf for _, tf in pairs], entry[5], entry[6])
+        if len(self._decoded) >= 4096:
+            self._decoded.clear()
+        self._decoded[word] = decoded
+        return decoded
+
+    def _impact_list(self, word: str) -> Optional[List[Tuple[int, List[int]]]]:
+        """Decoded impact segments of *word* for ``fast_top_k``."""
+        cached = self._decoded_impacts.get(word, ...)
+        if cached is not ...:
+            return cached
+        entry = self.lookup(word)
+        segments = None
+        if entry is not None:
+            segments = []
+            pos, end = self._impacts_at + entry[7], self._impacts_at + entry[7] + entry[8]
+            while pos < end:
+                impact = self.buf[pos]
+                count, pos = _read_varint(self.buf, pos + 1)
+                docs, doc = [], 0
+                for _ in range(count):
+                    delta, pos = _read_varint(self.buf, pos)
+                    doc += delta
+                    docs.append(doc)
+                segments.append((impact, docs))
+        if len(self._decoded_impacts) >= 4096:
+            self._decoded_impacts.clear()
+        self._decoded_impacts[word] = segments
+        return segments
+
+    def doc_terms(self, doc: int) -> List[str]:
+        """The distinct terms of document *doc*, in sorted order."""
+        pos, end = self._doc_terms_blob_at + self._doc_terms_at[doc], self._doc_terms_blob_at + self._doc_terms_at[doc + 1]
+        words, term_id = [], 0
+        while pos < end:
+            delta, pos = _read_varint(self.buf, pos)
+            term_id += delta
+            words.append(self._name(self._term(term_id)).decode("utf-8"))
+        return words
+
+    def vocabulary(self) -> List[str]:
+        """All terms in sorted order (decoded once, on first fuzzy query)."""
+        if self._vocabulary is None:
+            self._vocabulary = [self._name(self._term(i)).decode("utf-8") for i in range(self.n_terms)]
+        return self._vocabulary
+
+    def document_frequencies(self) -> Iterator[Tuple[str, int]]:
+        """(term, document frequency) for the whole vocabulary."""
+        vocabulary = self.vocabulary()
+        return ((vocabulary[i], self._term(i)[2]) for i in range(self.n_terms))
+
+    def _in_vocabulary(self, word: str) -> bool:
+        return self.lookup(word) is not None
+
+    def _fuzzy_candidates(self, bigrams: set) -> List[str]:
+        """Terms sharing at least one bigram with the token, in sorted order."""
+        vocabulary = self.vocabulary()
+        ids = set()
+        for bigram in bigrams:
+            ids.update(self.bigrams.get(bigram))
+        return [vocabulary[i] for i in sorted(ids)]
+
+    def score(self, query: str) -> List[Tuple[int, float]]:
+        """Score all documents against query (term-at-a-time over postings)."""
+        scores = [0.0] * self.N
+        doc_lengths = self.doc_lengths
+        for token in self.tokenize(query):
+            entry = self.lookup(token)
+            if entry is None:
+                continue
+            idf = entry[5]
+            for idx, tf in self.postings(entry):
+                numerator = tf * (self.k1 + 1)
+                denominator = tf + self.k1 * (1 - self.b + self.b * doc_lengths[idx] / self.avgdl)
+                scores[idx] = scores[idx] + (idf * numerator / denominator)
+        return sorted(enumerate(scores), key=lambda x: x[1], reverse=True)
+
+
+class PatchedBM25:
+    """A ``MappedBM25`` with a row-level diff layered over it in memory.
+
+    The mapped file is read-only, so ``CsvIndex.refresh`` records the diff
+    instead of rebuilding: *changed* holds the term frequencies of every
+    updated or added document, *deleted* the removed ones and *doc_lengths*
+    all current lengths.  A term's postings are the base postings without
+    those documents, merged with the changed ones.  Only the terms a changed
+    document has or had (from the file's ``doc_terms``) get a new document
+    frequency, so building the layer costs time proportional to the diff;
+    N, avgdl and IDF are the ones a refit would compute, so scores match
+    ``BM25.score`` on the new file bit for bit.
+    """
+
+    tokenize = BM25.tokenize
+    _bigrams = staticmethod(BM25._bigrams)
+    expand_query = BM25.expand_query
+    score_fuzzy = BM25.score_fuzzy
+    top_k = BM25.top_k
+    score_many = BM25.score_many
+    _accumulate_top_k = BM25._accumulate_top_k
+    term_stats = BM25.term_stats
+    explain = BM25.explain
+    fast_top_k = BM25.fast_top_k
+
+    def __init__(self, base: MappedBM25, doc_lengths: array, changed: Dict[int, Dict[str, int]], deleted: set):
+        self.base, self.changed, self.deleted = base, changed, deleted
+        self.k1, self.b, self._impact_scale = base.k1, base.b, base._impact_scale
+        self.doc_lengths = doc_lengths
+        self.N = len(doc_lengths) - len(deleted)
+        self.avgdl = sum(doc_lengths) / self.N if self.N else 0.0
+        self._masked = frozenset(doc for doc in (*changed, *deleted) if doc < base.N)
+        delta: Dict[str, int] = {}
+        for doc in self._masked:
+            for word in base.doc_terms(doc):
+                delta[word] = delta.get(word, 0) - 1
+        self._changed_docs: Dict[str, List[int]] = {}
+        for doc in sorted(changed):
+            for word in changed[doc]:
+                delta[word] = delta.get(word, 0) + 1
+                self._changed_docs.setdefault(word, []).append(doc)
+        # Document frequency of every term a changed document has or had
+        self._dfs: Dict[str, int] = {}
+        self._new_words: List[str] = []
+        for word, change in delta.items():
+            entry = base.lookup(word)
+            self._dfs[word] = (entry[2] if entry else 0) + change
+            if entry is None:
+                self._new_words.append(word)
+        self._new_words.sort()
+        self._same_stats = self.N == base.N and self.avgdl == base.avgdl
+        self._vocabulary: Optional[List[str]] = None
+        self._decoded: Dict[str, Optional[Tuple[List[int], List[int], float, float]]] = {}
+        self._decoded_impacts: Dict[str, Optional[List[Tuple[int, List[int]]]]] = {}
+
+    def _posting_list(self, word: str) -> Optional[Tuple[List[int], List[int], float, float]]:
+        """Postings of *word* with the diff applied, as ``MappedBM25._posting_list``."""
+        cached = self._decoded.get(word, ...)
+        if cached is not ...:
+            return cached
+        base_entry = self.base._posting_list(word)
+        decoded: Optional[Tuple[List[int], List[int], float, float]] = None
+        if word not in self._dfs:
+            # No changed document has or had it: only the IDF and bound can move
+            if base_entry is not None:
+                decoded = base_entry if self._same_stats else self._entry(base_entry[0], base_entry[1])
+        elif self._dfs[word] > 0:
+            masked, changed = self._masked, self.changed
+            pairs = [(doc, tf) for doc, tf in zip(base_entry[0], base_entry[1]) if doc not in masked] if base_entry else []
+            pairs += [(doc, changed[doc][word]) for doc in self._changed_docs.get(word, ())]
+            pairs.sort()
+            decoded = self._entry([doc for doc, _ in pairs], [tf for _, tf in pairs])
+        if len(self._decoded) >= 4096:
+            self._decoded.clear()
+        self._decoded[word] = decoded
+        return decoded
+
+    def _entry(self, docs: List[int], tfs: List[int]) -> Tuple[List[int], List[int], float, float]:
+        idf = log((self.N - len(docs) + 0.5) / (len(docs) + 0.5) + 1)
+        return docs, tfs, idf, _max_impact(self, idf, docs, tfs)
+
+    def _impact_list(self, word: str) -> Optional[List[Tuple[int, List[int]]]]:
+        """Impact segments of *word* for ``fast_top_k``, quantised on the file's scale."""
+        if self._same_stats and word not in self._dfs:
+            return self.base._impact_list(word)
+        cached = self._decoded_impacts.get(word, ...)
+        if cached is not ...:
+            return cached
+        entry = self._posting_list(word)
+        segments = _quantise_postings(self, entry, self._impact_scale) if entry else None
+        if len(self._decoded_impacts) >= 4096:
+            self._decoded_impacts.clear()
+        self._decoded_impacts[word] = segments
+        return segments
+
+    def document_frequencies(self) -> Iterator[Tuple[str, int]]:
+        """(term, document frequency) for the whole vocabulary."""
+        base = ((word, self._dfs.get(word, df)) for word, df in self.base.document_frequencies())
+        merged = sorted([*base, *((word, self._dfs[word]) for word in self._new_words)])
+        return ((word, df) for word, df in merged if df > 0)
+
+    def vocabulary(self) -> List[str]:
+        """All terms in sorted order (built once, on first use)."""
+        if self._vocabulary is None:
+            self._vocabulary = [word for word, _ in self.document_frequencies()]
+        return self._vocabulary
+
+    def _in_vocabulary(self, word: str) -> bool:
+        return self._dfs[word] > 0 if word in self._dfs else self.base._in_vocabulary(word)
+
+    def _fuzzy_candidates(self, bigrams: set) -> List[str]:
+        """Terms sharing at least one bigram with the token, in sorted order."""
+        candidates = [word for word in self.base._fuzzy_candidates(bigrams) if self._dfs.get(word, 1) > 0]
+        candidates += [word for word in self._new_words if self._dfs[word] > 0 and self._bigrams(word) & bigrams]
+        return sorted(candidates)
+
+    def score(self, query: str) -> List[Tuple[int, float]]:
+        """Score all documents against query (term-at-a-time over postings)."""
+        scores = [0.0] * len(self.doc_lengths)
+        doc_lengths = self.doc_lengths
+        for token in self.tokenize(query):
+            entry = self._posting_list(token)
+            if entry is None:
+                continue
+            docs, tfs, idf, _ = entry
+            for idx, tf in zip(docs, tfs):
+                numerator = tf * (self.k1 + 1)
+                denominator = tf + self.k1 * (1 - self.b + self.b * doc_lengths[idx] / self.avgdl)
+                scores[idx] = scores[idx] + (idf * numerator / denominator)
+        return sorted(((idx, doc_score) for idx, doc_score in enumerate(scores) if idx not in self.deleted),
+                      key=lambda x: x[1], reverse=True)
+
+
+class _PatchedLists:
+    """Keyed id lists (facets or keys) of a mapped index with changed rows layered over them.
+
+    *doc_values* maps every updated, added or removed row to the keys it now
+    carries (none for a removed row); the base lists are read without those
+    rows.
+    """
+
+    def __init__(self, base: _KeyedLists, base_rows: int, doc_values: Dict[int, List[str]]):
+        self.base, self.doc_values = base, doc_values
+        self._masked = frozenset(doc for doc in doc_values if doc < base_rows)
+        self._lists: Dict[str, List[int]] = {}
+        for doc in sorted(doc_values):
+            for key in doc_values[doc]:
+                self._lists.setdefault(key, []).append(doc)
+
+    def _merged(self, key: str, base_ids) -> List[int]:
+        return sorted([*(idx for idx in base_ids if idx not in self._masked), *self._lists.get(key, ())])
+
+    def get(self, key: str) -> List[int]:
+        return self._merged(key, self.base.get(key))
+
+    def items(self) -> Iterator[Tuple[str, List[int]]]:
+        seen = set()
+        for key, ids in self.base.items():
+            seen.add(key)
+            merged = self._merged(key, ids)
+            if merged:
+                yield key, merged
+        for key in sorted(self._lists.keys() - seen):
+            yield key, self._lists[key]
+
+
+def _build_index(filepath: Path, search_cols: List[str]) -> Tuple[List[Dict[str, str]], List[str], "BM25", List[int], array]:
+    """Parse *filepath* and fit BM25 over *search_cols*: (rows, documents, bm25, row offsets, record hashes)."""
+    rows, row_offsets, row_hashes = _scan_csv(filepath)
+    documents = [CsvIndex.document(row, search_cols) for row in rows]
+    bm25 = BM25()
+    bm25.fit(documents)
+    return rows, documents, bm25, row_offsets, row_hashes
+
+
+def index_sources() -> List[Tuple[Path, List[str]]]:
+    """Every (csv path, search columns) pair the search functions index."""
+    return default_knowledge_base().sources()
+
+
+def build_index_file(filepath: Path, search_cols: List[str]) -> Dict[str, Any]:
+    """Build and write the index file for one CSV; returns what was written."""
+    rows, _, bm25, row_offsets, row_hashes = _build_index(filepath, search_cols)
+    path = _index_path(filepath, search_cols)
+    write_index_file(path, bm25, filepath, search_cols, row_offsets, row_hashes, _row_facets(rows), _row_keys(rows))
+    return {
+        "index": path.name,
+        "search_cols": search_cols,
+        "sha256": hashlib.sha256(filepath.read_bytes()).hexdigest(),
+        "size": filepath.stat().st_size,
+        "rows": bm25.N,
+        "terms": len(bm25.idf),
+        "bytes": path.stat().st_size,
+    }
+
+
+def _open_index_file(filepath: Path, search_cols: List[str]) -> Optional[MappedBM25]:
+    """Map the index file for *filepath* if one exists and is current."""
+    if sys.byteorder != "little":
+        return None
+    try:
+        mapped = MappedBM25(_index_path(filepath, search_cols))
+    except (OSError, ValueError, struct.error):
+        return None
+    return mapped if mapped.matches(filepath, search_cols) else None
+
+
+# ============ INDEX CACHE ============
 def _load_csv(filepath):
     """Load CSV and return list of dicts"""
     with open(filepath, 'r', encoding='utf-8') as f:
         return list(csv.DictReader(f))
 
 
-def _score_csv(filepath: Path, search_cols: List[str], output_cols: List[str], query: str, top_k: int, fuzzy: bool = False) -> List[Tuple[float, Dict[str, str]]]:
-    """Return (normalized_score, row) pairs for the top_k hits in one CSV.
+@lru_cache(maxsize=65536)
+def estimate_tokens(text: str) -> int:
+    """Approximate LLM token count of a string (~4 characters per token).
 
-    Scores are normalised to [0, 1] by dividing by the maximum score in the
-    file so that results from different corpora are comparable when merged.
+    Memoised, so budgeting the same rows and column names again costs only
+    cache lookups.
     """
-    if not filepath.exists():
-        return []
+    if not text:
+        return 0
+    return max(1, (len(text) + 3) // 4)
 
-    data = _load_csv(filepath)
-    if not data:
-        return []
 
-    documents = [" ".join(str(row.get(col, "")) for col in search_cols) for row in data]
-    bm25 = BM25()
-    bm25.fit(documents)
-    ranked = bm25.score_fuzzy(query) if fuzzy else bm25.score(query)
+def _row_key(row: Dict[str, Any]) -> Tuple:
+    """Hashable identity of a parsed row (extra unnamed fields arrive as a list)."""
+    return tuple(tuple(v) if isinstance(v, list) else v for v in row.values())
+
+
+def diff_rows(old_rows: List[Dict[str, str]], new_rows: List[Dict[str, str]]) -> List[Tuple[str, Optional[int], Optional[int]]]:
+    """Row-level diff between two versions of a CSV.
 
-    candidates = [(idx, score) for idx, score in ranked[:top_k * 2] if score > 0]
-    if not candidates:
-        return []
+    Returns ``(op, old_index, new_index)`` tuples where op is ``"update"``
+    (old row replaced by new row), ``"add"`` (old_index None) or ``"remove"``
+    (new_index None).  Unchanged rows produce no entry.
+    """
+    return [op for op in _diff_keys([_row_key(r) for r in old_rows], [_row_key(r) for r in new_rows]) if op[0] != "equal"]
+
+
+def _diff_keys(old_keys: List[Any], new_keys: List[Any]) -> List[Tuple[str, Optional[int], Optional[int]]]:
+    """``diff_rows`` over precomputed row identities, also listing the ``"equal"`` pairs.
+
+    Edits are usually local, so the common head and tail are matched first
+    and only what lies between goes through ``difflib``.
+    """
+    head, limit = 0, min(len(old_keys), len(new_keys))
+    while head < limit and old_keys[head] == new_keys[head]:
+        head += 1
+    tail = 0
+    while tail < limit - head and old_keys[-1 - tail] == new_keys[-1 - tail]:
+        tail += 1
+    matcher = difflib.SequenceMatcher(None, old_keys[head:len(old_keys) - tail], new_keys[head:len(new_keys) - tail],
+                                      autojunk=False)
+    ops: List[Tuple[str, Optional[int], Optional[int]]] = [("equal", k, k) for k in range(head)]
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        i1, i2, j1, j2 = i1 + head, i2 + head, j1 + head, j2 + head
+        if tag == "equal":
+            ops.extend(("equal", i1 + k, j1 + k) for k in range(i2 - i1))
+            continue
+        paired = min(i2 - i1, j2 - j1)
+        ops.extend(("update", i1 + k, j1 + k) for k in range(paired))
+        ops.extend(("remove", i, None) for i in range(i1 + paired, i2))
+        ops.extend(("add", None, j) for j in range(j1 + paired, j2))
+    ops.extend(("equal", len(old_keys) - tail + k, len(new_keys) - tail + k) for k in range(tail))
+    return ops
+
+
+def _patch_keyed(mapping: Dict[str, List[int]], old_rows: Dict[int, Dict[str, str]], new_rows: Dict[int, Dict[str, str]],
+                 keyed) -> Dict[str, List[int]]:
+    """*mapping*, built by *keyed* (``_row_facets`` or ``_row_keys``), with some rows replaced.
+
+    *old_rows* and *new_rows* map row ids to their previous and current
+    contents.  Only the lists of the keys those rows carry are rebuilt; the
+    others are shared with *mapping*, which is left as it was.
+    """
+    patched = dict(mapping)
+    for idx, row in old_rows.items():
+        for key in keyed([row]):
+            ids = patched[key]
+            at = bisect_left(ids, idx)
+            if len(ids) > 1:
+                patched[key] = ids[:at] + ids[at + 1:]
+            else:
+                del patched[key]
+    for idx, row in new_rows.items():
+        for key in keyed([row]):
+            ids = patched.get(key, [])
+            at = bisect_left(ids, idx)
+            patched[key] = ids[:at] + [idx] + ids[at:]
+    return patched
+
+
+class _CsvRecords:
+    """The rows of a CSV, parsed from their byte offsets only when accessed.
+
+    The file is mapped read-only and nothing parsed is kept, so resident
+    memory does not grow with the number or width of the rows.  Indexing
+    gives the row exactly as ``_load_csv`` would; ``project`` builds only
+    the requested columns.  After a refresh, *order* maps each document id
+    to its record (-1 for a removed row, which reads as an empty tombstone).
+    """
+
+    def __init__(self, filepath: Path, offsets: Any, order: Optional[array] = None):
+        self._offsets, self.order = offsets, order
+        with open(filepath, "rb") as f:
+            self._data: Any = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+        self.header = self._parse(0, offsets[0] if len(offsets) > 1 else len(self._data))
+        # Like DictReader's dict(zip(...)), a repeated column name maps to its last position
+        self._positions = {col: pos for pos, col in enumerate(self.header)}
+
+    def _parse(self, start: int, end: int) -> List[str]:
+        chunk = self._data[start:end]
+        if b'"' not in chunk:
+            # No quoting, so no embedded separators or line breaks
+            line = next((line for line in chunk.splitlines() if line), b"")
+            return line.decode("utf-8").split(",") if line else []
+        # Line endings are normalised as in _scan_csv, so values match _load_csv
+        lines = (line.decode("utf-8").rstrip("\r\n") + "\n" for line in chunk.splitlines(keepends=True))
+        return next((values for values in csv.reader(lines) if values), [])
+
+    def values(self, idx: int) -> Optional[List[str]]:
+        """Values of row *idx*, or None for a tombstone."""
+        if not 0 <= idx < len(self):
+            raise IndexError(idx)
+        record = idx if self.order is None else self.order[idx]
+        if record < 0:
+            return None
+        return self._parse(self._offsets[record], self._offsets[record + 1])
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1 if self.order is None else len(self.order)
+
+    def __getitem__(self, idx: int) -> Dict[str, Any]:
+        values = self.values(idx)
+        return _row_dict(self.header, values) if values is not None else {}
+
+    def project(self, idx: int, cols: List[str]) -> Dict[str, str]:
+        """``_project_row(self[idx], cols)`` without building the other columns."""
+        values = self.values(idx)
+        if values is None:
+            return {}
+        positions = self._positions
+        return {col: values[positions[col]] if positions[col] < len(values) else None  # type: ignore[misc]
+                for col in cols if col in positions}
+
+
+class _LazyColumn:
+    """A read-only sequence whose item *i* is ``fn(i)``, computed on every access."""
+
+    def __init__(self, length: int, fn):
+        self._length, self._fn = length, fn
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, idx: int) -> Any:
+        if not 0 <= idx < self._length:
+            raise IndexError(idx)
+        return self._fn(idx)
+
+
+class CsvIndex:
+    """Rows of one CSV plus the BM25 index fitted over its search columns.
+
+    Built once per (file, search columns) and reused until the file changes;
+    an edited file is then applied as a row-level diff to a copy (see
+    ``refreshed``), so readers of the old index are never disturbed.
+    The BM25 side comes from the mapped index file under ``.index/`` when it
+    is current, and is otherwise fitted here and written there for the next
+    process.
+
+    With a mapped index file the rows stay in the CSV: ``rows`` and
+    ``documents`` are lazy sequences that parse a record from its byte
+    offset (stored in the index file) when it is accessed, and ``row``
+    decodes just the requested columns, so only returned rows are ever
+    materialised.  An index fitted in memory holds them as lists.
+
+    ``rows`` and ``documents`` are aligned with the BM25 document ids; a
+    removed row stays as an empty tombstone.  ``row_hashes`` holds the
+    ``_record_hashes`` digest of each row's record, which is how ``refresh``
+    tells the changed rows apart.
+    """
+
+    # Past this share of changed rows a full rebuild is cheaper than patching
+    REBUILD_RATIO = 0.5
+
+    def __init__(self, filepath: Path, search_cols: List[str]):
+        self.filepath = filepath
+        self.search_cols = search_cols
+        self.signature = _file_signature(filepath)
+        self.bm25: Union[BM25, MappedBM25, PatchedBM25]
+        self.facets: Any
+        self.keys: Any
+        self.rows: Any
+        self.documents: Any
+        self.row_hashes: Any
+        mapped = _open_index_file(filepath, search_cols)
+        if mapped is not None:
+            self.rows = _CsvRecords(filepath, mapped.row_offsets)
+            self.documents = _LazyColumn(mapped.N, lambda idx: self.document(self.row(idx, search_cols), search_cols))
+            self.bm25, self.facets, self.keys = mapped, mapped.facets, mapped.keys
+            self.header_hash, self.row_hashes = mapped.row_hashes[0], mapped.row_hashes[1:]
+        else:
+            self.rows, self.documents, self.bm25, row_offsets, row_hashes = _build_index(filepath, search_cols)
+            self.facets, self.keys = _row_facets(self.rows), _row_keys(self.rows)
+            self.header_hash, self.row_hashes = row_hashes[0], row_hashes[1:]
+            try:
+                write_index_file(_index_path(filepath, search_cols), self.bm25, filepath, search_cols, row_offsets,
+                                 row_hashes, self.facets, self.keys)
+            except OSError:
+                pass  # read-only install: keep the in-memory index
+
+    def row(self, idx: int, cols: Optional[List[str]] = None) -> Dict[str, str]:
+        """Row *idx*, projected to *cols* if given (see ``_project_row``)."""
+        if cols is None:
+            return self.rows[idx]
+        if isinstance(self.rows, _CsvRecords):
+            return self.rows.project(idx, cols)
+        return _project_row(self.rows[idx], cols)
+
+    @staticmethod
+    def document(row: Dict[str, str], search_cols: List[str]) -> str:
+        """The text BM25 indexes for *row*."""
+        return " ".join(str(row.get(col, "")) for col in search_cols)
+
+    def platform_rows(self, platform: str) -> set:
+        """Ids of the rows whose Platform value contains *platform* (case-insensitive)."""
+        platform = platform.lower()
+        return {idx for value, ids in self.facets.items() if platform in value for idx in ids}
+
+    def key_rows(self, key: str) -> List[int]:
+        """Ids of the rows whose ID / Name / ... column equals *key* (case-insensitive), in file order."""
+        return list(self.keys.get(normalize_key(key)) or ())
+
+    def refresh(self) -> Dict[str, int]:
+        """Bring the index up to date with the file on disk.
+
+        Records are located by ``_record_offsets`` and compared with the
+        indexed ones by hash, so only the rows that differ are parsed,
+        re-tokenised and re-counted: in place for an index fitted in memory,
+        as a ``PatchedBM25`` layer for a mapped one.  Returns the number of
+        updated / added / removed rows (all zero if the file was rebuilt from
+        scratch instead, because its header or most of its rows changed or a
+        changed record is not well-formed).
+        """
+        counts = {"update": 0, "add": 0, "remove": 0}
+        signature = _file_signature(self.filepath)
+        data = self.filepath.read_bytes()
+        offsets = _record_offsets(data)
+        hashes = _record_hashes(data, offsets)
+        live = [i for i in range(len(self.row_hashes)) if i not in self.bm25.deleted]
+        ops = _diff_keys([self.row_hashes[i] for i in live], hashes[1:])
+        changes = [(op, old, new) for op, old, new in ops if op != "equal"]
+        pending = len(changes)
+        if isinstance(self.bm25, PatchedBM25):
+            pending += len(self.bm25.changed) + len(self.bm25.deleted)
+
+        new_rows = None
+        if hashes[0] == self.header_hash and pending <= max(len(offsets) - 1, 1) * self.REBUILD_RATIO:
+            try:
+                header = _parse_record(data[:offsets[0]])
+                new_rows = {new: _row_dict(header, _parse_record(data[offsets[new]:offsets[new + 1]]))
+                            for _, _, new in changes if new is not None}
+            except (csv.Error, UnicodeDecodeError):
+                pass  # malformed quoting: let a full parse report or handle it
+        if new_rows is None:
+            self.__init__(self.filepath, self.search_cols)
+            return counts
+
+        for op, _, _ in changes:
+            counts[op] += 1
+        if isinstance(self.bm25, BM25):
+            self._patch_rows(changes, live, new_rows, hashes)
+        else:
+            self._patch_mapped(ops, live, new_rows, offsets, hashes)
+        self.signature = signature
+        return counts
+
+    def _patch_rows(self, changes, live: List[int], new_rows: Dict[int, Dict[str, str]], hashes: array) -> None:
+        """Apply a diff to an index fitted in memory, in place."""
+        row_hashes = array("Q", self.row_hashes)
+        old_rows: Dict[int, Dict[str, str]] = {}
+        current: Dict[int, Dict[str, str]] = {}
+        removed, added = [], []
+        for op, old, new in changes:
+            if op == "add":
+                added.append(new)
+                continue
+            idx = live[old]
+            old_rows[idx] = self.rows[idx]
+            if op == "update":
+                current[idx] = new_rows[new]
+                row_hashes[idx] = hashes[new + 1]
+                self._set_row(idx, new_rows[new])
+                self.bm25.update_document(idx, self.documents[idx])
+            else:
+                self._set_row(idx, {})
+                removed.append(idx)
+        self.bm25.remove_documents(removed)
+        for new in added:
+            current[len(self.rows)] = new_rows[new]
+            row_hashes.append(hashes[new + 1])
+            self.rows.append(new_rows[new])
+            self.documents.append(self.document(new_rows[new], self.search_cols))
+        self.bm25.add_documents(self.documents[len(self.documents) - len(added):])
+        self.facets = _patch_keyed(self.facets, old_rows, current, _row_facets)
+        self.keys = _patch_keyed(self.keys, old_rows, current, _row_keys)
+        self.row_hashes = row_hashes
+
+    def _patch_mapped(self, ops, live: List[int], new_rows: Dict[int, Dict[str, str]], offsets: List[int],
+                      hashes: array) -> None:
+        """Apply a diff to a mapped index as a new ``PatchedBM25`` layer over its file.
+
+        The layer always holds every change since the file was written, so
+        a later refresh starts again from the file rather than stacking.
+        """
+        previous = self.bm25
+        patched = isinstance(previous, PatchedBM25)
+        base = cast(PatchedBM25, previous).base if patched else cast(MappedBM25, previous)
+        changed = dict(cast(PatchedBM25, previous).changed) if patched else {}
+        deleted = set(previous.deleted)
+        doc_lengths = array("I", previous.doc_lengths)
+        order = array("q", self.rows.order if self.rows.order is not None else range(len(self.rows)))
+        facets = dict(self.facets.doc_values) if isinstance(self.facets, _PatchedLists) else {}
+        keys = dict(self.keys.doc_values) if isinstance(self.keys, _PatchedLists) else {}
+        row_hashes = array("Q", self.row_hashes)
+        for op, old, new in ops:
+            if op == "add":
+                idx = len(order)
+                order.append(-1)
+                doc_lengths.append(0)
+                row_hashes.append(0)
+            else:
+                idx = live[old]
+            if op == "equal":
+                order[idx] = new
+            elif op == "remove":
+                order[idx], doc_lengths[idx] = -1, 0
+                changed.pop(idx, None)
+                deleted.add(idx)
+                facets[idx], keys[idx] = [], []
+            else:
+                row = new_rows[new]
+                tokens = base.tokenize(self.document(row, self.search_cols))
+                changed[idx], doc_lengths[idx] = dict(Counter(tokens)), len(tokens)
+                order[idx], row_hashes[idx] = new, hashes[new + 1]
+                facets[idx], keys[idx] = list(_row_facets([row])), list(_row_keys([row]))
+        self.bm25 = PatchedBM25(base, doc_lengths, changed, deleted)
+        self.rows = _CsvRecords(self.filepath, offsets, order)
+        self.documents = _LazyColumn(len(order), lambda idx: self.document(self.row(idx, self.search_cols), self.search_cols))
+        self.facets = _PatchedLists(base.facets, base.N, facets)
+        self.keys = _PatchedLists(base.keys, base.N, keys)
+        self.row_hashes = row_hashes
+
+    def refreshed(self) -> "CsvIndex":
+        """A copy of this index brought up to date with the file on disk.
+
+        This index is left untouched for readers still using it.  The copy
+        shares everything the diff does not touch: an in-memory index copies
+        only its containers (``BM25.copy``) before ``refresh`` patches them,
+        and a mapped one gets a fresh ``PatchedBM25`` layer over the same file.
+        """
+        clone = copy.copy(self)
+        if isinstance(self.bm25, BM25):
+            clone.rows, clone.documents, clone.bm25 = list(self.rows), list(self.documents), self.bm25.copy()
+        clone.refresh()
+        return clone
+
+    def _set_row(self, idx: int, row: Dict[str, str]) -> None:
+        self.rows[idx] = row
+        self.documents[idx] = self.document(row, self.search_cols) if row else ""
+
+
+def _file_signature(filepath: Path) -> Tuple[int, int]:
+    """(mtime_ns, size) of a file, used to detect edits to a cached CSV."""
+    stat = filepath.stat()
+    return stat.st_mtime_ns, stat.st_size
+
+
+# ============ TOKEN BUDGET ============
+# Columns dropped first when a token budget is tight: links and search-only
+# metadata that an agent rarely needs to act on a result.
+_LOW_VALUE_FIELDS = frozenset({
+    "Reference URL", "Docs URL", "Source URL",
+    "Keywords", "Stars", "OWASP Ref", "Alternative",
+})
+
+# A field is truncated rather than dropped only if at least this many tokens
+# of it still fit; smaller fragments carry no useful information.
+_MIN_TRUNCATED_TOKENS = 16
+
+
+def apply_token_budget(result: Dict[str, Any], max_tokens: int, row_overhead: int = 4, field_overhead: int = 3) -> Dict[str, Any]:
+    """Pack the highest-ranked results and their most useful fields into *max_tokens*.
+
+    Results are taken in rank order.  For each row the core fields are added
+    in column order; a field that does not fit is truncated if a meaningful
+    part of it fits, otherwise elided.  Low-value fields (URLs, keywords, …)
+    are only added in a second pass with whatever budget is left.  Rows whose
+    title plus a little content no longer fits are dropped, together with
+    everything ranked below them.  The top result is always kept (at least
+    a truncated first field), so a budget too small for it is overrun and
+    the report says so with ``"over_budget"``.
+
+    *row_overhead* / *field_overhead* are the formatter's per-row and
+    per-field markup costs.  Returns a copy of *result* with the packed rows
+    and a ``"budget"`` report of what was elided.
+    """
+    remaining = max_tokens
+    packed: List[Dict[str, str]] = []
+    elided_fields: Dict[str, int] = {}
+    truncated = 0
+    rows = result.get("results", [])
+
+    for row in rows:
+        core_cols = [k for k in row if k not in _LOW_VALUE_FIELDS and str(row[k]).strip()]
+        if not core_cols:
+            core_cols = list(row)[:1]
+        first_cost = row_overhead + field_overhead + estimate_tokens(core_cols[0]) + estimate_tokens(str(row[core_cols[0]]))
+        if packed and first_cost + _MIN_TRUNCATED_TOKENS > remaining:
+            break  # a bare title is not worth a result slot
+        remaining -= row_overhead
+        out: Dict[str, str] = {}
+        for col in core_cols:
+            value = str(row[col])
+            cost = field_overhead + estimate_tokens(col) + estimate_tokens(value)
+            if cost <= remaining:
+                out[col] = value
+                remaining -= cost
+                continue
+            room = remaining - field_overhead - estimate_tokens(col) - 1
+            if room >= _MIN_TRUNCATED_TOKENS or not out:
+                out[col] = value[:max(room, 1) * 4] + "..."
+                remaining -= field_overhead + estimate_tokens(col) + max(room, 1) + 1
+                truncated += 1
+            else:
+                elided_fields[col] = elided_fields.get(col, 0) + 1
+        packed.append(out)
+
+    # Second pass: low-value fields, highest-ranked rows first
+    for row, out in zip(rows, packed):
+        for col in row:
+            if col in out or col not in _LOW_VALUE_FIELDS:
+                continue
+            value = str(row[col])
+            if not value.strip():
+                continue
+            cost = field_overhead + estimate_tokens(col) + estimate_tokens(value)
+            if cost <= remaining:
+                out[col] = value
+                remaining -= cost
+            else:
+                elided_fields[col] = elided_fields.get(col, 0) + 1
+
+    # Restore the original column order within each row
+    packed = [{k: out[k] for k in row if k in out} for row, out in zip(rows, packed)]
+
+    budgeted = dict(result)
+    budgeted["results"] = packed
+    budgeted["count"] = len(packed)
+    budgeted["budget"] = {
+        "max_tokens": max_tokens,
+        "used": max_tokens - remaining,
+        "elided_results": len(rows) - len(packed),
+        "elided_fields": elided_fields,
+        "truncated_fields": truncated,
+        "over_budget": remaining < 0,
+    }
+    return budgeted
 
-    max_score = candidates[0][1]  # ranked is sorted descending
-    if max_score == 0:
-        return []
 
-    hits = []
-    for idx, score in candidates[:top_k]:
-        row = data[idx]
-        hits.append((score / max_score, {col: row.get(col, "") for col in output_cols if col in row}))
-    return hits
+def describe_elisions(budget: Dict[str, Any]) -> str:
+    """One-line human summary of a ``"budget"`` report, empty if nothing was elided."""
+    parts = []
+    if budget.get("elided_results"):
+        parts.append(f"{budget['elided_results']} results")
+    for col, n in sorted(budget.get("elided_fields", {}).items(), key=lambda x: -x[1]):
+        parts.append(f"{col} x{n}")
+    if budget.get("truncated_fields"):
+        parts.append(f"{budget['truncated_fields']} fields truncated")
+    if budget.get("over_budget"):
+        parts.append("over budget (the top result is always kept)")
+    return ", ".join(parts)
 
 
+# ============ SEARCH FUNCTIONS ============
 # Common task-instruction verbs and generic nouns that carry no technical meaning
 # in a best-practices database.  Stripping them before searching improves token
 # coverage and ranking quality.
@@ -463,29 +2179,37 @@ def clean_query(query: str) -> str:
     return " ".join(filtered)
 
 
-def _search_csv(filepath: Path, search_cols: List[str], output_cols: List[str], query: str, max_results: int, fuzzy: bool = False) -> List[Dict[str, str]]:
-    """Core search function using BM25 (with optional fuzzy expansion)"""
-    if not filepath.exists():
-        return []
+def _rank_index(index: CsvIndex, query: str, max_results: int, fuzzy: bool = False, fast: bool = False, stats: Optional[Dict[str, int]] = None) -> List[Tuple[int, float]]:
+    """Return (row_index, score) for the top *max_results* rows with score > 0."""
+    # BM25 search (fuzzy expands query tokens to handle typos)
+    bm25 = index.bm25
+    if fuzzy:
+        query = bm25.expand_query(query)
+    # --fast trades exact ranking for bounded work over quantised impacts
+    return bm25.fast_top_k(query, int(max_results), stats=stats) if fast else bm25.top_k(query, int(max_results), stats)
 
-    data = _load_csv(filepath)
 
-    # Build documents from search columns
-    documents = [" ".join(str(row.get(col, "")) for col in search_cols) for row in data]
+def _project_row(row: Dict[str, str], output_cols: List[str]) -> Dict[str, str]:
+    """Keep only the output columns present in *row*, in configured order."""
+    return {col: row.get(col, "") for col in output_cols if col in row}
 
-    # BM25 search (fuzzy expands query tokens to handle typos)
-    bm25 = BM25()
-    bm25.fit(documents)
-    ranked = bm25.score_fuzzy(query) if fuzzy else bm25.score(query)
 
-    # Get top results with score > 0
-    results = []
-    for idx, score in islice(ranked, int(max_results)):
-        if score > 0:
-            row = data[idx]
-            results.append({col: row.get(col, "") for col in output_cols if col in row})
+def _encode_cursor(state: Dict[str, Any]) -> str:
+    """Opaque, URL-safe token for the next page of a search."""
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(",", ":")).encode("utf-8")).decode("ascii").rstrip("=")
 
-    return results
+
+def _decode_cursor(cursor: str) -> Dict[str, Any]:
+    """Inverse of ``_encode_cursor``; raises ValueError on a malformed token."""
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {e}") from None
+    if not isinstance(state, dict) or state.get("k") not in ("search", "platform") or not isinstance(state.get("o"), int):
+        raise ValueError("Invalid cursor")
+    if "n" in state and not (isinstance(state["n"], int) and state["n"] >= 1):
+        raise ValueError("Invalid cursor")
+    return state
 
 
 def detect_domain(query):
@@ -512,308 +2236,2377 @@ def detect_domain(query):
     return best if scores[best] > 0 else "architecture"
 
 
-def search(query: str, domain: Optional[str] = None, max_results: int = MAX_RESULTS, filter_platform: Optional[str] = None, fuzzy: bool = False) -> Dict[str, Any]:
-    """Main search function with auto-domain detection and optional platform filter"""
-    query = clean_query(query)
-    if domain is None:
-        domain = detect_domain(query)
+def search(query: str, domain: Optional[str] = None, max_results: int = MAX_RESULTS, filter_platform: Optional[str] = None, fuzzy: bool = False, fast: bool = False, offset: Optional[int] = None) -> Dict[str, Any]:
+    """``KnowledgeBase.search`` on the default knowledge base."""
+    return default_knowledge_base().search(query, domain, max_results, filter_platform, fuzzy, fast, offset)
 
-    config = CSV_CONFIG.get(domain, CSV_CONFIG["architecture"])
-    # Ensure file is treated as string for Path concatenation
-    filepath = DATA_DIR / str(config["file"])
 
-    if not filepath.exists():
-        return {"error": f"File not found: {filepath}", "domain": domain}
+def search_many(queries: List[str], domain: Optional[str] = None, max_results: int = MAX_RESULTS, filter_platform: Optional[str] = None, fuzzy: bool = False) -> List[Dict[str, Any]]:
+    """``KnowledgeBase.search_many`` on the default knowledge base."""
+    return default_knowledge_base().search_many(queries, domain, max_results, filter_platform, fuzzy)
 
-    # Cast config values to expected types
-    search_cols = cast(List[str], config["search_cols"])
-    output_cols = cast(List[str], config["output_cols"])
 
-    results = _search_csv(filepath, search_cols, output_cols, query, max_results * 3 if filter_platform else max_results, fuzzy=fuzzy)
+def search_platform(query: str, platform: str, max_results: int = MAX_RESULTS, fuzzy: bool = False, fast: bool = False, offset: Optional[int] = None) -> Dict[str, Any]:
+    """``KnowledgeBase.search_platform`` on the default knowledge base."""
+    return default_knowledge_base().search_platform(query, platform, max_results, fuzzy, fast, offset)
 
-    # Filter by platform if specified
-    if filter_platform and results:
-        filter_lower = filter_platform.lower()
-        # Aliases for filtering
-        if filter_lower == "android-xml":
-            filter_lower = "android"
 
-        results = [r for r in results if any(
-            filter_lower in str(v).lower()
-            for k, v in r.items()
-            if k.lower() == "platform"
-        )]
-        results = list(islice(results, int(max_results)))
+def search_page(cursor: str, max_results: Optional[int] = None) -> Dict[str, Any]:
+    """``KnowledgeBase.search_page`` on the default knowledge base."""
+    return default_knowledge_base().search_page(cursor, max_results)
 
-    return {
-        "domain": domain,
-        "query": query,
-        "file": config["file"],
-        "count": len(results),
-        "results": results,
-        "fuzzy": fuzzy,
-    }
 
+def get(domain: Optional[str], key: Union[str, List[str]], platform: Optional[str] = None) -> Dict[str, Any]:
+    """``KnowledgeBase.get`` on the default knowledge base."""
+    return default_knowledge_base().get(domain, key, platform)
 
-def search_platform(query: str, platform: str, max_results: int = MAX_RESULTS, fuzzy: bool = False) -> Dict[str, Any]:
-    """Search platform-specific guidelines"""
-    query = clean_query(query)
-    if platform not in PLATFORM_CONFIG:
-        return {"error": f"Unknown platform: {platform}. Available: {', '.join(AVAILABLE_PLATFORMS)}"}
 
-    filepath = DATA_DIR / str(PLATFORM_CONFIG[platform]["file"])
+def search_stack(query: str, stack: str, max_results: int = MAX_RESULTS, fuzzy: bool = False, fast: bool = False) -> Dict[str, Any]:
+    """``KnowledgeBase.search_stack`` on the default knowledge base."""
+    return default_knowledge_base().search_stack(query, stack, max_results, fuzzy, fast)
 
-    if not filepath.exists():
-        return {"error": f"Platform file not found: {filepath}", "platform": platform}
 
-    search_cols = cast(List[str], _PLATFORM_COLS["search_cols"])
-    output_cols = cast(List[str], _PLATFORM_COLS["output_cols"])
-    results = _search_csv(filepath, search_cols, output_cols, query, max_results, fuzzy=fuzzy)
+# Fewer cross-domain hits than this after the coverage filter retries with a looser one
+_MIN_COVERED_HITS = 3
 
-    return {
-        "domain": "platform",
-        "platform": platform,
-        "query": query,
-        "file": PLATFORM_CONFIG[platform]["file"],
-        "count": len(results),
-        "results": results,
-        "fuzzy": fuzzy,
-    }
 
+def _query_coverage(query_tokens: set, document: str) -> float:
+    """Share of the distinct *query_tokens* found in a row's search text."""
+    return len(query_tokens & set(BM25().tokenize(document))) / (len(query_tokens) or 1)
 
-def search_stack(query: str, stack: str, max_results: int = MAX_RESULTS, fuzzy: bool = False) -> Dict[str, Any]:
-    """Search filtered by tech stack (maps stack to platform + adds stack keywords)"""
-    query = clean_query(query)
-    stack_lower = stack.lower()
 
-    if stack_lower not in STACK_MAP:
-        return {"error": f"Unknown stack: {stack}. Available: {', '.join(AVAILABLE_STACKS)}"}
+def _on_platform(row: Dict[str, str], platform: str) -> bool:
+    """Whether any Platform column of an output row mentions *platform*."""
+    platform = platform.lower().replace("android-xml", "android")
+    return any(platform in str(v).lower() for k, v in row.items() if k.lower() == "platform")
 
-    platform = STACK_MAP[stack_lower]
 
-    # Search platform guidelines first
-    platform_results = search_platform(f"{query} {stack}", platform, max_results, fuzzy=fuzzy)
+def search_all_domains(query: str, max_results: int = ALL_DOMAINS_MAX_RESULTS, fuzzy: bool = False, fast: bool = False, filter_platform: Optional[str] = None, min_norm_score: float = 0.5, min_token_coverage: float = 0.5) -> Dict[str, Any]:
+    """``KnowledgeBase.search_all_domains`` on the default knowledge base."""
+    return default_knowledge_base().search_all_domains(query, max_results, fuzzy, fast, filter_platform, min_norm_score, min_token_coverage)
 
-    # Also search across domains filtered by platform
-    domain_results = search(f"{query} {stack}", filter_platform=platform, max_results=max_results, fuzzy=fuzzy)
 
-    # Merge results
-    all_results: List[Any] = []
-    if platform_results.get("results"):
-        all_results.extend(platform_results["results"])
-    if domain_results.get("results"):
-        all_results.extend(domain_results["results"])
+def explain(query: str, domain: Optional[str] = None, max_results: Optional[int] = None, filter_platform: Optional[str] = None, fuzzy: bool = False, fast: bool = False, platform: Optional[str] = None, min_norm_score: float = 0.5, min_token_coverage: float = 0.5) -> Dict[str, Any]:
+    """``KnowledgeBase.explain`` on the default knowledge base."""
+    return default_knowledge_base().explain(query, domain, max_results, filter_platform, fuzzy, fast, platform, min_norm_score, min_token_coverage)
 
-    final_results = list(islice(all_results, int(max_results)))
 
-    return {
-        "domain": "stack",
-        "stack": stack,
-        "platform": platform,
-        "query": query,
-        "count": len(final_results),
-        "results": final_results
-    }
+# ============ SUGGEST ============
+# Title columns offered as whole-entry suggestions, first match per row
+_TITLE_COLS = ("Name", "Pattern Name", "Template Name", "Pattern", "Product Type", "Guideline", "Threat", "Issue")
+# Results for prefixes this short are memoised: they match the most keys
+_SUGGEST_MEMO_PREFIX = 2
 
 
-def search_all_domains(query: str, max_results: int = ALL_DOMAINS_MAX_RESULTS, fuzzy: bool = False, filter_platform: Optional[str] = None, min_norm_score: float = 0.5, min_token_coverage: float = 0.5) -> Dict[str, Any]:
-    """Search across ALL domains and return top results ranked by normalised BM25 score.
+class SuggestIndex:
+    """Sorted-array prefix index over the BM25 vocabulary and entry titles.
 
-    Each domain's scores are normalised to [0, 1] before merging so results
-    from small and large CSVs are comparable.  Two quality filters are applied:
+    Every key is a lowercased term or title (titles also from each later
+    word, so "pinning" finds "Certificate Pinning"); a prefix lookup is a
+    binary search plus a scan of the matching run.  Terms are weighted by
+    their document frequency summed over all corpora, titles by the
+    frequency of their rarest word, and terms keep their most common
+    original spelling ("rememberSaveable").
+    """
 
-    - *min_norm_score* (default 0.5): result must score >= 50% of the best hit
-      in its own domain.
-    - *min_token_coverage* (default 0.5): at least half of the unique query
-      tokens must actually appear in the result's searchable text, preventing
-      entries that only incidentally share one common word from surfacing.
+    def __init__(self, indexes: List[Tuple[str, "CsvIndex"]]):
+        self.sources = indexes
+        weights: Dict[str, int] = {}
+        spellings: Dict[str, Counter] = {}
+        for _, index in indexes:
+            for term, df in index.bm25.document_frequencies():
+                weights[term] = weights.get(term, 0) + df
+            for document in index.documents:
+                for word in re.findall(r"\w+", document):
+                    tokens = _word_tokens(word.lower())
+                    if len(tokens) == 1:
+                        spellings.setdefault(tokens[0], Counter())[word] += 1
+
+        titles: Dict[str, Tuple[str, int, List[str]]] = {}
+        for domain, index in indexes:
+            col = next((c for c in _TITLE_COLS if index.rows and c in index.rows[0]), None)
+            if col is None:
+                continue
+            for row in index.rows:
+                title = str(row.get(col) or "").strip()
+                if not title:
+                    continue
+                weight = min((weights.get(t, 0) for t in index.bm25.tokenize(title)), default=0) or 1
+                text, best, domains = titles.get(title.lower(), (title, 0, []))
+                if domain not in domains:
+                    domains.append(domain)
+                titles[title.lower()] = (text, max(best, weight), domains)
+        # entries: (text, kind, weight, domains); a one-word title absorbs its term
+        entries: List[Tuple[str, str, int, List[str]]] = [
+            (text, "title", max(weight, weights.get(key, 0)), domains) for key, (text, weight, domains) in titles.items()
+        ]
+        entries.extend(
+            (spellings[term].most_common(1)[0][0] if term in spellings else term, "term", weight, [])
+            for term, weight in weights.items() if term not in titles
+        )
 
-    Each result row includes a ``"Domain"`` key (first field).
+        keyed = []
+        for entry_id, (text, kind, _, _) in enumerate(entries):
+            lowered = text.lower()
+            keyed.append((lowered, entry_id))
+            if kind == "title":
+                keyed.extend((lowered[m.start():], entry_id) for m in re.finditer(r"(?<=\W)\w", lowered))
+        keyed.sort()
+        self.keys = [key for key, _ in keyed]
+        self.ids = [entry_id for _, entry_id in keyed]
+        self.entries = entries
+        self._memo: Dict[Tuple[str, int], List[Dict[str, Any]]] = {}
+
+    def lookup(self, prefix: str, k: int) -> List[Dict[str, Any]]:
+        """Top *k* entries starting with *prefix* (case-insensitive), by weight."""
+        prefix = prefix.lower()
+        memo_key = (prefix, k)
+        if memo_key in self._memo:
+            return self._memo[memo_key]
+        matched = set()
+        at = bisect_left(self.keys, prefix)
+        while at < len(self.keys) and self.keys[at].startswith(prefix):
+            matched.add(self.ids[at])
+            at += 1
+        best = nsmallest(k, matched, key=lambda i: (-self.entries[i][2], self.entries[i][0].lower()))
+        result = []
+        for entry_id in best:
+            text, kind, weight, domains = self.entries[entry_id]
+            suggestion: Dict[str, Any] = {"text": text, "kind": kind, "weight": weight}
+            if domains:
+                suggestion["domains"] = domains
+            result.append(suggestion)
+        if len(prefix) <= _SUGGEST_MEMO_PREFIX:
+            self._memo[memo_key] = result
+        return result
+
+
+def suggest(prefix: str, k: int = 10) -> Dict[str, Any]:
+    """``KnowledgeBase.suggest`` on the default knowledge base."""
+    return default_knowledge_base().suggest(prefix, k)
+
+
+# ============ CODE INDEX ============
+# Code columns indexed by the code index (comment-styled fields plus imports)
+_CODE_INDEX_FIELDS = _CODE_FIELDS | {"Imports"}
+# Identifiers, @annotations and dotted names (imports, qualified calls)
+_CODE_IDENT_RE = re.compile(r"@?[A-Za-z_]\w*(?:\.[A-Za-z_]\w*)*")
+# camelCase / PascalCase / snake_case words inside one identifier ("URLSession" -> URL, Session)
+_CODE_WORD_RE = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+# Line breaks, including the escaped "\\n" most multi-line snippets are stored with
+_CODE_LINE_RE = re.compile(r"\r?\n|\\n")
+
+
+def code_lines(text: str) -> List[str]:
+    """Lines of a code field, splitting escaped "\\n" as well as real newlines."""
+    return _CODE_LINE_RE.split(str(text))
+
+
+@lru_cache(maxsize=65536)
+def _identifier_symbols(name: str) -> Tuple[str, ...]:
+    """Lowercased symbols one identifier stands for.
+
+    Every segment of a dotted name plus each package prefix
+    ("androidx.lifecycle", "androidx.lifecycle.viewmodel"), and annotations
+    both with and without their "@".
     """
-    query = clean_query(query)
-    # Pre-compute query token set for coverage check
-    _bm25_tmp = BM25()
-    query_tokens = set(_bm25_tmp.tokenize(query))
-    n_query_tokens = len(query_tokens) if query_tokens else 1
-
-    all_hits: List[Tuple[float, Dict[str, str]]] = []
+    parts = name.lstrip("@").split(".")
+    symbols = [part.lower() for part in parts if len(part) > 1]
+    symbols.extend(".".join(parts[:end]).lower() for end in range(2, len(parts) + 1))
+    if name.startswith("@"):
+        symbols.append(name.lower())
+    return tuple(symbols)
+
+
+@lru_cache(maxsize=65536)
+def _identifier_tokens(name: str) -> Tuple[str, ...]:
+    """``_identifier_symbols`` plus the camelCase / snake_case words of each segment."""
+    tokens = list(_identifier_symbols(name))
+    for part in name.lstrip("@").split("."):
+        words = _CODE_WORD_RE.findall(part)
+        if len(words) > 1:
+            tokens.extend(word.lower() for word in words if len(word) > 2)
+    return tuple(tokens)
+
+
+def code_symbols(text: str) -> List[str]:
+    """Symbols in *text*, in order, as used for exact symbol lookup."""
+    text = _CODE_LINE_RE.sub("\n", str(text))
+    return [symbol for name in _CODE_IDENT_RE.findall(text) for symbol in _identifier_symbols(name)]
+
+
+def tokenize_code(text: str) -> List[str]:
+    """Identifier-aware tokens for code: ``code_symbols`` plus the words of
+    every camelCase or snake_case identifier, so "state lifecycle" matches
+    ``collectAsStateWithLifecycle``."""
+    text = _CODE_LINE_RE.sub("\n", str(text))
+    return [token for name in _CODE_IDENT_RE.findall(text) for token in _identifier_tokens(name)]
+
+
+def _row_head(domain: str, index: "CsvIndex", row_idx: int) -> Dict[str, str]:
+    """Domain, "<domain>:<row>" id, title and platform of one row."""
+    row = index.rows[row_idx]
+    head = {"Domain": domain, "Row": f"{domain}:{row_idx}"}
+    title = next((c for c in _TITLE_COLS if row.get(c)), None)
+    if title:
+        head[title] = row[title]
+    if row.get("Platform"):
+        head["Platform"] = row["Platform"]
+    return head
+
+
+class CodeBM25(BM25):
+    """BM25 over code, tokenised with ``tokenize_code``."""
 
-    for domain, config in CSV_CONFIG.items():
-        filepath = DATA_DIR / str(config["file"])
-        search_cols = cast(List[str], config["search_cols"])
-        output_cols = cast(List[str], config["output_cols"])
+    def tokenize(self, text):
+        return tokenize_code(text)
 
-        if not filepath.exists():
-            continue
-        data = _load_csv(filepath)
-        if not data:
-            continue
 
-        # Build searchable text per row for coverage check
-        row_texts = [" ".join(str(row.get(col, "")) for col in search_cols) for row in data]
+class CodeIndex:
+    """Code columns of every indexed CSV under a BM25 over ``tokenize_code``
+    tokens, whose postings double as the symbol table for ``find``.
 
-        # Fetch more candidates per domain so cross-domain merge has good coverage
-        hits = _score_csv(filepath, search_cols, output_cols, query, max_results * 2, fuzzy=fuzzy)
-
-        for norm_score, row in hits:
-            if norm_score < min_norm_score:
-                continue  # skip weak incidental matches
-
-            # Find this row's index to check token coverage against its search text
-            # Match by first output column value for a lightweight lookup
-            row_idx = next(
-                (i for i, d in enumerate(data) if all(d.get(c, "") == row.get(c, "") for c in output_cols[:2] if c in row)),
-                None
-            )
-            if row_idx is not None:
-                doc_tokens = set(_bm25_tmp.tokenize(row_texts[row_idx]))
-                coverage = len(query_tokens & doc_tokens) / n_query_tokens
-                if coverage < min_token_coverage:
-                    continue  # too few query tokens matched this entry
+    Kept apart from the text indexes so code tokens never dilute text
+    search; built on the first code query from the warm CSV indexes and
+    rebuilt only when a CSV changes.  Documents are the rows that have any
+    code, identified as "<domain>:<row>".
+    """
 
-            # Optional platform filter
-            if filter_platform:
-                fp = filter_platform.lower().replace("android-xml", "android")
-                if not any(fp in str(v).lower() for k, v in row.items() if k.lower() == "platform"):
+    def __init__(self, indexes: List[Tuple[str, "CsvIndex"]]):
+        self.sources = indexes
+        self.docs: List[Tuple[int, int, List[str]]] = []  # (source, row, code cols)
+        documents = []
+        for source, (_, index) in enumerate(indexes):
+            cols = [col for col in (index.rows[0] if index.rows else {}) if col in _CODE_INDEX_FIELDS]
+            for row_idx, row in enumerate(index.rows):
+                code = "\n".join(str(row.get(col) or "") for col in cols)
+                if not code.strip():
                     continue
-            tagged = {"Domain": domain}
-            tagged.update(row)
-            all_hits.append((norm_score, tagged))
-
-    # Fallback: coverage filter was too strict (e.g. a generic word like "screen"
-    # inflates n_query_tokens so domain-specific terms score below 50% coverage).
-    # Retry with at-least-1-token requirement so high-scoring domain entries surface.
-    if not all_hits and min_token_coverage > 1.0 / n_query_tokens:
-        return search_all_domains(
-            query,
-            max_results=max_results,
-            fuzzy=fuzzy,
-            filter_platform=filter_platform,
-            min_norm_score=min_norm_score,
-            min_token_coverage=1.0 / n_query_tokens,
-        )
-
-    # Sort by normalised score descending, then take top N
-    all_hits.sort(key=lambda x: x[0], reverse=True)
-    results = [row for _, row in all_hits[:max_results]]
+                self.docs.append((source, row_idx, cols))
+                documents.append(code)
+        self.bm25 = CodeBM25()
+        self.bm25.fit(documents)
+
+    def _allowed(self, doc_id: int, platform: Optional[str]) -> bool:
+        if not platform:
+            return True
+        source, row_idx, _ = self.docs[doc_id]
+        domain, index = self.sources[source]
+        return domain == platform or row_idx in index.platform_rows(platform)
+
+    def _head(self, doc_id: int) -> Dict[str, str]:
+        """Domain, row id, title and platform of a document."""
+        source, row_idx, _ = self.docs[doc_id]
+        domain, index = self.sources[source]
+        return _row_head(domain, index, row_idx)
+
+    def search(self, query: str, k: int, platform: Optional[str] = None) -> List[Dict[str, str]]:
+        """Top *k* rows by BM25 over their code, each with its code columns."""
+        if platform:
+            hits = [doc for doc, score in self.bm25.score(query) if score > 0 and self._allowed(doc, platform)][:k]
+        else:
+            hits = [doc for doc, _ in self.bm25.top_k(query, k)]
+        results = []
+        for doc_id in hits:
+            source, row_idx, cols = self.docs[doc_id]
+            row = self.sources[source][1].rows[row_idx]
+            result = self._head(doc_id)
+            result.update((col, row[col]) for col in cols if str(row.get(col) or "").strip())
+            results.append(result)
+        return results
+
+    def find(self, symbol: str, platform: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Every code field using *symbol* (case-insensitive), with its first matching line.
+
+        The postings give the candidate rows (a camelCase word is also a
+        token there); the lines are then matched against whole symbols only.
+        """
+        symbol = symbol.strip().lower()
+        occurrences = []
+        postings = self.bm25._posting_list(symbol)
+        for doc_id in postings[0] if postings else []:
+            if not self._allowed(doc_id, platform):
+                continue
+            source, row_idx, cols = self.docs[doc_id]
+            row = self.sources[source][1].rows[row_idx]
+            for col in cols:
+                lines = [line for line in code_lines(row.get(col) or "") if symbol in code_symbols(line)]
+                if lines:
+                    occurrence: Dict[str, Any] = self._head(doc_id)
+                    occurrence.update({"Field": col, "Line": lines[0].strip(), "Uses": len(lines)})
+                    occurrences.append(occurrence)
+        return occurrences
+
+
+def search_code(query: str, max_results: int = MAX_RESULTS, filter_platform: Optional[str] = None) -> Dict[str, Any]:
+    """``KnowledgeBase.search_code`` on the default knowledge base."""
+    return default_knowledge_base().search_code(query, max_results, filter_platform)
+
+
+def find_symbol(symbol: str, max_results: int = MAX_RESULTS, filter_platform: Optional[str] = None) -> Dict[str, Any]:
+    """``KnowledgeBase.find_symbol`` on the default knowledge base."""
+    return default_knowledge_base().find_symbol(symbol, max_results, filter_platform)
+
+
+# ============ RELATION GRAPH ============
+# Rows of different CSVs are linked when they share rare search terms or name
+# the same library, so blueprints can follow a reasoning rule or architecture
+# to its snippets, dependencies and pitfalls instead of searching every CSV
+# again.  The graph is built offline (scripts/build-index.py, or on first
+# use) and mapped from data/.index/ like the index files:
+#
+#   header      magic, format version, node count, edge count, meta length
+#   meta        JSON: per source its name, file, size, mtime_ns, sha256,
+#               search-column hash and row count
+#   offsets     uint32 per node plus one: node n's edges are
+#               [offsets[n], offsets[n + 1])
+#   targets     uint32 neighbour node per edge, grouped by the neighbour's
+#               source in source order and strongest first within it, so the
+#               links into one source are a run found by binary search
+#   weights     float32 weight per edge
+#   platforms   uint8 per node: bit mask over _RELATION_PLATFORMS, 0 = all
+#
+# Nodes number the rows of every source in ``_search_sources`` order.
+
+RELATION_GRAPH_NAME = "relations.bin"
+RELATION_GRAPH_VERSION = 2
+_RELATION_MAGIC = b"MBPREL\x00\x00"
+_RELATION_HEADER = struct.Struct("<8sIIII")
+_RELATION_PLATFORMS = ("android", "ios", "flutter", "react-native")
+# Links kept per (row, other source), and the weakest link kept
+RELATION_EDGES_PER_SOURCE = 5
+RELATION_MIN_WEIGHT = 0.08
+# Features of more than this share of all rows link too much to mean anything
+_RELATION_MAX_DF = 0.05
+# Naming the same library is a stronger tie than sharing a word
+_RELATION_LIBRARY_BOOST = 2.0
+# Sources whose Name / Version Catalog Key values make up the library vocabulary
+_RELATION_LIBRARY_SOURCES = ("library", "gradle")
+_RELATION_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def _platform_mask(source: str, row: Dict[str, str]) -> int:
+    """Platforms a row applies to, as a bit mask over ``_RELATION_PLATFORMS`` (0 = all)."""
+    name = source.replace("android-xml", "android")
+    if name in _RELATION_PLATFORMS:
+        return 1 << _RELATION_PLATFORMS.index(name)
+    if name == "gradle":
+        return 1  # Gradle dependencies are Android's
+    value = str(row.get("Platform") or "").lower().replace("-", " ")
+    mask = sum(1 << bit for bit, platform in enumerate(_RELATION_PLATFORMS) if platform.replace("-", " ") in value)
+    if "kmp" in value:
+        mask |= 0b11
+    return mask
+
+
+def _relation_features(indexes: List[Tuple[str, "CsvIndex"]]) -> List[set]:
+    """Per row of every source: its stemmed search terms ("t:") and the libraries it names ("l:")."""
+    libraries = set()
+    for name, index in indexes:
+        if name in _RELATION_LIBRARY_SOURCES:
+            for row in index.rows:
+                for col in ("Name", "Version Catalog Key"):
+                    words = tuple(_RELATION_WORD_RE.findall(str(row.get(col) or "").lower()))
+                    if words:
+                        libraries.add(words)
+    by_first: Dict[str, List[Tuple[str, ...]]] = {}
+    for library in libraries:
+        by_first.setdefault(library[0], []).append(library)
 
-    return {
-        "domain": "all",
-        "query": query,
-        "count": len(results),
-        "results": results,
-        "fuzzy": fuzzy,
-    }
+    bm25 = BM25()
+    platform_words = set(bm25.tokenize("android ios flutter react native all platform"))
+    features = []
+    for _, index in indexes:
+        for row_idx, row in enumerate(index.rows):
+            feats = {"t:" + token for token in bm25.tokenize(index.documents[row_idx]) if token not in platform_words}
+            words = _RELATION_WORD_RE.findall(" ".join(str(v) for k, v in row.items() if k).lower())
+            for i, word in enumerate(words):
+                for library in by_first.get(word, ()):
+                    if tuple(words[i:i + len(library)]) == library:
+                        feats.add("l:" + " ".join(library))
+            features.append(feats)
+    return features
+
+
+def _source_meta(name: str, index: "CsvIndex") -> Dict[str, Any]:
+    stat = index.filepath.stat()
+    return {"name": name, "file": index.filepath.name, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+            "sha256": hashlib.sha256(index.filepath.read_bytes()).hexdigest(),
+            "columns": _columns_hash(index.search_cols).hex(), "rows": len(index.rows)}
+
+
+class RelationGraph:
+    """Weighted links between rows of different CSVs, for ``related`` and blueprints.
+
+    A row is described by its stemmed search terms and the libraries it
+    names (the Name / Version Catalog Key values of the library and Gradle
+    CSVs, matched as whole words anywhere in the row).  Two rows of
+    different sources whose platforms overlap are linked by the cosine of
+    their shared features under idf² weights, library names counting
+    double; features found in one row only or in more than
+    ``_RELATION_MAX_DF`` of all rows are ignored.  Each row keeps its
+    ``RELATION_EDGES_PER_SOURCE`` strongest links into every other source,
+    so links are directed (a row -> its nearest neighbours) and walking
+    out of a row costs O(degree).
+    """
 
+    def __init__(self, indexes: List[Tuple[str, "CsvIndex"]], offsets: Any, targets: Any, weights: Any, platforms: Any):
+        self.sources = indexes
+        self.first = [0]
+        for _, index in indexes:
+            self.first.append(self.first[-1] + len(index.rows))
+        self._source_ids = {id(index): source for source, (_, index) in enumerate(indexes)}
+        self.offsets, self.targets, self.weights, self.platforms = offsets, targets, weights, platforms
+
+    @classmethod
+    def build(cls, indexes: List[Tuple[str, "CsvIndex"]]) -> "RelationGraph":
+        """Compute the graph over the rows of *indexes*."""
+        features = _relation_features(indexes)
+        n = len(features)
+        source_of = [source for source, (_, index) in enumerate(indexes) for _ in range(len(index.rows))]
+        platforms = bytes(_platform_mask(name, row) for name, index in indexes for row in index.rows)
+
+        df = Counter(feature for feats in features for feature in feats)
+        idf = {feature: log(n / count) for feature, count in df.items()}
+        weight = {feature: idf[feature] ** 2 * (_RELATION_LIBRARY_BOOST if feature[0] == "l" else 1.0)
+                  for feature, count in df.items() if 1 < count <= _RELATION_MAX_DF * n}
+        postings: Dict[str, List[int]] = {}
+        for node, feats in enumerate(features):
+            for feature in feats:
+                if feature in weight:
+                    postings.setdefault(feature, []).append(node)
+        norms = [sum(idf[feature] ** 2 for feature in feats) ** 0.5 or 1.0 for feats in features]
+
+        offsets, targets, weights = array("I", [0]), array("I"), array("f")
+        for node, feats in enumerate(features):
+            shared: Dict[int, float] = {}
+            for feature in sorted(feats):  # a fixed order keeps the float sums reproducible
+                for other in postings.get(feature, ()):
+                    if source_of[other] != source_of[node]:
+                        shared[other] = shared.get(other, 0.0) + weight[feature]
+            per_source: Dict[int, List[Tuple[float, int]]] = {}
+            for other, total in shared.items():
+                if platforms[node] and platforms[other] and not platforms[node] & platforms[other]:
+                    continue
+                score = total / (norms[node] * norms[other])
+                if score >= RELATION_MIN_WEIGHT:
+                    per_source.setdefault(source_of[other], []).append((-score, other))
+            edges = sorted((source_of[other], score, other) for candidates in per_source.values()
+                           for score, other in nsmallest(RELATION_EDGES_PER_SOURCE, candidates))
+            targets.extend(other for _, _, other in edges)
+            weights.extend(-score for _, score, _ in edges)
+            offsets.append(len(targets))
+        return cls(indexes, offsets, targets, weights, platforms)
+
+    def write(self, path: Path) -> None:
+        """Serialise the graph to *path* atomically."""
+        meta = json.dumps({"sources": [_source_meta(name, index) for name, index in self.sources]}).encode("utf-8")
+        sections = [array("I", self.offsets).tobytes(), array("I", self.targets).tobytes(),
+                    array("f", self.weights).tobytes(), bytes(self.platforms)]
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(_RELATION_HEADER.pack(_RELATION_MAGIC, RELATION_GRAPH_VERSION, len(self.platforms), len(self.targets), len(meta)))
+            f.write(meta)
+            for section in sections:
+                f.write(b"\x00" * (-f.tell() % 8))
+                f.write(section)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path, indexes: List[Tuple[str, "CsvIndex"]]) -> Optional["RelationGraph"]:
+        """Map the graph file at *path* if it was built from the CSVs behind *indexes*."""
+        if sys.byteorder != "little":
+            return None
+        try:
+            with open(path, "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        buf = memoryview(mapped)
+        views: List[memoryview] = []
+        try:
+            if cls._map_sections(buf, views, indexes):
+                return cls(indexes, *views)
+        except (OSError, ValueError, KeyError, struct.error):
+            pass
+        # Unusable (other version, truncated, stale): unmap now, not when collected
+        for view in views:
+            view.release()
+        buf.release()
+        mapped.close()
+        return None
+
+    @staticmethod
+    def _map_sections(buf: memoryview, views: List[memoryview], indexes: List[Tuple[str, "CsvIndex"]]) -> bool:
+        """Append the section views of a mapped graph file to *views*; False
+        if it is not a current graph of the CSVs behind *indexes*."""
+        magic, version, n_nodes, n_edges, meta_len = _RELATION_HEADER.unpack_from(buf)
+        if magic != _RELATION_MAGIC or version != RELATION_GRAPH_VERSION:
+            return False
+        meta = json.loads(bytes(buf[_RELATION_HEADER.size:_RELATION_HEADER.size + meta_len]))
+        pos = _RELATION_HEADER.size + meta_len
+        for fmt, count in (("I", n_nodes + 1), ("I", n_edges), ("f", n_edges), ("B", n_nodes)):
+            pos += -pos % 8
+            views.append(buf[pos:pos + count * struct.calcsize(fmt)].cast(fmt))
+            pos += count * struct.calcsize(fmt)
+        if pos != len(buf):
+            return False
+        sources = meta["sources"]
+        if len(sources) != len(indexes):
+            return False
+        for source, (name, index) in zip(sources, indexes):
+            stat = index.filepath.stat()
+            if (source["name"] != name or source["rows"] != len(index.rows) or source["size"] != stat.st_size
+                    or source["columns"] != _columns_hash(index.search_cols).hex()):
+                return False
+            if (source["mtime_ns"] != stat.st_mtime_ns
+                    and source["sha256"] != hashlib.sha256(index.filepath.read_bytes()).hexdigest()):
+                return False
+        return True
+
+    def source_of(self, index: "CsvIndex") -> Optional[int]:
+        """Position of *index* among the graph's sources, if it is one of them."""
+        return self._source_ids.get(id(index))
+
+    def node(self, source: int, row_idx: int) -> int:
+        return self.first[source] + row_idx
+
+    def locate(self, node: int) -> Tuple[int, int]:
+        """(source, row) of a node."""
+        source = bisect_left(self.first, node + 1) - 1
+        return source, node - self.first[source]
+
+    def on_platform(self, node: int, platform: Optional[str]) -> bool:
+        """Whether a node applies to *platform* (rows for every platform always do)."""
+        mask = _platform_mask(platform, {}) if platform else 0
+        return not mask or not self.platforms[node] or bool(self.platforms[node] & mask)
+
+    def spread(self, seeds: Dict[int, float], source: Optional[int] = None, platform: Optional[str] = None) -> List[Tuple[int, float]]:
+        """Nodes reached from the weighted *seeds*, by summed seed weight × link weight, strongest first.
+
+        Only the seeds' own links are read, and with *source* only their run
+        of links into that source: O(degree) per seed.  *platform* keeps the
+        nodes that apply to it.
+        """
+        lo, hi = (self.first[source], self.first[source + 1]) if source is not None else (0, self.first[-1])
+        mask = _platform_mask(platform, {}) if platform else 0
+        reached: Dict[int, float] = {}
+        for seed, seed_weight in seeds.items():
+            start, end = self.offsets[seed], self.offsets[seed + 1]
+            if source is not None:
+                start, end = bisect_left(self.targets, lo, start, end), bisect_left(self.targets, hi, start, end)
+            for edge in range(start, end):
+                target = self.targets[edge]
+                if target not in seeds and (not mask or not self.platforms[target] or self.platforms[target] & mask):
+                    reached[target] = reached.get(target, 0.0) + seed_weight * self.weights[edge]
+        return sorted(reached.items(), key=lambda item: (-item[1], item[0]))
+
+    def head(self, node: int) -> Dict[str, str]:
+        """Domain, row id, title and platform of a node."""
+        source, row_idx = self.locate(node)
+        domain, index = self.sources[source]
+        return _row_head(domain, index, row_idx)
+
+
+def build_relation_graph(data_dir: Optional[Path] = None) -> Dict[str, Any]:
+    """Build and write the relation graph of *data_dir*; returns what was written."""
+    kb = KnowledgeBase(data_dir)
+    indexes = [(name, kb.index(path, cols)) for name, path, cols in kb._search_sources() if path.exists()]
+    graph = RelationGraph.build(indexes)
+    path = kb.data_dir / INDEX_DIR_NAME / RELATION_GRAPH_NAME
+    graph.write(path)
+    return {"index": str(path), "nodes": len(graph.platforms), "edges": len(graph.targets), "bytes": path.stat().st_size}
+
+
+def relation_graph_current(data_dir: Optional[Path] = None) -> bool:
+    """Whether the relation graph file of *data_dir* exists and matches its CSVs."""
+    kb = KnowledgeBase(data_dir)
+    indexes = [(name, kb.index(path, cols)) for name, path, cols in kb._search_sources() if path.exists()]
+    return RelationGraph.load(kb.data_dir / INDEX_DIR_NAME / RELATION_GRAPH_NAME, indexes) is not None
+
+
+def related(row_id: str, max_results: int = MAX_RESULTS, domain: Optional[str] = None, filter_platform: Optional[str] = None) -> Dict[str, Any]:
+    """``KnowledgeBase.related`` on the default knowledge base."""
+    return default_knowledge_base().related(row_id, max_results, domain, filter_platform)
+
+
+# ============ SQLITE BACKEND ============
+SQLITE_INDEX_NAME = "search.sqlite"
+SQLITE_SCHEMA_VERSION = 2  # PRAGMA user_version; a database with another version is recompiled
+# FTS5 keeps letters, digits and "_" together, as BM25.tokenize does
+_FTS5_TOKENIZER = "unicode61 remove_diacritics 0 tokenchars '_'"
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    id INTEGER PRIMARY KEY, path TEXT NOT NULL, cols TEXT NOT NULL, header TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL, size INTEGER NOT NULL, sha256 TEXT NOT NULL,
+    UNIQUE (path, cols)
+);
+CREATE TABLE IF NOT EXISTS rows (
+    source INTEGER NOT NULL, row INTEGER NOT NULL, platform TEXT NOT NULL, data TEXT NOT NULL,
+    PRIMARY KEY (source, row)
+);
+CREATE TABLE IF NOT EXISTS facets (
+    source INTEGER NOT NULL, platform TEXT NOT NULL, row INTEGER NOT NULL,
+    PRIMARY KEY (source, platform, row)
+) WITHOUT ROWID;
+"""
 
-def persist_blueprint(query, output_dir=None, project_name=None, page=None):
-    """Generate and persist architecture blueprint from search results"""
-    if output_dir is None:
-        output_dir = Path.cwd() / "architecture-blueprint"
 
-    output_dir = Path(output_dir)
+class SqliteIndex:
+    """Every indexed CSV compiled into one SQLite database (``--backend sqlite``).
 
-    # Run multi-domain search
-    domains_to_search = ["reasoning", "architecture", "snippet", "gradle", "performance", "security", "antipattern"]
-    all_results: Dict[str, Any] = {}
+    Each source gets an FTS5 table over its ``BM25.tokenize`` tokens, so both
+    engines match the same stemmed, alias-expanded terms, and is ranked by
+    FTS5's ``bm25()``.  Rows are stored as JSON arrays under the source's
+    header, and the Platform facet of every known platform is a WITHOUT ROWID table,
+    so platform filters are index lookups.  Nothing but the row ids of the
+    compiled sources is kept in Python memory.
 
-    for domain in domains_to_search:
-        result = search(query, domain=domain, max_results=5)
-        if result.get("results"):
-            all_results[domain] = result["results"]
+    A source is recompiled when its CSV's SHA-256 changed; size and mtime
+    are checked first.  Connections are opened per thread.
+    """
 
-    # Detect platform
-    platform = "android" # default
+    def __init__(self, path: Path):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # (csv path, search cols) -> (source id, (mtime_ns, size) it was compiled from, header)
+        self._sources: Dict[Tuple[str, Tuple[str, ...]], Tuple[int, Tuple[int, int], List[str]]] = {}
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        return conn
+
+    def update(self, sources: List[Tuple[Path, List[str]]]) -> List[str]:
+        """Compile the sources that are new or changed; returns their paths."""
+        pending = [(filepath, cols) for filepath, cols in sources if filepath.exists()
+                   and self._sources.get((str(filepath), tuple(cols)), (0, None))[1] != _file_signature(filepath)]
+        if not pending:
+            return []
+        changed = []
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = self._conn()
+            if conn.execute("PRAGMA user_version").fetchone()[0] != SQLITE_SCHEMA_VERSION:
+                # Another layout: drop everything (FTS5 tables take their shadow tables along)
+                fts = [name for name, in conn.execute("SELECT name FROM sqlite_master WHERE sql LIKE 'CREATE VIRTUAL TABLE%'")]
+                for name in fts + ["sources", "rows", "facets"]:
+                    conn.execute(f'DROP TABLE IF EXISTS "{name}"')
+                conn.executescript(_SQLITE_SCHEMA)
+                conn.execute(f"PRAGMA user_version = {SQLITE_SCHEMA_VERSION}")
+            known = {(path, cols): (source, mtime_ns, size, sha256, header) for source, path, cols, mtime_ns, size, sha256, header
+                     in conn.execute("SELECT id, path, cols, mtime_ns, size, sha256, header FROM sources")}
+            for filepath, search_cols in pending:
+                signature = _file_signature(filepath)
+                key = (os.path.relpath(filepath, self.path.parent.parent), json.dumps(search_cols))
+                entry = known.get(key)
+                if entry is not None and (entry[1], entry[2]) == signature:
+                    source, header = entry[0], json.loads(entry[4])
+                else:
+                    digest = hashlib.sha256(filepath.read_bytes()).hexdigest()
+                    if entry is not None and entry[3] == digest:
+                        source, header = entry[0], json.loads(entry[4])
+                        with conn:
+                            conn.execute("UPDATE sources SET mtime_ns = ?, size = ? WHERE id = ?", (*signature, source))
+                    else:
+                        source, header = self._compile(conn, filepath, search_cols, key, signature, digest, entry and entry[0])
+                        changed.append(str(filepath))
+                self._sources[(str(filepath), tuple(search_cols))] = (source, signature, header)
+        return changed
+
+    @staticmethod
+    def _compile(conn: sqlite3.Connection, filepath: Path, search_cols: List[str], key: Tuple[str, str],
+                 signature: Tuple[int, int], digest: str, source: Optional[int]) -> Tuple[int, List[str]]:
+        rows = _load_csv(filepath)
+        header = [col for col in (rows[0] if rows else {}) if col is not None]
+        tokenize = BM25().tokenize
+        with conn:
+            if source is None:
+                source = conn.execute("INSERT INTO sources (path, cols, header, mtime_ns, size, sha256) VALUES (?, ?, ?, ?, ?, ?)",
+                                      (*key, json.dumps(header), *signature, digest)).lastrowid
+            else:
+                conn.execute("UPDATE sources SET header = ?, mtime_ns = ?, size = ?, sha256 = ? WHERE id = ?",
+                             (json.dumps(header), *signature, digest, source))
+                conn.execute("DELETE FROM rows WHERE source = ?", (source,))
+                conn.execute("DELETE FROM facets WHERE source = ?", (source,))
+            conn.execute(f"DROP TABLE IF EXISTS fts_{source}")
+            conn.execute(f"CREATE VIRTUAL TABLE fts_{source} USING fts5(body, tokenize=\"{_FTS5_TOKENIZER}\")")
+            conn.executemany(f"INSERT INTO fts_{source} (rowid, body) VALUES (?, ?)",
+                             ((idx, " ".join(tokenize(CsvIndex.document(row, search_cols)))) for idx, row in enumerate(rows)))
+            conn.executemany("INSERT INTO rows VALUES (?, ?, ?, ?)",
+                             ((source, idx, "\n".join(str(v).lower() for c, v in row.items() if c and c.lower() == "platform"),
+                               json.dumps([row[col] for col in header], ensure_ascii=False, separators=(",", ":"))) for idx, row in enumerate(rows)))
+            facets = _row_facets(rows)
+            conn.executemany("INSERT INTO facets VALUES (?, ?, ?)",
+                             ((source, platform, idx) for platform in AVAILABLE_PLATFORMS
+                              for value, ids in facets.items() if platform in value for idx in ids))
+        assert source is not None
+        return source, header
+
+    def _source(self, filepath: Path, search_cols: List[str]) -> int:
+        return self._sources[(str(filepath), tuple(search_cols))][0]
+
+    def rank(self, filepath: Path, search_cols: List[str], query: str, k: int, platform: Optional[str] = None) -> List[Tuple[int, float]]:
+        """(row id, score) of the top *k* rows matching any query term, best first.
+
+        Scores are ``-bm25()`` so that higher is better, as in ``BM25.top_k``;
+        ties go to the lower row id.  *platform* keeps only rows whose
+        Platform value contains it.
+        """
+        terms = list(dict.fromkeys(BM25().tokenize(query)))
+        if not terms or k <= 0:
+            return []
+        source = self._source(filepath, search_cols)
+        sql = f"SELECT rowid, -bm25(fts_{source}) AS score FROM fts_{source} WHERE fts_{source} MATCH ?"
+        args: List[Any] = [" OR ".join(f'"{term}"' for term in terms)]
+        if platform:
+            platform = platform.lower()
+            if platform in AVAILABLE_PLATFORMS:
+                sql += " AND rowid IN (SELECT row FROM facets WHERE source = ? AND platform = ?)"
+            else:
+                sql += " AND rowid IN (SELECT row FROM rows WHERE source = ? AND instr(platform, ?) > 0)"
+            args += [source, platform]
+        sql += " ORDER BY score DESC, rowid LIMIT ?"
+        return self._conn().execute(sql, (*args, int(k))).fetchall()
+
+    def fetch(self, filepath: Path, search_cols: List[str], ids: List[int]) -> List[Tuple[Dict[str, str], str]]:
+        """(row, search document) for each of *ids*, in that order."""
+        if not ids:
+            return []
+        source, _, header = self._sources[(str(filepath), tuple(search_cols))]
+        found = {}
+        for idx, data in self._conn().execute(
+                f"SELECT row, data FROM rows WHERE source = ? AND row IN ({','.join('?' * len(ids))})", (source, *ids)):
+            row = dict(zip(header, json.loads(data)))
+            found[idx] = (row, CsvIndex.document(row, search_cols))
+        return [found[idx] for idx in ids]
+
+
+def build_sqlite_index(data_dir: Optional[Path] = None) -> Dict[str, Any]:
+    """Compile the SQLite index of *data_dir*, or bring it up to date; returns what was done."""
+    kb = KnowledgeBase(data_dir)
+    db = SqliteIndex(kb.data_dir / INDEX_DIR_NAME / SQLITE_INDEX_NAME)
+    compiled = db.update(kb.sources())
+    return {"index": str(db.path), "sources": len(db._sources), "compiled": compiled, "bytes": db.path.stat().st_size}
+
+
+# ============ BLUEPRINT ============
+_BLUEPRINT_DOMAINS = ["reasoning", "architecture", "snippet", "gradle", "performance", "security", "antipattern"]
+_BLUEPRINT_MAX_RESULTS = 5
+# Sections ranked by BM25; their hits seed the relation graph walk that fills the others
+_BLUEPRINT_SEED_DOMAINS = ("reasoning", "architecture")
+# Written next to the blueprint files; one entry per generated file
+BLUEPRINT_MANIFEST = ".blueprint-manifest.json"
+
+
+def _detect_blueprint_platform(query: str) -> str:
+    """Platform named in the query, defaulting to android."""
     for kw in ["android-xml", "android", "ios", "flutter", "react-native", "react native"]:
         if kw in query.lower():
-            platform = kw.replace(" ", "-")
-            break
+            return kw.replace(" ", "-")
+    return "android"
+
+
+def _data_hash(paths: List[Path]) -> str:
+    """Content hash over the CSVs a blueprint was generated from."""
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(str(path.name).encode("utf-8"))
+        if path.exists():
+            digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
 
-    # Get platform guidelines
-    platform_result = search_platform(query, platform, max_results=5)
-    if platform_result.get("results"):
-        all_results["platform"] = platform_result["results"]
-
-    # Generate blueprint markdown
-    pname = project_name or "MyApp"
-    lines = [
-        f"# Architecture Blueprint - {pname}",
-        f"",
-        f"**Generated:** {datetime.now().strftime('%Y-%m-%d %H:%M')}",
-        f"**Query:** {query}",
-        f"**Platform:** {platform}",
-        f"",
-    ]
+
+def _render_blueprint_sections(all_results: Dict[str, List[Dict[str, str]]], platform: str) -> Dict[str, List[str]]:
+    """Markdown lines per blueprint section, in document order."""
+    sections: Dict[str, List[str]] = {}
 
     if "reasoning" in all_results:
-        lines.append("## Product Recommendation")
+        lines = ["## Product Recommendation"]
         for r in all_results["reasoning"][:1]:
             for k, v in r.items():
                 lines.append(f"- **{k}:** {v}")
         lines.append("")
+        sections["reasoning"] = lines
 
     if "architecture" in all_results:
-        lines.append("## Architecture")
+        lines = ["## Architecture"]
         for r in all_results["architecture"][:2]:
             for k, v in r.items():
                 lines.append(f"- **{k}:** {v}")
             lines.append("")
+        sections["architecture"] = lines
 
     if "gradle" in all_results:
-        lines.append("## Dependencies")
+        lines = ["## Dependencies"]
         for r in all_results["gradle"]:
             name = r.get("Name", "")
             impl = r.get("Implementation", "")
             lines.append(f"- **{name}:** `{impl}`")
         lines.append("")
+        sections["gradle"] = lines
 
     if "performance" in all_results:
-        lines.append("## Performance Rules")
+        lines = ["## Performance Rules"]
         for r in all_results["performance"][:3]:
             issue = r.get("Issue", "")
             do = r.get("Do", "")
             lines.append(f"- **{issue}:** {do}")
         lines.append("")
+        sections["performance"] = lines
 
     if "security" in all_results:
-        lines.append("## Security Checklist")
+        lines = ["## Security Checklist"]
         for r in all_results["security"][:3]:
             threat = r.get("Threat", "")
             mitigation = r.get("Mitigation", "")
             lines.append(f"- **{threat}:** {mitigation}")
         lines.append("")
+        sections["security"] = lines
 
     if "antipattern" in all_results:
-        lines.append("## Anti-Patterns to Avoid")
+        lines = ["## Anti-Patterns to Avoid"]
         for r in all_results["antipattern"][:3]:
             name = r.get("Name", "")
             fix = r.get("Fix", "")
             lines.append(f"- **{name}:** {fix}")
         lines.append("")
+        sections["antipattern"] = lines
 
     if "platform" in all_results:
-        lines.append(f"## {platform.title()} Best Practices")
+        lines = [f"## {platform.title()} Best Practices"]
         for r in all_results["platform"][:5]:
             guideline = r.get("Guideline", "")
             desc = r.get("Do", "")
             lines.append(f"- **{guideline}:** {desc}")
         lines.append("")
+        sections["platform"] = lines
+
+    return sections
+
+
+def _split_blueprint(text: str) -> Tuple[List[str], Dict[str, List[str]]]:
+    """Split a generated blueprint into header lines and sections keyed by heading."""
+    header: List[str] = []
+    sections: Dict[str, List[str]] = {}
+    current = header
+    for line in text.split("\n"):
+        if line.startswith("## "):
+            current = sections.setdefault(line, [])
+        current.append(line)
+    return header, sections
+
 
-    content = "\n".join(lines)
+def _load_blueprint_manifest(output_dir: Path) -> Dict[str, Any]:
+    try:
+        with open(output_dir / BLUEPRINT_MANIFEST, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {"files": {}}
+    return manifest if isinstance(manifest.get("files"), dict) else {"files": {}}
 
-    # Write files
-    if page:
-        pages_dir = output_dir / "pages"
-        pages_dir.mkdir(parents=True, exist_ok=True)
-        filepath = pages_dir / f"{page}.md"
+
+def _save_blueprint_manifest(output_dir: Path, manifest: Dict[str, Any]) -> None:
+    (output_dir / BLUEPRINT_MANIFEST).write_text(json.dumps(manifest, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+
+
+def _write_blueprint(filepath: Path, rel_name: str, manifest: Dict[str, Any], query: str, pname: str,
+                     platform: str, data_hash: str, hits: Dict[str, List[Tuple[str, Dict[str, str]]]]) -> Dict[str, Any]:
+    """Render one blueprint file, rewriting only sections whose results changed.
+
+    The previous manifest entry is trusted only while the file on disk is
+    still exactly what was last written; otherwise every section is rebuilt.
+    Updates *manifest* in place and returns the persist_blueprint() summary.
+    """
+    previous = manifest["files"].get(rel_name, {})
+    old_text = filepath.read_text(encoding="utf-8") if filepath.exists() else None
+    if old_text is None or previous.get("file_hash") != _text_hash(old_text):
+        previous = {}
+
+    all_results = {key: [row for _, row in rows] for key, rows in hits.items()}
+    sections = _render_blueprint_sections(all_results, platform)
+    section_ids = {key: [row_id for row_id, _ in hits[key]] for key in hits}
+    section_hashes = {key: _text_hash("\n".join(lines)) for key, lines in sections.items()}
+
+    old_hashes = previous.get("section_hashes", {})
+    changed = [key for key in sections if old_hashes.get(key) != section_hashes[key]]
+    removed = [key for key in old_hashes if key not in sections]
+    same_header = previous and all(previous.get(k) == v for k, v in
+                                   (("query", query), ("project_name", pname), ("platform", platform)))
+
+    written = bool(changed or removed or not same_header)
+    if written:
+        old_sections = _split_blueprint(old_text)[1] if previous else {}
+        lines = [
+            f"# Architecture Blueprint - {pname}",
+            f"",
+            f"**Generated:** {datetime.now().strftime('%Y-%m-%d %H:%M')}",
+            f"**Query:** {query}",
+            f"**Platform:** {platform}",
+            f"",
+        ]
+        for key, section_lines in sections.items():
+            # Unchanged sections keep the text already on disk
+            kept = old_sections.get(section_lines[0]) if key not in changed else None
+            lines.extend(kept if kept is not None else section_lines)
+        content = "\n".join(lines)
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        filepath.write_text(content, encoding="utf-8")
+        manifest["files"][rel_name] = {
+            "query": query,
+            "project_name": pname,
+            "platform": platform,
+            "data_hash": data_hash,
+            "file_hash": _text_hash(content),
+            "sections": list(hits.keys()),
+            "section_ids": section_ids,
+            "section_hashes": section_hashes,
+        }
     else:
-        output_dir.mkdir(parents=True, exist_ok=True)
-        filepath = output_dir / "MASTER.md"
+        manifest["files"][rel_name].update(data_hash=data_hash, sections=list(hits.keys()), section_ids=section_ids)
+
+    return {
+        "file": str(filepath),
+        "sections": list(hits.keys()),
+        "total_entries": sum(len(v) for v in hits.values()),
+        "written": written,
+        "changed_sections": changed + removed if previous else list(sections),
+    }
 
-    filepath.write_text(content, encoding="utf-8")
 
+def _unchanged_blueprint(previous: Optional[Dict[str, Any]], filepath: Path, query: str, pname: str, data_hash: str) -> Optional[Dict[str, Any]]:
+    """Summary for a blueprint that is already up to date, else None.
+
+    Same query over the same data gives the same results, so neither the
+    searches nor the write are needed.
+    """
+    if not (previous and previous.get("data_hash") == data_hash and previous.get("query") == query
+            and previous.get("project_name") == pname and filepath.exists()
+            and previous.get("file_hash") == _text_hash(filepath.read_text(encoding="utf-8"))):
+        return None
+    section_ids = previous.get("section_ids", {})
     return {
         "file": str(filepath),
-        "sections": list(all_results.keys()),
-        "total_entries": sum(len(v) for v in all_results.values()),
+        "sections": previous.get("sections", list(section_ids)),
+        "total_entries": sum(len(v) for v in section_ids.values()),
+        "written": False,
+        "changed_sections": [],
     }
+
+
+def persist_blueprint(query, output_dir=None, project_name=None, page=None):
+    """``KnowledgeBase.persist_blueprint`` on the default knowledge base."""
+    return default_knowledge_base().persist_blueprint(query, output_dir, project_name, page)
+
+
+# Below this many distinct lookups a process pool costs more than it saves
+_PARALLEL_MIN_LOOKUPS = 16
+
+
+def load_pages_manifest(path: Union[str, Path]) -> Dict[str, Any]:
+    """Read a bulk blueprint manifest into ``{"project", "query", "pages"}``.
+
+    JSON / YAML: ``{"project": "Shop", "query": "<master query>",
+    "pages": {"<page name>": "<query>", ...}}``.  YAML needs PyYAML.
+    CSV: ``page,query`` columns; the row whose page is ``MASTER`` holds the
+    master query and the project name comes from the caller.
+    """
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix == ".csv":
+        spec: Dict[str, Any] = {"pages": {}}
+        for row in _load_csv(path):
+            page, query = (row.get("page") or "").strip(), (row.get("query") or "").strip()
+            if page.upper() == "MASTER":
+                spec["query"] = query
+            elif page:
+                spec["pages"][page] = query
+    elif suffix in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError("YAML manifests need PyYAML (pip install pyyaml); use JSON or CSV instead")
+        with open(path, encoding="utf-8") as f:
+            spec = yaml.safe_load(f) or {}
+    else:
+        with open(path, encoding="utf-8") as f:
+            spec = json.load(f)
+
+    pages = spec.get("pages") or {}
+    if isinstance(pages, list):
+        pages = {str(p["page"]): str(p["query"]) for p in pages}
+    for name in pages:
+        if not name or "/" in name or "\\" in name or name.startswith("."):
+            raise ValueError(f"Invalid page name in manifest: {name!r}")
+    return {"project": spec.get("project"), "query": spec.get("query"), "pages": dict(pages)}
+
+
+def persist_blueprint_manifest(manifest_path, output_dir=None, project_name=None, query=None, workers=0):
+    """``KnowledgeBase.persist_blueprint_manifest`` on the default knowledge base."""
+    return default_knowledge_base().persist_blueprint_manifest(manifest_path, output_dir, project_name, query, workers)
+
+
+# ============ METRICS ============
+# name -> (type, label names, help, histogram buckets)
+METRICS = {
+    "mbp_search_duration_seconds": ("histogram", ("kind", "domain", "mode"), "Latency of search API calls by kind, domain and ranking mode", LATENCY_BUCKETS),
+    "mbp_search_errors_total": ("counter", ("kind",), "Search API calls that returned an error", ()),
+    "mbp_docs_scored": ("histogram", ("source", "mode"), "Documents fully scored (--fast: accumulated) per ranked query", DOCS_SCORED_BUCKETS),
+    "mbp_cache_requests_total": ("counter", ("cache", "result"), "Index, ranking and derived-index cache lookups by hit or miss", ()),
+    "mbp_index_build_seconds": ("histogram", ("source", "kind"), "Time to load, refresh or compile an index", BUILD_BUCKETS),
+    "mbp_indexes_loaded": ("gauge", (), "Indexes currently published", ()),
+    "mbp_index_documents": ("gauge", ("source",), "Documents in each loaded index", ()),
+    "mbp_index_bytes": ("gauge", ("source", "part"), "Index memory: mapped index and CSV files, approximate heap of in-memory indexes, SQLite database", ()),
+    "mbp_ranking_cache_entries": ("gauge", (), "Full rankings cached for --offset / --cursor", ()),
+}
+
+
+def _label_value(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _bucket_bound(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+
+class MetricsRegistry:
+    """Counters and histograms of one process, rendered as Prometheus text or JSON.
+
+    Recording a sample is a dict update under one lock, so instrumenting the
+    request path costs about a microsecond.  Gauges describing current state
+    (loaded indexes, their memory) come from collector callbacks run only
+    when the metrics are rendered.
+    """
+
+    def __init__(self, metrics: Optional[Dict[str, Tuple[str, Tuple[str, ...], str, Tuple[float, ...]]]] = None):
+        self.metrics = metrics if metrics is not None else METRICS
+        self._lock = threading.Lock()
+        # name -> label values -> value (counter) or [per-bucket counts, sum, count] (histogram)
+        self._values: Dict[str, Dict[Tuple[str, ...], Any]] = {name: {} for name in self.metrics}
+        self._collectors: List[Any] = []
+
+    def inc(self, name: str, labels: Tuple[str, ...] = (), value: float = 1) -> None:
+        """Add *value* to a counter."""
+        with self._lock:
+            series = self._values[name]
+            series[labels] = series.get(labels, 0) + value
+
+    def observe(self, name: str, labels: Tuple[str, ...], value: float) -> None:
+        """Record one sample in a histogram."""
+        buckets = self.metrics[name][3]
+        at = bisect_left(buckets, value)
+        with self._lock:
+            series = self._values[name]
+            entry = series.get(labels)
+            if entry is None:
+                entry = series[labels] = [[0] * (len(buckets) + 1), 0.0, 0]
+            entry[0][at] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def add_collector(self, collector) -> None:
+        """Register a callable yielding (gauge name, label values, value) at render time."""
+        self._collectors.append(collector)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Every metric as ``{name: {"type", "help", "samples"}}``; histogram buckets are cumulative."""
+        with self._lock:
+            values = {name: {labels: (copy.deepcopy(v) if isinstance(v, list) else v) for labels, v in series.items()}
+                      for name, series in self._values.items()}
+        for collector in self._collectors:
+            for name, labels, value in collector():
+                values[name][labels] = value
+        out: Dict[str, Any] = {}
+        for name, (kind, label_names, help_text, buckets) in self.metrics.items():
+            samples = []
+            for labels, value in sorted(values[name].items()):
+                sample: Dict[str, Any] = {"labels": dict(zip(label_names, labels))}
+                if kind == "histogram":
+                    counts, total, count = value
+                    cumulative, running = {}, 0
+                    for bound, n in zip(tuple(buckets) + (float("inf"),), counts):
+                        running += n
+                        cumulative[_bucket_bound(bound)] = running
+                    sample.update(buckets=cumulative, sum=total, count=count)
+                else:
+                    sample["value"] = value
+                samples.append(sample)
+            out[name] = {"type": kind, "help": help_text, "samples": samples}
+        return out
+
+    def render(self, fmt: str = "prometheus") -> str:
+        """The metrics in Prometheus text exposition format (0.0.4) or as JSON."""
+        snapshot = self.snapshot()
+        if fmt == "json":
+            return json.dumps(snapshot, indent=2)
+        lines = []
+        for name, metric in snapshot.items():
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['type']}")
+            for sample in metric["samples"]:
+                labels = [f'{k}="{_label_value(v)}"' for k, v in sample["labels"].items()]
+                if metric["type"] == "histogram":
+                    for bound, n in sample["buckets"].items():
+                        bucket_labels = ",".join(labels + [f'le="{bound}"'])
+                        lines.append(f"{name}_bucket{{{bucket_labels}}} {n}")
+                    suffix = "{" + ",".join(labels) + "}" if labels else ""
+                    lines.append(f"{name}_sum{suffix} {sample['sum']!r}")
+                    lines.append(f"{name}_count{suffix} {sample['count']}")
+                else:
+                    suffix = "{" + ",".join(labels) + "}" if labels else ""
+                    lines.append(f"{name}{suffix} {sample['value']!r}")
+        return "\n".join(lines) + "\n"
+
+
+def _heap_bytes(index: "CsvIndex") -> int:
+    """Rough heap footprint of an index fitted in memory: its containers and their direct items."""
+    bm25 = cast(BM25, index.bm25)
+    total = sys.getsizeof(bm25.idf) + sys.getsizeof(bm25.doc_freqs)
+    total += sum(sys.getsizeof(tfs) for tfs in bm25.term_freqs) + sum(sys.getsizeof(tokens) for tokens in bm25.corpus)
+    total += sum(sys.getsizeof(row) + sum(sys.getsizeof(v) for v in row.values()) for row in index.rows)
+    return total + sum(sys.getsizeof(document) for document in index.documents)
+
+
+# Nesting depth of observed calls in this thread: only the outermost is recorded
+_observing = threading.local()
+
+
+def _observed(kind: str):
+    """Record latency (and errors) of a ``KnowledgeBase`` search method under *kind*.
+
+    Calls made from inside another observed call (``search_stack`` running
+    ``search``, the ``--all-domains`` retry) are part of that call's sample.
+    """
+    def decorate(method):
+        @wraps(method)
+        def observed(self, *args, **kwargs):
+            depth = getattr(_observing, "depth", 0)
+            if depth:
+                return method(self, *args, **kwargs)
+            _observing.depth = 1
+            start = time.perf_counter()
+            try:
+                result = method(self, *args, **kwargs)
+            finally:
+                _observing.depth = 0
+            elapsed = time.perf_counter() - start
+            first = result[0] if isinstance(result, list) and result else result
+            if isinstance(first, dict):
+                if any("error" in r for r in (result if isinstance(result, list) else [result])):
+                    self.metrics.inc("mbp_search_errors_total", (kind,))
+                domains = {str(r.get("platform") or r.get("domain") or "") for r in (result if isinstance(result, list) else [result])}
+                domain = domains.pop() if len(domains) == 1 else "mixed"
+                mode = "+".join(m for m in ("fuzzy", "fast") if first.get(m)) or "exact"
+                if mode == "exact" and self.backend == "sqlite" and kind in ("search", "platform", "stack", "all"):
+                    mode = "sqlite"
+                self.metrics.observe("mbp_search_duration_seconds", (kind, domain, mode), elapsed)
+            return result
+        return observed
+    return decorate
+
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    """GET /metrics (Prometheus text) and /metrics.json for ``KnowledgeBase.serve_metrics``."""
+
+    registry: MetricsRegistry
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path not in ("/metrics", "/metrics.json"):
+            self.send_error(404)
+            return
+        json_format = path.endswith(".json")
+        body = self.registry.render("json" if json_format else "prometheus").encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json" if json_format else "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # scrapes are not worth a line on stderr each
+
+
+# ============ KNOWLEDGE BASE ============
+class KnowledgeBase:
+    """The configs, tables and indexes of one data directory, shared by any number of threads.
+
+    Published indexes are never modified: a changed CSV is applied to a copy
+    (``CsvIndex.refreshed``) which then replaces the original in one
+    reference swap, read-copy-update style.  Readers take no lock and keep
+    using whatever index they started with.  Builds of the same index
+    serialise on a lock of their own (single flight: a thread arriving while
+    it is built waits for that build instead of starting another), builds of
+    different CSVs run in parallel, and only the swap takes a global lock.
+
+    Without a watcher every lookup checks the CSV's signature, as the module
+    functions always have.  ``watch()`` starts a background thread that polls
+    the mtimes instead, rebuilds changed indexes off the request path and
+    lets lookups skip the check entirely.
+
+    With ``backend="sqlite"`` domain, platform, stack and all-domains
+    searches rank in the ``SqliteIndex`` instead of the in-memory indexes.
+
+    ``metrics`` records search latency, documents scored, cache hits and
+    index builds; ``serve_metrics()`` exposes it over HTTP.
+
+    The module-level search functions are thin wrappers over
+    ``default_knowledge_base()``.
+    """
+
+    def __init__(self, data_dir: Optional[Union[str, Path]] = None, csv_config: Optional[Dict[str, Dict[str, Any]]] = None,
+                 platform_config: Optional[Dict[str, Dict[str, str]]] = None, backend: str = "python"):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend: {backend}. Available: {', '.join(BACKENDS)}")
+        self.backend = backend
+        self.data_dir = Path(data_dir) if data_dir is not None else DATA_DIR
+        self.csv_config = csv_config if csv_config is not None else CSV_CONFIG
+        self.platform_config = platform_config if platform_config is not None else PLATFORM_CONFIG
+        # (csv path, search cols) -> published index; the dict itself is replaced, never mutated
+        self._indexes: Dict[Tuple[str, Tuple[str, ...]], CsvIndex] = {}
+        self._suggest: Optional[SuggestIndex] = None
+        self._code: Optional[CodeIndex] = None
+        self._relations: Optional[RelationGraph] = None
+        self._sqlite: Optional[SqliteIndex] = None
+        self._lock = threading.Lock()           # guards the swap of _indexes and _build_locks
+        self._build_locks: Dict[Tuple[str, Tuple[str, ...]], threading.Lock] = {}  # one per index key
+        self._derived_lock = threading.Lock()   # serialises suggest / code index / relation graph builds
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        # (csv path, cols, query, fuzzy, fast, platform) -> (expiry, index, ranked row ids), LRU order
+        self._rankings: "OrderedDict[Tuple, Tuple[float, CsvIndex, List[int]]]" = OrderedDict()
+        self._rankings_lock = threading.Lock()
+        self.metrics = MetricsRegistry()
+        self.metrics.add_collector(self._collect_metrics)
+
+    # ── Indexes ──────────────────────────────────────────────────────────────
+
+    def sources(self) -> List[Tuple[Path, List[str]]]:
+        """Every (csv path, search columns) pair the search functions index."""
+        return [(path, cols) for _, path, cols in self._search_sources()]
+
+    def cached(self, filepath: Path, search_cols: List[str]) -> Optional[CsvIndex]:
+        """The published index for *filepath* if it is current, without building anything."""
+        index = self._indexes.get((str(filepath), tuple(search_cols)))
+        if index is not None and (self._watcher is not None or index.signature == _file_signature(filepath)):
+            return index
+        return None
+
+    def index(self, filepath: Path, search_cols: List[str]) -> CsvIndex:
+        """The warm index for *filepath*, built or brought up to date first if needed."""
+        index = self.cached(filepath, search_cols)
+        if index is not None:
+            self.metrics.inc("mbp_cache_requests_total", ("index", "hit"))
+            return index
+        key = (str(filepath), tuple(search_cols))
+        with self._build_lock(key):
+            index = self._indexes.get(key)
+            start = time.perf_counter()
+            if index is None:
+                index, kind = CsvIndex(filepath, search_cols), "load"
+            elif index.signature != _file_signature(filepath):
+                index, kind = index.refreshed(), "refresh"
+            else:
+                self.metrics.inc("mbp_cache_requests_total", ("index", "hit"))
+                return index  # another thread published it while we waited
+            self._publish(key, index)
+        self.metrics.inc("mbp_cache_requests_total", ("index", "miss"))
+        self.metrics.observe("mbp_index_build_seconds", (filepath.name, kind), time.perf_counter() - start)
+        return index
+
+    def _build_lock(self, key: Tuple[str, Tuple[str, ...]]) -> threading.Lock:
+        """The lock that serialises builds and refreshes of the index under *key*."""
+        with self._lock:
+            return self._build_locks.setdefault(key, threading.Lock())
+
+    def _publish(self, key: Tuple[str, Tuple[str, ...]], index: CsvIndex) -> None:
+        with self._lock:
+            indexes = dict(self._indexes)
+            indexes[key] = index
+            self._indexes = indexes
+
+    def reload(self) -> List[str]:
+        """Rebuild every loaded index whose CSV changed and swap it in; returns their paths."""
+        changed = []
+        for key, index in list(self._indexes.items()):
+            try:
+                if index.signature == _file_signature(index.filepath):
+                    continue
+            except OSError:
+                continue  # mid-replace or deleted: keep serving the old index
+            with self._build_lock(key):
+                current = self._indexes.get(key)
+                if current is not None and current.signature != _file_signature(current.filepath):
+                    start = time.perf_counter()
+                    self._publish(key, current.refreshed())
+                    self.metrics.observe("mbp_index_build_seconds", (current.filepath.name, "refresh"), time.perf_counter() - start)
+                    changed.append(key[0])
+        if changed:
+            # Rebuild the derived indexes now, not on the next request
+            if self._suggest is not None:
+                self.suggest_index()
+            if self._code is not None:
+                self.code_index()
+            if self._relations is not None:
+                self.relation_graph()
+        if self._sqlite is not None:
+            changed += self._update_sqlite(self._sqlite)
+        return changed
+
+    def watch(self, interval: float = 1.0) -> None:
+        """Poll the loaded CSVs every *interval* seconds and reload changed ones in the background.
+
+        Polls mtimes rather than using inotify, which the standard library
+        does not expose.
+        """
+        if self._watcher is not None:
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, args=(interval,), name="knowledge-base-watch", daemon=True)
+        self._watcher.start()
+
+    def _watch(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.reload()
+            except (OSError, ValueError, csv.Error):
+                pass  # a half-written CSV: try again on the next tick
+
+    def close(self) -> None:
+        """Stop the watcher, if any."""
+        if self._watcher is not None:
+            self._stop.set()
+            self._watcher.join()
+            self._watcher = None
+
+    def _derived(self, attr: str, factory):
+        """A SuggestIndex / CodeIndex / RelationGraph over the current indexes, rebuilt when any of them was swapped."""
+        indexes = [(name, self.index(path, cols)) for name, path, cols in self._search_sources() if path.exists()]
+        derived = getattr(self, attr)
+        if derived is None or [id(i) for _, i in derived.sources] != [id(i) for _, i in indexes]:
+            with self._derived_lock:
+                derived = getattr(self, attr)
+                if derived is None or [id(i) for _, i in derived.sources] != [id(i) for _, i in indexes]:
+                    start = time.perf_counter()
+                    derived = factory(indexes)
+                    setattr(self, attr, derived)
+                    self.metrics.inc("mbp_cache_requests_total", (attr.lstrip("_"), "miss"))
+                    self.metrics.observe("mbp_index_build_seconds", (attr.lstrip("_"), "derived"), time.perf_counter() - start)
+                    return derived
+        self.metrics.inc("mbp_cache_requests_total", (attr.lstrip("_"), "hit"))
+        return derived
+
+    def suggest_index(self) -> SuggestIndex:
+        return self._derived("_suggest", SuggestIndex)
+
+    def code_index(self) -> CodeIndex:
+        return self._derived("_code", CodeIndex)
+
+    def relation_graph(self) -> RelationGraph:
+        """The relation graph over the current indexes: mapped from data/.index/
+        when it was built from the same CSVs, otherwise built and written there."""
+        return self._derived("_relations", self._load_relation_graph)
+
+    def _load_relation_graph(self, indexes: List[Tuple[str, CsvIndex]]) -> RelationGraph:
+        path = self.data_dir / INDEX_DIR_NAME / RELATION_GRAPH_NAME
+        graph = RelationGraph.load(path, indexes)
+        if graph is None:
+            graph = RelationGraph.build(indexes)
+            try:
+                graph.write(path)
+            except OSError:
+                pass  # read-only install: keep the graph in memory
+        return graph
+
+    def sqlite_index(self) -> SqliteIndex:
+        """The SQLite index of this data directory, compiled on first use and kept current."""
+        if self._sqlite is None:
+            with self._derived_lock:
+                if self._sqlite is None:
+                    db = SqliteIndex(self.data_dir / INDEX_DIR_NAME / SQLITE_INDEX_NAME)
+                    self._update_sqlite(db)
+                    self._sqlite = db
+        elif self._watcher is None:
+            self._update_sqlite(self._sqlite)
+        return self._sqlite
+
+    def _update_sqlite(self, db: SqliteIndex) -> List[str]:
+        start = time.perf_counter()
+        compiled = db.update(self.sources())
+        if compiled:
+            self.metrics.observe("mbp_index_build_seconds", (db.path.name, "sqlite"), time.perf_counter() - start)
+        return compiled
+
+    # ── Metrics ──────────────────────────────────────────────────────────────
+
+    def _collect_metrics(self) -> Iterator[Tuple[str, Tuple[str, ...], float]]:
+        """Gauges for ``metrics``: loaded indexes, their documents and memory."""
+        indexes = self._indexes
+        yield "mbp_indexes_loaded", (), len(indexes)
+        for index in indexes.values():
+            source = index.filepath.name
+            yield "mbp_index_documents", (source,), index.bm25.N
+            if isinstance(index.bm25, (MappedBM25, PatchedBM25)):
+                mapped = index.bm25.base if isinstance(index.bm25, PatchedBM25) else index.bm25
+                yield "mbp_index_bytes", (source, "index_file"), len(mapped.buf)
+                yield "mbp_index_bytes", (source, "csv_file"), len(index.rows._data)
+            else:
+                yield "mbp_index_bytes", (source, "heap"), _heap_bytes(index)
+        if self._sqlite is not None and self._sqlite.path.exists():
+            yield "mbp_index_bytes", (self._sqlite.path.name, "sqlite"), self._sqlite.path.stat().st_size
+        yield "mbp_ranking_cache_entries", (), len(self._rankings)
+
+    def serve_metrics(self, port: int = 9464, host: str = "127.0.0.1") -> http.server.ThreadingHTTPServer:
+        """Serve ``GET /metrics`` (Prometheus text) and ``/metrics.json`` from a daemon thread.
+
+        Returns the server; ``shutdown()`` stops it.  Port 0 picks a free port
+        (see ``server_address``).
+        """
+        handler = type("MetricsHandler", (_MetricsHandler,), {"registry": self.metrics})
+        server = http.server.ThreadingHTTPServer((host, port), handler)
+        threading.Thread(target=server.serve_forever, name="knowledge-base-metrics", daemon=True).start()
+        return server
+
+    def _on_sqlite(self, fuzzy: bool, fast: bool) -> bool:
+        """Whether a search ranks in SQLite: --fuzzy and --fast need the in-memory engine."""
+        return self.backend == "sqlite" and not (fuzzy or fast)
+
+    # ── Search ───────────────────────────────────────────────────────────────
+
+    def _rank(self, index: CsvIndex, query: str, max_results: int, fuzzy: bool = False, fast: bool = False) -> List[Tuple[int, float]]:
+        """``_rank_index``, recording the documents it scored."""
+        stats: Dict[str, int] = {}
+        ranked = _rank_index(index, query, max_results, fuzzy=fuzzy, fast=fast, stats=stats)
+        self.metrics.observe("mbp_docs_scored", (index.filepath.name, "fast" if fast else "exact"),
+                             stats.get("scored", stats.get("candidates", 0)))
+        return ranked
+
+    def _score_csv(self, filepath: Path, search_cols: List[str], output_cols: List[str], query: str, top_k: int, fuzzy: bool = False, fast: bool = False, min_norm_score: float = 0.0) -> List[Tuple[float, Dict[str, str], str]]:
+        """Return (normalized_score, row, search document) for the top_k hits in one CSV.
+
+        Scores are normalised to [0, 1] by dividing by the maximum score in the
+        file so that results from different corpora are comparable when merged.
+        Hits below *min_norm_score* are dropped before their rows are read.
+        """
+        if not filepath.exists():
+            return []
+
+        if self._on_sqlite(fuzzy, fast):
+            db = self.sqlite_index()
+            candidates = db.rank(filepath, search_cols, query, top_k)
+        else:
+            index = self.index(filepath, search_cols)
+            candidates = self._rank(index, query, top_k, fuzzy=fuzzy, fast=fast)
+        if not candidates:
+            return []
+
+        max_score = candidates[0][1]  # top_k is sorted descending
+        if max_score == 0:
+            return []
+
+        kept = [(idx, score / max_score) for idx, score in candidates if score / max_score >= min_norm_score]
+        if self._on_sqlite(fuzzy, fast):
+            found = db.fetch(filepath, search_cols, [idx for idx, _ in kept])
+        else:
+            # One decode per hit covers both the output and the search columns
+            cols = output_cols + [col for col in search_cols if col not in output_cols]
+            found = [(row, index.document(row, search_cols)) for row in (index.row(idx, cols) for idx, _ in kept)]
+        return [(norm_score, _project_row(row, output_cols), document)
+                for (_, norm_score), (row, document) in zip(kept, found)]
+
+    def _search_csv(self, filepath: Path, search_cols: List[str], output_cols: List[str], query: str, max_results: int, fuzzy: bool = False, fast: bool = False) -> List[Dict[str, str]]:
+        """Core search function using BM25 (with optional fuzzy expansion)"""
+        if not filepath.exists():
+            return []
+
+        if self._on_sqlite(fuzzy, fast):
+            db = self.sqlite_index()
+            ranked = db.rank(filepath, search_cols, query, max_results)
+            return [_project_row(row, output_cols) for row, _ in db.fetch(filepath, search_cols, [idx for idx, _ in ranked])]
+        index = self.index(filepath, search_cols)
+        return [index.row(idx, output_cols) for idx, _ in self._rank(index, query, max_results, fuzzy=fuzzy, fast=fast)]
+
+    def _ranked_ids(self, filepath: Path, search_cols: List[str], query: str, fuzzy: bool = False, fast: bool = False, platform: Optional[str] = None) -> Tuple[CsvIndex, List[int]]:
+        """Every matching row of one CSV in rank order, kept in a short-lived cache.
+
+        Entries expire after ``RANKING_CACHE_TTL`` seconds or as soon as the
+        index is swapped for a newer one, so later pages cost only the rows
+        they materialise.
+        """
+        index = self.index(filepath, search_cols)
+        key = (str(filepath), tuple(search_cols), query, fuzzy, fast, platform)
+        with self._rankings_lock:
+            entry = self._rankings.get(key)
+            if entry is not None and entry[0] > time.monotonic() and entry[1] is index:
+                self._rankings.move_to_end(key)
+                self.metrics.inc("mbp_cache_requests_total", ("ranking", "hit"))
+                return index, entry[2]
+        self.metrics.inc("mbp_cache_requests_total", ("ranking", "miss"))
+
+        ids = [idx for idx, _ in self._rank(index, query, len(index.rows), fuzzy=fuzzy, fast=fast)]
+        if platform:
+            allowed = index.platform_rows(platform)
+            ids = [idx for idx in ids if idx in allowed]
+        with self._rankings_lock:
+            self._rankings[key] = (time.monotonic() + RANKING_CACHE_TTL, index, ids)
+            self._rankings.move_to_end(key)
+            while len(self._rankings) > RANKING_CACHE_SIZE:
+                self._rankings.popitem(last=False)
+        return index, ids
+
+    def _page(self, index: CsvIndex, ids: List[int], output_cols: List[str], offset: int, max_results: int, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Results ``offset .. offset + max_results`` of a cached ranking, with the cursor for the next page."""
+        end = offset + int(max_results)
+        results = [index.row(idx, output_cols) for idx in ids[offset:end]]
+        next_cursor = _encode_cursor(dict(state, o=end, n=int(max_results))) if end < len(ids) else None
+        return {"results": results, "offset": offset, "total": len(ids), "next_cursor": next_cursor}
+
+    @_observed("search")
+    def search(self, query: str, domain: Optional[str] = None, max_results: int = MAX_RESULTS, filter_platform: Optional[str] = None, fuzzy: bool = False, fast: bool = False, offset: Optional[int] = None) -> Dict[str, Any]:
+        """Main search function with auto-domain detection and optional platform filter
+
+        With *offset* the results start at that rank and the result also
+        carries ``offset``, ``total`` and a ``next_cursor`` for ``search_page``.
+        """
+        if offset is not None and offset < 0:
+            return {"error": f"Invalid offset: {offset}"}
+        if max_results < 1:
+            return {"error": f"Invalid max_results: {max_results}"}
+        query = clean_query(query)
+        if domain is None:
+            domain = detect_domain(query)
+
+        config = self.csv_config.get(domain, self.csv_config["architecture"])
+        # Ensure file is treated as string for Path concatenation
+        filepath = self.data_dir / str(config["file"])
+
+        if not filepath.exists():
+            return {"error": f"File not found: {filepath}", "domain": domain}
+
+        # Cast config values to expected types
+        search_cols = cast(List[str], config["search_cols"])
+        output_cols = cast(List[str], config["output_cols"])
+
+        filter_lower = filter_platform.lower() if filter_platform else None
+        # Aliases for filtering
+        if filter_lower == "android-xml":
+            filter_lower = "android"
+
+        if offset is not None:
+            index, ids = self._ranked_ids(filepath, search_cols, query, fuzzy=fuzzy, fast=fast, platform=filter_lower)
+            state = {"k": "search", "q": query, "d": domain, "fp": filter_platform, "fz": fuzzy, "fs": fast}
+            page = self._page(index, ids, output_cols, offset, max_results, state)
+            return {"domain": domain, "query": query, "file": config["file"], "count": len(page["results"]),
+                    **page, "fuzzy": fuzzy, "fast": fast}
+
+        if self._on_sqlite(fuzzy, fast):
+            # The platform filter is an indexed facet lookup inside the ranking query
+            db = self.sqlite_index()
+            ranked = db.rank(filepath, search_cols, query, max_results, platform=filter_lower)
+            results = [_project_row(row, output_cols) for row, _ in db.fetch(filepath, search_cols, [idx for idx, _ in ranked])]
+        elif filter_lower:
+            # Filter the top hits by platform through the index's Platform facet
+            index = self.index(filepath, search_cols)
+            allowed = index.platform_rows(filter_lower)
+            ranked = [idx for idx, _ in self._rank(index, query, max_results * 3, fuzzy=fuzzy, fast=fast) if idx in allowed]
+            results = [index.row(idx, output_cols) for idx in islice(ranked, int(max_results))]
+        else:
+            results = self._search_csv(filepath, search_cols, output_cols, query, max_results, fuzzy=fuzzy, fast=fast)
+
+        return {
+            "domain": domain,
+            "query": query,
+            "file": config["file"],
+            "count": len(results),
+            "results": results,
+            "fuzzy": fuzzy,
+            "fast": fast,
+        }
+
+    @_observed("many")
+    def search_many(self, queries: List[str], domain: Optional[str] = None, max_results: int = MAX_RESULTS, filter_platform: Optional[str] = None, fuzzy: bool = False) -> List[Dict[str, Any]]:
+        """``search`` for every query, batched per domain through ``BM25.score_many``.
+
+        Queries are grouped by their (given or detected) domain and each group
+        is ranked with one shared pass over that domain's postings.  Returns
+        one result dict per query, in order, identical to calling ``search``.
+        """
+        cleaned = [clean_query(query) for query in queries]
+        domains = [domain if domain is not None else detect_domain(query) for query in cleaned]
+        filter_lower = filter_platform.lower() if filter_platform else None
+        if filter_lower == "android-xml":
+            filter_lower = "android"
+        k = max_results * 3 if filter_lower else max_results
+
+        groups: Dict[str, List[int]] = {}
+        for position, name in enumerate(domains):
+            groups.setdefault(name, []).append(position)
+
+        out: List[Dict[str, Any]] = [{} for _ in cleaned]
+        for name, positions in groups.items():
+            config = self.csv_config.get(name, self.csv_config["architecture"])
+            filepath = self.data_dir / str(config["file"])
+            if not filepath.exists():
+                for position in positions:
+                    out[position] = {"error": f"File not found: {filepath}", "domain": name}
+                continue
+
+            index = self.index(filepath, cast(List[str], config["search_cols"]))
+            output_cols = cast(List[str], config["output_cols"])
+            batch = [cleaned[position] for position in positions]
+            if fuzzy:
+                batch = [index.bm25.expand_query(query) for query in batch]
+            allowed = index.platform_rows(filter_lower) if filter_lower else None
+            for position, ranked in zip(positions, index.bm25.score_many(batch, int(k))):
+                rows = [idx for idx, _ in ranked if allowed is None or idx in allowed]
+                results = [index.row(idx, output_cols) for idx in islice(rows, int(max_results))]
+                out[position] = {
+                    "domain": name,
+                    "query": cleaned[position],
+                    "file": config["file"],
+                    "count": len(results),
+                    "results": results,
+                    "fuzzy": fuzzy,
+                    "fast": False,
+                }
+        return out
+
+    @_observed("platform")
+    def search_platform(self, query: str, platform: str, max_results: int = MAX_RESULTS, fuzzy: bool = False, fast: bool = False, offset: Optional[int] = None) -> Dict[str, Any]:
+        """Search platform-specific guidelines (*offset* pages as in ``search``)"""
+        if offset is not None and offset < 0:
+            return {"error": f"Invalid offset: {offset}"}
+        if max_results < 1:
+            return {"error": f"Invalid max_results: {max_results}"}
+        query = clean_query(query)
+        if platform not in self.platform_config:
+            return {"error": f"Unknown platform: {platform}. Available: {', '.join(self.platform_config)}"}
+
+        filepath = self.data_dir / str(self.platform_config[platform]["file"])
+
+        if not filepath.exists():
+            return {"error": f"Platform file not found: {filepath}", "platform": platform}
+
+        search_cols = cast(List[str], _PLATFORM_COLS["search_cols"])
+        output_cols = cast(List[str], _PLATFORM_COLS["output_cols"])
+        if offset is not None:
+            index, ids = self._ranked_ids(filepath, search_cols, query, fuzzy=fuzzy, fast=fast)
+            state = {"k": "platform", "q": query, "d": platform, "fz": fuzzy, "fs": fast}
+            page = self._page(index, ids, output_cols, offset, max_results, state)
+            return {"domain": "platform", "platform": platform, "query": query, "file": self.platform_config[platform]["file"],
+                    "count": len(page["results"]), **page, "fuzzy": fuzzy, "fast": fast}
+        results = self._search_csv(filepath, search_cols, output_cols, query, max_results, fuzzy=fuzzy, fast=fast)
+
+        return {
+            "domain": "platform",
+            "platform": platform,
+            "query": query,
+            "file": self.platform_config[platform]["file"],
+            "count": len(results),
+            "results": results,
+            "fuzzy": fuzzy,
+            "fast": fast,
+        }
+
+    @_observed("page")
+    def search_page(self, cursor: str, max_results: Optional[int] = None) -> Dict[str, Any]:
+        """The page after the one that returned *cursor* (``next_cursor`` of a paged search).
+
+        The ranking comes from the cache while it is fresh and is recomputed
+        otherwise, so a cursor stays usable after the cache has expired.
+        *max_results* overrides the page size the cursor was created with.
+        """
+        try:
+            state = _decode_cursor(cursor)
+        except ValueError as e:
+            return {"error": str(e)}
+        size = max_results if max_results is not None else state.get("n", MAX_RESULTS)
+        if state["k"] == "platform":
+            return self.search_platform(state["q"], state["d"], size, fuzzy=bool(state.get("fz")), fast=bool(state.get("fs")), offset=state["o"])
+        return self.search(state["q"], state["d"], size, filter_platform=state.get("fp"),
+                           fuzzy=bool(state.get("fz")), fast=bool(state.get("fs")), offset=state["o"])
+
+    @_observed("get")
+    def get(self, domain: Optional[str], key: Union[str, List[str]], platform: Optional[str] = None) -> Dict[str, Any]:
+        """Rows whose identity column equals *key* exactly, without ranking.
+
+        Keys are the columns in ``_KEY_COLS`` (snippet ``ID``, ``Name``,
+        gradle ``Version Catalog Key``, platform ``Guideline``, ...), matched
+        case-insensitively through the index's key table.  *key* may be a
+        list, fetched in one call with results in key order; keys with no
+        row are listed under ``missing``.  *platform* looks in that
+        platform's guidelines; ``domain=None`` looks in every domain and tags
+        each row with its ``Domain``.
+        """
+        keys = [key] if isinstance(key, str) else list(key)
+        if platform is not None:
+            if platform not in self.platform_config:
+                return {"error": f"Unknown platform: {platform}. Available: {', '.join(self.platform_config)}"}
+            sources = [(platform, self.platform_config[platform]["file"], _PLATFORM_COLS)]
+        elif domain is None:
+            sources = [(name, config["file"], config) for name, config in self.csv_config.items()]
+        elif domain in self.csv_config:
+            sources = [(domain, self.csv_config[domain]["file"], self.csv_config[domain])]
+        else:
+            return {"error": f"Unknown domain: {domain}. Available: {', '.join(self.csv_config)}"}
+
+        indexes = []
+        for name, file, config in sources:
+            filepath = self.data_dir / str(file)
+            if filepath.exists():
+                indexes.append((name, self.index(filepath, cast(List[str], config["search_cols"])), cast(List[str], config["output_cols"])))
+        results, missing, seen = [], [], set()
+        for k in keys:
+            found = False
+            for name, index, output_cols in indexes:
+                for idx in index.key_rows(k):
+                    found = True
+                    if (name, idx) not in seen:
+                        seen.add((name, idx))
+                        row = index.row(idx, output_cols)
+                        results.append({"Domain": name, **row} if domain is None and platform is None else row)
+            if not found:
+                missing.append(k)
+
+        result: Dict[str, Any] = {"domain": "platform" if platform is not None else domain or "all"}
+        if platform is not None:
+            result["platform"] = platform
+        result.update({"keys": keys, "count": len(results), "results": results, "missing": missing})
+        return result
+
+    @_observed("stack")
+    def search_stack(self, query: str, stack: str, max_results: int = MAX_RESULTS, fuzzy: bool = False, fast: bool = False) -> Dict[str, Any]:
+        """Search filtered by tech stack (maps stack to platform + adds stack keywords)"""
+        query = clean_query(query)
+        stack_lower = stack.lower()
+
+        if stack_lower not in STACK_MAP:
+            return {"error": f"Unknown stack: {stack}. Available: {', '.join(AVAILABLE_STACKS)}"}
+
+        platform = STACK_MAP[stack_lower]
+
+        # Search platform guidelines first
+        platform_results = self.search_platform(f"{query} {stack}", platform, max_results, fuzzy=fuzzy, fast=fast)
+
+        # Also search across domains filtered by platform
+        domain_results = self.search(f"{query} {stack}", filter_platform=platform, max_results=max_results, fuzzy=fuzzy, fast=fast)
+
+        # Merge results
+        all_results: List[Any] = []
+        if platform_results.get("results"):
+            all_results.extend(platform_results["results"])
+        if domain_results.get("results"):
+            all_results.extend(domain_results["results"])
+
+        final_results = list(islice(all_results, int(max_results)))
+
+        return {
+            "domain": "stack",
+            "stack": stack,
+            "platform": platform,
+            "query": query,
+            "count": len(final_results),
+            "results": final_results
+        }
+
+    @_observed("all")
+    def search_all_domains(self, query: str, max_results: int = ALL_DOMAINS_MAX_RESULTS, fuzzy: bool = False, fast: bool = False, filter_platform: Optional[str] = None, min_norm_score: float = 0.5, min_token_coverage: float = 0.5) -> Dict[str, Any]:
+        """Search across ALL domains and return top results ranked by normalised BM25 score.
+
+        Each domain's scores are normalised to [0, 1] before merging so results
+        from small and large CSVs are comparable.  Two quality filters are applied:
+
+        - *min_norm_score* (default 0.5): result must score >= 50% of the best hit
+          in its own domain.
+        - *min_token_coverage* (default 0.5): at least half of the unique query
+          tokens must actually appear in the result's searchable text, preventing
+          entries that only incidentally share one common word from surfacing.
+
+        Each result row includes a ``"Domain"`` key (first field).
+        """
+        query = clean_query(query)
+        hits = [(domain, self._domain_hits(domain, query, max_results, fuzzy, fast, min_norm_score)) for domain in self.csv_config]
+        return self._merge_domain_hits(query, hits, max_results, fuzzy, fast, filter_platform, min_token_coverage)
+
+    def _domain_hits(self, domain: str, query: str, max_results: int, fuzzy: bool = False, fast: bool = False, min_norm_score: float = 0.5) -> List[Tuple[float, Dict[str, str], str]]:
+        """Score one domain for ``search_all_domains``; independent of the other domains."""
+        config = self.csv_config[domain]
+        filepath = self.data_dir / str(config["file"])
+        if not filepath.exists():
+            return []
+        # Fetch more candidates per domain so cross-domain merge has good coverage
+        # Weak incidental matches (below min_norm_score) are skipped
+        return self._score_csv(filepath, cast(List[str], config["search_cols"]), cast(List[str], config["output_cols"]),
+                               query, max_results * 2, fuzzy=fuzzy, fast=fast, min_norm_score=min_norm_score)
+
+    def _merge_domain_hits(self, query: str, domain_hits: List[Tuple[str, List[Tuple[float, Dict[str, str], str]]]], max_results: int, fuzzy: bool = False, fast: bool = False, filter_platform: Optional[str] = None, min_token_coverage: float = 0.5) -> Dict[str, Any]:
+        """Filter and merge the per-domain hits of ``search_all_domains`` into one result."""
+        # Pre-compute query token set for coverage check
+        _bm25_tmp = BM25()
+        query_tokens = set(_bm25_tmp.tokenize(query))
+        n_query_tokens = len(query_tokens) if query_tokens else 1
+
+        all_hits: List[Tuple[float, Dict[str, str]]] = []
+
+        for domain, hits in domain_hits:
+            for norm_score, row, document in hits:
+                # Check token coverage against the row's search text
+                if _query_coverage(query_tokens, document) < min_token_coverage:
+                    continue  # too few query tokens matched this entry
+
+                # Optional platform filter
+                if filter_platform and not _on_platform(row, filter_platform):
+                    continue
+                tagged = {"Domain": domain}
+                tagged.update(row)
+                all_hits.append((norm_score, tagged))
+
+        # Fallback: coverage filter was too strict (e.g. a generic word like "screen"
+        # inflates n_query_tokens so domain-specific terms score below 50% coverage).
+        # Retry with at-least-1-token requirement so high-scoring domain entries surface;
+        # the scores do not depend on the coverage, so the same hits are re-filtered.
+        if len(all_hits) < min(_MIN_COVERED_HITS, max_results) and min_token_coverage > 1.0 / n_query_tokens:
+            return self._merge_domain_hits(query, domain_hits, max_results, fuzzy, fast, filter_platform,
+                                           min_token_coverage=1.0 / n_query_tokens)
+
+        # Sort by normalised score descending, then take top N
+        all_hits.sort(key=lambda x: x[0], reverse=True)
+        results = [row for _, row in all_hits[:max_results]]
+
+        return {
+            "domain": "all",
+            "query": query,
+            "count": len(results),
+            "results": results,
+            "fuzzy": fuzzy,
+            "fast": fast,
+        }
+
+    def explain(self, query: str, domain: Optional[str] = None, max_results: Optional[int] = None, filter_platform: Optional[str] = None, fuzzy: bool = False, fast: bool = False, platform: Optional[str] = None, min_norm_score: float = 0.5, min_token_coverage: float = 0.5) -> Dict[str, Any]:
+        """Run a search and report how it ranked what it returned.
+
+        *domain* and *filter_platform* work as in ``search`` (``"all"`` explains
+        ``search_all_domains`` with its *min_norm_score* and
+        *min_token_coverage*), *platform* as in ``search_platform``; the
+        results are the rows those searches return.  Reports the query after
+        ``clean_query`` and fuzzy expansion; per source the document count,
+        avgdl, per-token df / IDF / MaxScore bound and the candidates and
+        documents scored; per result the tf, length normalisation and
+        contribution of every token, the raw and normalised score and the
+        query-token coverage; and the time spent in each stage.  The
+        in-memory engine is always explained: the SQLite backend ranks with
+        FTS5's own bm25().
+        """
+        timings: Dict[str, float] = {}
+
+        def lap(stage: str, since: float) -> float:
+            now = time.perf_counter()
+            timings[stage] = timings.get(stage, 0.0) + (now - since) * 1000
+            return now
+
+        started = t = time.perf_counter()
+        cleaned = clean_query(query)
+        t = lap("clean", t)
+        all_domains = domain == "all" and platform is None
+        filter_lower = filter_platform.lower() if filter_platform else None
+        if filter_lower == "android-xml":
+            filter_lower = "android"
+
+        if platform is not None:
+            if platform not in self.platform_config:
+                return {"error": f"Unknown platform: {platform}. Available: {', '.join(self.platform_config)}"}
+            label = "platform"
+            max_results = MAX_RESULTS if max_results is None else max_results
+            k = max_results
+            sources = [(platform, str(self.platform_config[platform]["file"]), _PLATFORM_COLS["search_cols"], _PLATFORM_COLS["output_cols"])]
+        elif all_domains:
+            label = "all"
+            max_results = ALL_DOMAINS_MAX_RESULTS if max_results is None else max_results
+            k = max_results * 2
+            sources = [(name, str(config["file"]), config["search_cols"], config["output_cols"]) for name, config in self.csv_config.items()]
+        else:
+            if domain is None:
+                domain = detect_domain(cleaned)
+                t = lap("detect", t)
+            label = domain
+            max_results = MAX_RESULTS if max_results is None else max_results
+            k = max_results * 3 if filter_lower else max_results
+            config = self.csv_config.get(domain, self.csv_config["architecture"])
+            sources = [(domain, str(config["file"]), config["search_cols"], config["output_cols"])]
+
+        query_tokens = set(BM25().tokenize(cleaned))
+        report: List[Dict[str, Any]] = []
+        # (norm score, source, index, expanded query, output cols, row id, score, coverage)
+        hits: List[Tuple[float, str, CsvIndex, str, List[str], int, float, float]] = []
+        for name, file, search_cols, output_cols in sources:
+            filepath = self.data_dir / file
+            if not filepath.exists():
+                if not all_domains:
+                    return {"error": f"File not found: {filepath}", "domain": label}
+                continue
+            t = time.perf_counter()
+            index = self.index(filepath, cast(List[str], search_cols))
+            t = lap("index", t)
+            bm25 = index.bm25
+            expanded = bm25.expand_query(cleaned) if fuzzy else cleaned
+            t = lap("expand", t)
+            stats: Dict[str, int] = {}
+            ranked = _rank_index(index, expanded, k, fast=fast, stats=stats)
+            t = lap("rank", t)
+
+            top = ranked[0][1] if ranked else 0.0
+            allowed = index.platform_rows(filter_lower) if filter_lower and not all_domains and platform is None else None
+            dropped = Counter()
+            for idx, score in ranked:
+                norm_score = score / top if top else 0.0
+                if all_domains and norm_score < min_norm_score:
+                    dropped["min_norm_score"] += 1
+                    continue
+                if allowed is not None and idx not in allowed:
+                    dropped["filter_platform"] += 1
+                    continue
+                if all_domains and filter_platform and not _on_platform(index.row(idx, cast(List[str], output_cols)), filter_platform):
+                    dropped["filter_platform"] += 1
+                    continue
+                hits.append((norm_score, name, index, expanded, cast(List[str], output_cols), idx, score,
+                             _query_coverage(query_tokens, index.documents[idx])))
+            t = lap("filter", t)
+            report.append({"source": name, "file": file, "query": expanded, "docs": bm25.N, "avgdl": bm25.avgdl,
+                           "k1": bm25.k1, "b": bm25.b, "tokens": bm25.term_stats(expanded), "ranked": len(ranked),
+                           **stats, "dropped": dict(dropped)})
+
+        if all_domains:
+            # The coverage filter and its looser retry, as in search_all_domains
+            n_query_tokens = len(query_tokens) or 1
+            kept = [hit for hit in hits if hit[7] >= min_token_coverage]
+            if len(kept) < min(_MIN_COVERED_HITS, max_results) and min_token_coverage > 1.0 / n_query_tokens:
+                min_token_coverage = 1.0 / n_query_tokens
+                kept = [hit for hit in hits if hit[7] >= min_token_coverage]
+            kept.sort(key=lambda hit: hit[0], reverse=True)
+            hits = kept
+            t = lap("filter", t)
+
+        results = []
+        for rank, (norm_score, name, index, expanded, output_cols, idx, score, coverage) in enumerate(hits[:max_results], 1):
+            t = time.perf_counter()
+            row = index.row(idx, output_cols)
+            t = lap("rows", t)
+            breakdown = index.bm25.explain(expanded, idx)
+            t = lap("explain", t)
+            results.append({"rank": rank, "source": name, "row_id": idx,
+                            "title": next((str(row[c]) for c in _TITLE_COLS if row.get(c)), next(iter(row.values()), "")),
+                            "score": score, "norm_score": norm_score, "coverage": coverage,
+                            "doc_len": breakdown["doc_len"], "length_norm": breakdown["length_norm"], "terms": breakdown["terms"]})
+            if fast:
+                results[-1]["exact_score"] = breakdown["score"]  # the ranked score is dequantised
+        timings["total"] = (time.perf_counter() - started) * 1000
+
+        explained: Dict[str, Any] = {"domain": label, "query": query, "cleaned": cleaned}
+        if platform is not None:
+            explained["platform"] = platform
+        if all_domains:
+            explained.update(min_norm_score=min_norm_score, min_token_coverage=min_token_coverage)
+        explained.update({
+            "filter_platform": filter_platform,
+            "fuzzy": fuzzy,
+            "fast": fast,
+            "k": k,
+            "sources": report,
+            "count": len(results),
+            "results": results,
+            "timings_ms": {stage: round(ms, 3) for stage, ms in timings.items()},
+        })
+        return explained
+
+    def _search_sources(self) -> List[Tuple[str, Path, List[str]]]:
+        """(domain or platform, csv path, search cols) for every indexed CSV."""
+        sources = [(domain, self.data_dir / str(config["file"]), cast(List[str], config["search_cols"]))
+                   for domain, config in self.csv_config.items()]
+        seen = set()
+        for platform, config in self.platform_config.items():
+            if config["file"] not in seen:
+                seen.add(config["file"])
+                sources.append((platform, self.data_dir / str(config["file"]), cast(List[str], _PLATFORM_COLS["search_cols"])))
+        return sources
+
+    @_observed("suggest")
+    def suggest(self, prefix: str, k: int = 10) -> Dict[str, Any]:
+        """As-you-type suggestions: vocabulary terms and entry titles starting with *prefix*.
+
+        Built once from the warm search indexes and rebuilt only when a CSV
+        changes, so a keystroke costs a binary search over the sorted keys.
+        """
+        prefix = prefix.strip()
+        if not prefix:
+            return {"error": "Empty prefix"}
+        suggestions = self.suggest_index().lookup(prefix, k)
+        return {"prefix": prefix, "count": len(suggestions), "suggestions": suggestions}
+
+    @_observed("code")
+    def search_code(self, query: str, max_results: int = MAX_RESULTS, filter_platform: Optional[str] = None) -> Dict[str, Any]:
+        """BM25 search over the code columns of every domain and platform CSV.
+
+        Queries are tokenised like code, so identifiers ("collectAsStateWithLifecycle"),
+        their words ("state lifecycle"), @annotations and dotted imports all match.
+        """
+        if not query.strip():
+            return {"error": "Empty query"}
+        platform = filter_platform.lower().replace("android-xml", "android") if filter_platform else None
+        results = self.code_index().search(query, max_results, platform)
+        return {"domain": "code", "query": query, "count": len(results), "results": results}
+
+    @_observed("symbol")
+    def find_symbol(self, symbol: str, max_results: int = MAX_RESULTS, filter_platform: Optional[str] = None) -> Dict[str, Any]:
+        """Where *symbol* is used: every code field containing the identifier,
+        annotation ("@Composable") or dotted name / package prefix, with the line
+        it appears on.  ``total`` counts all uses when more than *max_results*
+        were found."""
+        if not symbol.strip():
+            return {"error": "Empty symbol"}
+        platform = filter_platform.lower().replace("android-xml", "android") if filter_platform else None
+        occurrences = self.code_index().find(symbol, platform)
+        return {"domain": "symbol", "query": symbol.strip(), "count": min(len(occurrences), max_results),
+                "total": len(occurrences), "results": occurrences[:max_results]}
+
+    @_observed("related")
+    def related(self, row_id: str, max_results: int = MAX_RESULTS, domain: Optional[str] = None, filter_platform: Optional[str] = None) -> Dict[str, Any]:
+        """Rows of other domains linked to *row_id* in the relation graph, strongest first.
+
+        *row_id* is ``"<domain>:<row index>"`` as code search and blueprints
+        report it (the platform name for platform guidelines), or
+        ``"<domain>:<key>"`` with any key ``get`` accepts, e.g.
+        ``"snippet:viewmodel_basic"``; a key shared by several rows relates
+        all of them.  *domain* keeps only the links into that domain.
+        """
+        name, _, key = row_id.partition(":")
+        name, key = name.strip().lower(), key.strip()
+        if not name or not key:
+            return {"error": f"Row id must be <domain>:<row or key>, got {row_id!r}"}
+        graph = self.relation_graph()
+        names = [n for n, _ in graph.sources]
+
+        def source_named(n: str) -> Optional[int]:
+            if n in self.platform_config:
+                path = self.data_dir / str(self.platform_config[n]["file"])
+                return next((s for s, (_, index) in enumerate(graph.sources) if index.filepath == path), None)
+            return names.index(n) if n in names else None
+
+        source = source_named(name)
+        if source is None:
+            return {"error": f"Unknown domain: {name}. Available: {', '.join(names)}"}
+        target = None
+        if domain:
+            target = source_named(domain.lower())
+            if target is None:
+                return {"error": f"Unknown domain: {domain}. Available: {', '.join(names)}"}
+        index = graph.sources[source][1]
+        rows = ([int(key)] if int(key) < len(index.rows) else []) if key.isdigit() else index.key_rows(key)
+        if not rows:
+            return {"error": f"No row {key!r} in {name}"}
+
+        seeds = {graph.node(source, row_idx): 1.0 for row_idx in rows}
+        results = []
+        for node, weight in graph.spread(seeds, target, filter_platform)[:max_results]:
+            result: Dict[str, Any] = graph.head(node)
+            result["Weight"] = round(weight, 4)
+            results.append(result)
+        return {"domain": "related", "query": row_id, "rows": [graph.head(node) for node in seeds],
+                "count": len(results), "results": results}
+
+    # ── Blueprint ─────────────────────────────────────────────────────────────
+
+    def _blueprint_sources(self, platform: str) -> List[Tuple[str, Path, List[str], List[str]]]:
+        """(section key, csv path, search cols, output cols) for every blueprint lookup."""
+        sources = []
+        for domain in _BLUEPRINT_DOMAINS:
+            config = self.csv_config[domain]
+            sources.append((domain, self.data_dir / str(config["file"]),
+                            cast(List[str], config["search_cols"]), cast(List[str], config["output_cols"])))
+        if platform in self.platform_config:
+            sources.append(("platform", self.data_dir / str(self.platform_config[platform]["file"]),
+                            cast(List[str], _PLATFORM_COLS["search_cols"]), cast(List[str], _PLATFORM_COLS["output_cols"])))
+        return sources
+
+    def _blueprint_hits(self, query: str, platform: str) -> Dict[str, List[Tuple[str, Dict[str, str]]]]:
+        """Run every blueprint lookup in one pass over the shared warm indexes.
+
+        *query* must already be cleaned.  Returns section key -> [(row_id, row)],
+        where row_id is ``"<domain>:<row index>"`` (the platform name for
+        platform guidelines).
+        """
+        return self._blueprint_hits_many([(query, platform)])[(query, platform)]
+
+    def _blueprint_hits_many(self, lookups: List[Tuple[str, str]]) -> Dict[Tuple[str, str], Dict[str, List[Tuple[str, Dict[str, str]]]]]:
+        """``_blueprint_hits`` for many (cleaned query, platform) lookups.
+
+        The reasoning and architecture sections are ranked by BM25, each CSV
+        once for all the lookups that use it (``BM25.score_many``).  Their
+        hits, weighted by score relative to the best, seed the relation
+        graph: every other section takes the rows on the blueprint's
+        platform that the seeds link to most strongly, reading only the
+        seeds' own links.  A section the graph reaches nothing in is ranked
+        by BM25 instead.
+        """
+        by_source: Dict[Tuple[str, Path], Tuple[List[str], List[str], str, List[Tuple[str, str]]]] = {}
+        for lookup in lookups:
+            platform = lookup[1]
+            for key, filepath, search_cols, output_cols in self._blueprint_sources(platform):
+                prefix = platform if key == "platform" else key
+                by_source.setdefault((key, filepath), (search_cols, output_cols, prefix, []))[3].append(lookup)
+
+        hits: Dict[Tuple[str, str], Dict[str, List[Tuple[str, Dict[str, str]]]]] = {lookup: {} for lookup in lookups}
+        seeds: Dict[Tuple[str, str], Dict[int, float]] = {lookup: {} for lookup in lookups}
+        graph = self.relation_graph()
+        # Seed sections first: the walk for the others starts from their hits
+        for (key, filepath), (search_cols, output_cols, prefix, users) in sorted(
+                by_source.items(), key=lambda item: item[0][0] not in _BLUEPRINT_SEED_DOMAINS):
+            if not filepath.exists():
+                continue
+            index = self.index(filepath, search_cols)
+            source = graph.source_of(index)
+            if key not in _BLUEPRINT_SEED_DOMAINS and source is not None:
+                unreached = []
+                for lookup in users:
+                    reached = [graph.locate(node)[1] for node, _ in graph.spread(seeds[lookup], source, lookup[1])[:_BLUEPRINT_MAX_RESULTS]]
+                    if reached:
+                        hits[lookup][key] = [(f"{prefix}:{idx}", index.row(idx, output_cols)) for idx in reached]
+                    else:
+                        unreached.append(lookup)
+                users = unreached
+            if not users:
+                continue
+            for lookup, ranked in zip(users, index.bm25.score_many([query for query, _ in users], _BLUEPRINT_MAX_RESULTS)):
+                if ranked:
+                    hits[lookup][key] = [(f"{prefix}:{idx}", index.row(idx, output_cols)) for idx, _ in ranked]
+                    if key in _BLUEPRINT_SEED_DOMAINS and source is not None:
+                        top = ranked[0][1] or 1.0
+                        seeds[lookup].update((graph.node(source, idx), score / top) for idx, score in ranked
+                                             if graph.on_platform(graph.node(source, idx), lookup[1]))
+        return hits
+
+    def persist_blueprint(self, query, output_dir=None, project_name=None, page=None):
+        """Generate and persist architecture blueprint from search results
+
+        All lookups run as one pass over the shared warm indexes.  A manifest
+        (query, data hash, per-section result IDs) is kept next to the output:
+        re-running with unchanged data skips the searches, changed results
+        rewrite only their own sections, and the file is not touched at all when
+        nothing changed.
+        """
+        if output_dir is None:
+            output_dir = Path.cwd() / "architecture-blueprint"
+
+        output_dir = Path(output_dir)
+        pname = project_name or "MyApp"
+        platform = _detect_blueprint_platform(query)
+        rel_name = f"pages/{page}.md" if page else "MASTER.md"
+        filepath = output_dir / rel_name
+
+        manifest = _load_blueprint_manifest(output_dir)
+        # Every CSV: sections follow relation graph links built from all of them
+        data_hash = _data_hash([path for path, _ in self.sources()])
+
+        unchanged = _unchanged_blueprint(manifest["files"].get(rel_name), filepath, query, pname, data_hash)
+        if unchanged:
+            return unchanged
+
+        hits = self._blueprint_hits(clean_query(query), platform)
+        summary = _write_blueprint(filepath, rel_name, manifest, query, pname, platform, data_hash, hits)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        _save_blueprint_manifest(output_dir, manifest)
+        return summary
+
+    def _run_blueprint_lookups(self, lookups: List[Tuple[str, str]], workers: int) -> Dict[Tuple[str, str], Dict[str, List[Tuple[str, Dict[str, str]]]]]:
+        """Resolve distinct (cleaned query, platform) lookups, in parallel when it pays off.
+
+        Indexes are warmed in this process first; forked workers inherit them
+        copy-on-write, so every worker searches the same prebuilt indexes.
+        """
+        if workers == 0:
+            workers = (os.cpu_count() or 1) if len(lookups) >= _PARALLEL_MIN_LOOKUPS else 1
+        if workers > 1 and "fork" in multiprocessing.get_all_start_methods():
+            for platform in {p for _, p in lookups}:
+                for _, filepath, search_cols, _ in self._blueprint_sources(platform):
+                    if filepath.exists():
+                        self.index(filepath, search_cols)
+            self.relation_graph()
+            global _FORK_KNOWLEDGE_BASE
+            _FORK_KNOWLEDGE_BASE = self
+            ctx = multiprocessing.get_context("fork")
+            with ProcessPoolExecutor(max_workers=min(workers, len(lookups)), mp_context=ctx) as pool:
+                # One batch per worker, so each shares its postings passes across its lookups
+                size = -(-len(lookups) // min(workers, len(lookups)))
+                chunks = [lookups[i:i + size] for i in range(0, len(lookups), size)]
+                results: Dict[Tuple[str, str], Dict[str, List[Tuple[str, Dict[str, str]]]]] = {}
+                for chunk_hits in pool.map(_fork_blueprint_hits, chunks):
+                    results.update(chunk_hits)
+                return results
+        return self._blueprint_hits_many(lookups)
+
+    def persist_blueprint_manifest(self, manifest_path, output_dir=None, project_name=None, query=None, workers=0):
+        """Generate MASTER.md and every pages/*.md listed in a manifest in one run.
+
+        Each distinct (cleaned query, platform) lookup is searched once and its
+        results reused by every page that repeats it; files already up to date
+        skip their lookups entirely.  *workers* = 0 picks a process pool
+        automatically for large manifests, 1 forces a single process.
+        *project_name* / *query* override the manifest's values.
+        """
+        try:
+            spec = load_pages_manifest(manifest_path)
+        except (OSError, ValueError, KeyError) as e:
+            return {"error": f"Cannot read manifest {manifest_path}: {e}"}
+
+        master_query = query or spec["query"]
+        if not master_query:
+            return {"error": f"Manifest {manifest_path} has no master query (set \"query\" or a MASTER row)"}
+
+        if output_dir is None:
+            output_dir = Path.cwd() / "architecture-blueprint"
+        output_dir = Path(output_dir)
+        pname = project_name or spec["project"] or "MyApp"
+        manifest = _load_blueprint_manifest(output_dir)
+
+        jobs = [("MASTER.md", master_query)] + [(f"pages/{page}.md", q) for page, q in spec["pages"].items()]
+        data_hash = _data_hash([path for path, _ in self.sources()])
+        summaries: Dict[str, Dict[str, Any]] = {}
+        pending: List[Tuple[str, str, str, Tuple[str, str]]] = []
+
+        for rel_name, job_query in jobs:
+            platform = _detect_blueprint_platform(job_query)
+            unchanged = _unchanged_blueprint(manifest["files"].get(rel_name), output_dir / rel_name,
+                                             job_query, pname, data_hash)
+            if unchanged:
+                summaries[rel_name] = unchanged
+            else:
+                pending.append((rel_name, job_query, platform, (clean_query(job_query), platform)))
+
+        lookups = list(dict.fromkeys(lookup for _, _, _, lookup in pending))
+        results = self._run_blueprint_lookups(lookups, workers) if lookups else {}
+
+        for rel_name, job_query, platform, lookup in pending:
+            summaries[rel_name] = _write_blueprint(output_dir / rel_name, rel_name, manifest, job_query, pname,
+                                                   platform, data_hash, results[lookup])
+        output_dir.mkdir(parents=True, exist_ok=True)
+        _save_blueprint_manifest(output_dir, manifest)
+
+        files = [summaries[rel_name] for rel_name, _ in jobs]
+        return {
+            "output_dir": str(output_dir),
+            "files": files,
+            "written": sum(1 for f in files if f["written"]),
+            "lookups": len(lookups),
+            "total_entries": sum(f["total_entries"] for f in files),
+        }
+
+
+_DEFAULT_KNOWLEDGE_BASE: Optional[KnowledgeBase] = None
+_DEFAULT_KNOWLEDGE_BASE_LOCK = threading.Lock()
+# The knowledge base forked blueprint workers search (see _run_blueprint_lookups)
+_FORK_KNOWLEDGE_BASE: Optional[KnowledgeBase] = None
+
+
+def metrics(fmt: str = "prometheus") -> str:
+    """The default knowledge base's metrics as Prometheus text or JSON (``fmt="json"``)."""
+    return default_knowledge_base().metrics.render(fmt)
+
+
+def default_knowledge_base() -> KnowledgeBase:
+    """The process-wide knowledge base over DATA_DIR behind the module-level functions."""
+    global _DEFAULT_KNOWLEDGE_BASE
+    if _DEFAULT_KNOWLEDGE_BASE is None:
+        with _DEFAULT_KNOWLEDGE_BASE_LOCK:
+            if _DEFAULT_KNOWLEDGE_BASE is None:
+                _DEFAULT_KNOWLEDGE_BASE = KnowledgeBase()
+    return _DEFAULT_KNOWLEDGE_BASE
+
+
+def _fork_blueprint_hits(lookups: List[Tuple[str, str]]) -> Dict[Tuple[str, str], Dict[str, List[Tuple[str, Dict[str, str]]]]]:
+    assert _FORK_KNOWLEDGE_BASE is not None
+    return _FORK_KNOWLEDGE_BASE._blueprint_hits_many(lookups)
+
+
+# ============ ASYNC API ============
+# For asyncio hosts: CSV loading, index building and scoring run in worker
+# threads so the event loop never blocks, and concurrent identical calls
+# (the same index load, the same search) share one in-flight task instead of
+# each doing the work.
+_IN_FLIGHT: Dict[Tuple, "asyncio.Task[Any]"] = {}
+
+
+async def _single_flight(key: Tuple, fn, *args) -> Any:
+    """Run ``fn(*args)`` in a worker thread, shared by concurrent callers with the same *key*.
+
+    The task is shielded, so a cancelled caller does not cancel it for the
+    others; it is forgotten once done, so a failure is retried next time.
+    """
+    loop = asyncio.get_running_loop()
+    task = _IN_FLIGHT.get(key)
+    if task is None or task.get_loop() is not loop:
+        task = loop.create_task(asyncio.to_thread(fn, *args))
+        _IN_FLIGHT[key] = task
+        task.add_done_callback(lambda done: _IN_FLIGHT.pop(key) if _IN_FLIGHT.get(key) is done else None)
+    return await asyncio.shield(task)
+
+
+async def _aget_index(filepath: Path, search_cols: List[str]) -> CsvIndex:
+    """Async ``KnowledgeBase.index``: a warm, current index is returned directly."""
+    kb = default_knowledge_base()
+    index = kb.cached(filepath, search_cols)
+    if index is not None:
+        return index
+    return await _single_flight(("index", str(filepath), tuple(search_cols)), kb.index, filepath, search_cols)
+
+
+async def _awarm(sources: List[Tuple[Path, List[str]]]) -> None:
+    """Load or refresh the indexes of *sources* concurrently."""
+    await asyncio.gather(*(_aget_index(path, cols) for path, cols in sources if path.exists()))
+
+
+async def asearch(query: str, domain: Optional[str] = None, max_results: int = MAX_RESULTS, filter_platform: Optional[str] = None, fuzzy: bool = False, fast: bool = False, offset: Optional[int] = None) -> Dict[str, Any]:
+    """Async ``search``; same arguments and result."""
+    kb = default_knowledge_base()
+    if domain is None:
+        domain = detect_domain(clean_query(query))
+    config = kb.csv_config.get(domain, kb.csv_config["architecture"])
+    await _awarm([(kb.data_dir / str(config["file"]), cast(List[str], config["search_cols"]))])
+    return await _single_flight(("search", query, domain, max_results, filter_platform, fuzzy, fast, offset),
+                                kb.search, query, domain, max_results, filter_platform, fuzzy, fast, offset)
+
+
+async def asearch_all_domains(query: str, max_results: int = ALL_DOMAINS_MAX_RESULTS, fuzzy: bool = False, fast: bool = False, filter_platform: Optional[str] = None) -> Dict[str, Any]:
+    """Async ``search_all_domains``: each domain is loaded and scored in its own
+    worker thread, concurrently, and the hits are merged once all are in."""
+    kb = default_knowledge_base()
+    query = clean_query(query)
+
+    async def domain_hits(domain: str) -> Tuple[str, List[Tuple[float, Dict[str, str], str]]]:
+        config = kb.csv_config[domain]
+        filepath = kb.data_dir / str(config["file"])
+        if filepath.exists():
+            await _aget_index(filepath, cast(List[str], config["search_cols"]))
+        hits = await _single_flight(("domain", domain, query, max_results, fuzzy, fast),
+                                    kb._domain_hits, domain, query, max_results, fuzzy, fast)
+        return domain, hits
+
+    hits = await asyncio.gather(*(domain_hits(domain) for domain in kb.csv_config))
+    return await asyncio.to_thread(kb._merge_domain_hits, query, list(hits), max_results, fuzzy, fast, filter_platform)
+
+
+async def apersist_blueprint(query: str, output_dir=None, project_name=None, page=None) -> Dict[str, Any]:
+    """Async ``persist_blueprint``: the blueprint indexes load concurrently, and
+    concurrent calls writing the same file share one run."""
+    kb = default_knowledge_base()
+    platform = _detect_blueprint_platform(query)
+    await _awarm([(path, cols) for _, path, cols, _ in kb._blueprint_sources(platform)])
+    target = str(Path(output_dir) if output_dir is not None else Path.cwd() / "architecture-blueprint")
+    return await _single_flight(("persist", query, target, project_name, page),
+                                kb.persist_blueprint, query, target, project_name, page)
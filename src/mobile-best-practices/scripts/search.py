@@ -10,10 +10,11 @@ Stacks: compose, jetpack-compose, material3, hilt, room, kotlin, swiftui, combin
 """
 
 import argparse
+import sys
 from core import (
-    CSV_CONFIG, AVAILABLE_PLATFORMS, AVAILABLE_STACKS, MAX_RESULTS, ALL_DOMAINS_MAX_RESULTS,
-    _CODE_FIELDS, apply_comment_style,
-    search, search_platform, search_stack, search_all_domains, persist_blueprint
+    CSV_CONFIG, AVAILABLE_PLATFORMS, AVAILABLE_STACKS, BACKENDS, MAX_RESULTS, ALL_DOMAINS_MAX_RESULTS, KnowledgeBase, default_knowledge_base,
+    _CODE_FIELDS, apply_comment_style, apply_token_budget, describe_elisions, estimate_tokens,
+    persist_blueprint, persist_blueprint_manifest
 )
 
 
@@ -31,16 +32,39 @@ def _apply_style_to_row(row: dict, style: str) -> dict:
     }
 
 
-def format_output(result, compact=False, comment_style=_COMMENT_STYLE_DEFAULT):
-    """Format results for Claude consumption (token-optimized)"""
+def _apply_style_to_result(result: dict, style: str) -> dict:
+    """Return a copy of *result* with comment style applied to every row."""
+    if style == "all":
+        return result
+    styled = dict(result)
+    styled["results"] = [_apply_style_to_row(row, style) for row in result["results"]]
+    return styled
+
+
+def format_output(result, compact=False, comment_style=_COMMENT_STYLE_DEFAULT, max_tokens=None):
+    """Format results for Claude consumption (token-optimized)
+
+    With *max_tokens*, fields are not cut at a fixed length; instead the
+    highest-ranked results and their most useful fields are packed into the
+    budget and whatever did not fit is reported at the end.
+    """
     if "error" in result:
         return f"Error: {result['error']}"
 
     if compact:
-        return format_compact(result, comment_style=comment_style)
+        return format_compact(result, comment_style=comment_style, max_tokens=max_tokens)
 
     output = []
-    if result.get("domain") == "platform":
+    if "keys" in result:
+        scope = result["platform"] if result.get("platform") else result["domain"]
+        output.append(f"## Mobile Best Practices - Lookup")
+        output.append(f"**Keys:** {', '.join(result['keys'])} | **Domain:** {scope}")
+    elif result.get("domain") == "related":
+        output.append(f"## Mobile Best Practices - Related Entries")
+        # Each row head is Domain, Row, then its title
+        output.append("**Row:** " + ", ".join(f"{row['Row']} ({list(row.values())[2]})" if len(row) > 2 else row["Row"]
+                                              for row in result["rows"]))
+    elif result.get("domain") == "platform":
         output.append(f"## Mobile Best Practices - Platform Guidelines")
         output.append(f"**Platform:** {result['platform']} | **Query:** {result['query']}")
     elif result.get("domain") == "stack":
@@ -54,55 +78,179 @@ def format_output(result, compact=False, comment_style=_COMMENT_STYLE_DEFAULT):
         output.append(f"**Domain:** {result['domain']} | **Query:** {result['query']}")
 
     file_info = result.get('file', '')
-    fuzzy_tag = " | **Mode:** fuzzy" if result.get('fuzzy') else ""
+    modes = [mode for mode in ("fuzzy", "fast") if result.get(mode)]
+    fuzzy_tag = f" | **Mode:** {', '.join(modes)}" if modes else ""
+    page_tag = f" ({result['offset'] + 1}–{result['offset'] + result['count']} of {result['total']})" if "total" in result and result["count"] else ""
     if file_info:
-        output.append(f"**Source:** {file_info} | **Found:** {result['count']} results{fuzzy_tag}\n")
+        output.append(f"**Source:** {file_info} | **Found:** {result['count']} results{page_tag}{fuzzy_tag}\n")
     else:
-        output.append(f"**Found:** {result['count']} results{fuzzy_tag}\n")
+        output.append(f"**Found:** {result['count']} results{page_tag}{fuzzy_tag}\n")
+
+    if result.get("missing"):
+        output.append(f"**Not found:** {', '.join(result['missing'])}\n")
 
     if comment_style != "all":
         output.append(f"**Comment style:** {comment_style}\n")
 
-    for i, row in enumerate(result['results'], 1):
+    styled = _apply_style_to_result(result, comment_style)
+    if max_tokens is not None:
+        header_cost = estimate_tokens("\n".join(output)) + 12  # + budget footer
+        styled = apply_token_budget(styled, max(max_tokens - header_cost, 0))
+
+    for i, row in enumerate(styled['results'], result.get("offset", 0) + 1):
         output.append(f"### Result {i}")
-        styled = _apply_style_to_row(row, comment_style)
-        for key, value in styled.items():
+        for key, value in row.items():
             value_str = str(value)
-            if len(value_str) > 300:
+            if max_tokens is None and len(value_str) > 300:
                 value_str = value_str[:300] + "..."
             output.append(f"- **{key}:** {value_str}")
         output.append("")
 
+    if max_tokens is not None:
+        elided = describe_elisions(styled["budget"])
+        output.append(f"**Budget:** {max_tokens} tokens" + (f" | **Elided:** {elided}" if elided else ""))
+
+    if result.get("next_cursor"):
+        output.append(f"**Next page:** --cursor {result['next_cursor']}")
+
     return "\n".join(output)
 
 
-def format_compact(result, comment_style=_COMMENT_STYLE_DEFAULT):
+def format_compact(result, comment_style=_COMMENT_STYLE_DEFAULT, max_tokens=None):
     """Compact format: fewer tokens, same information density"""
     output = []
     domain = result.get("domain", "")
     query = result.get("query", "")
     count = result.get("count", 0)
     style_tag = f" comment={comment_style}" if comment_style != "all" else ""
-    output.append(f"[{domain}] q=\"{query}\" found={count}{style_tag}")
+    page_tag = f" offset={result['offset']} total={result['total']}" if "total" in result else ""
+    if "keys" in result:
+        missing_tag = f" missing=\"{', '.join(result['missing'])}\"" if result["missing"] else ""
+        output.append(f"[{result.get('platform') or domain}] keys=\"{', '.join(result['keys'])}\" found={count}{missing_tag}{style_tag}")
+    else:
+        output.append(f"[{domain}] q=\"{query}\" found={count}{page_tag}{style_tag}")
 
-    for i, row in enumerate(result['results'], 1):
-        styled = _apply_style_to_row(row, comment_style)
+    styled = _apply_style_to_result(result, comment_style)
+    if max_tokens is not None:
+        header_cost = estimate_tokens(output[0]) + 8  # + budget footer
+        styled = apply_token_budget(styled, max(max_tokens - header_cost, 0), row_overhead=2, field_overhead=2)
+
+    for i, row in enumerate(styled['results'], result.get("offset", 0) + 1):
         parts = []
-        for key, value in styled.items():
+        for key, value in row.items():
             value_str = str(value).strip()
             if not value_str:
                 continue
-            if len(value_str) > 200:
+            if max_tokens is None and len(value_str) > 200:
                 value_str = value_str[:200] + "..."
             parts.append(f"{key}: {value_str}")
         output.append(f"#{i} " + " | ".join(parts))
 
+    if max_tokens is not None:
+        elided = describe_elisions(styled["budget"])
+        if elided:
+            output.append(f"elided: {elided}")
+
+    if result.get("next_cursor"):
+        output.append(f"next: --cursor {result['next_cursor']}")
+
     return "\n".join(output)
 
 
+def format_suggestions(result):
+    """One suggestion per line, terms and titles marked, best first."""
+    if "error" in result:
+        return f"Error: {result['error']}"
+    lines = [f"## Suggestions for '{result['prefix']}' ({result['count']})"]
+    for s in result["suggestions"]:
+        where = f" — {', '.join(s['domains'])}" if s.get("domains") else ""
+        lines.append(f"- {s['text']} [{s['kind']}]{where}")
+    return "\n".join(lines)
+
+
+def format_explain(result):
+    """Ranking workings of an --explain search: query rewrites, per-source term
+    statistics and pruning counts, per-result term contributions, stage timings."""
+    if "error" in result:
+        return f"Error: {result['error']}"
+    modes = [mode for mode in ("fuzzy", "fast") if result.get(mode)]
+    scope = f"{result['domain']} ({result['platform']})" if result.get("platform") else result["domain"]
+    lines = ["## Mobile Best Practices - Search Explain",
+             f"**Query:** {result['query']} → {result['cleaned']} | **Domain:** {scope} | **k:** {result['k']}"
+             + (f" | **Mode:** {', '.join(modes)}" if modes else "")]
+    if "min_token_coverage" in result:
+        lines.append(f"**Filters:** norm score ≥ {result['min_norm_score']:.2f}, token coverage ≥ {result['min_token_coverage']:.2f}")
+    lines.append("**Timings (ms):** " + " | ".join(f"{stage} {ms:.3f}" for stage, ms in result["timings_ms"].items()))
+
+    lines.append("\n### Sources")
+    for src in result["sources"]:
+        pruning = (f"{src['postings']}/{src['total_postings']} postings" if "postings" in src
+                   else f"{src.get('candidates', 0)} candidates, {src.get('scored', 0)} scored")
+        dropped = "".join(f", {n} dropped ({why})" for why, n in src["dropped"].items())
+        lines.append(f"- **{src['source']}** ({src['file']}): {src['docs']} docs, avgdl {src['avgdl']:.1f}, "
+                     f"k1={src['k1']} b={src['b']} | {pruning}, {src['ranked']} ranked{dropped}")
+        if src["query"] != result["cleaned"]:
+            lines.append(f"  expanded: {src['query']}")
+        lines.append("  " + ", ".join(f"{t['token']}" + (f"×{t['count']}" if t["count"] > 1 else "")
+                                      + (f" idf={t['idf']:.3f} df={t['df']} bound={t['bound']:.3f}" if t["idf"] is not None else " (not in vocabulary)")
+                                      for t in src["tokens"]))
+
+    for r in result["results"]:
+        exact = f", exact {r['exact_score']:.4f}" if "exact_score" in r else ""
+        lines.append(f"\n### Result {r['rank']}: {r['title']}")
+        lines.append(f"{r['source']} row {r['row_id']} | score {r['score']:.4f}{exact} | norm {r['norm_score']:.3f} | "
+                     f"coverage {r['coverage']:.2f} | dl {r['doc_len']}, length norm {r['length_norm']:.3f}")
+        for t in r["terms"]:
+            if t["tf"]:
+                lines.append(f"- {t['token']}: tf={t['tf']} idf={t['idf']:.3f} → {t['contribution']:.4f}"
+                             + (f" ×{t['count']}" if t["count"] > 1 else ""))
+        missing = [t["token"] for t in r["terms"] if not t["tf"]]
+        if missing:
+            lines.append(f"- not matched: {', '.join(missing)}")
+    return "\n".join(lines)
+
+
+def format_json(result, max_tokens=None):
+    """JSON output; with *max_tokens* the results are packed into the budget first.
+
+    The budget covers the whole document: the rows get what the envelope
+    (every other key plus the budget report) leaves, measured at the output
+    indent, and are repacked tighter while the serialised result still
+    overruns.  ``budget.used`` is the estimate for the whole output.
+    """
+    import json
+
+    def dump(value):
+        return json.dumps(value, indent=2, ensure_ascii=False)
+
+    if max_tokens is None or "results" not in result:
+        return dump(result)
+    report = {"max_tokens": max_tokens, "used": max_tokens, "elided_results": len(result["results"]),
+              "elided_fields": {}, "truncated_fields": 0, "over_budget": False}
+    room = max(max_tokens - estimate_tokens(dump(dict(result, results=[], budget=report))), 0)
+    while True:
+        packed = apply_token_budget(result, room, row_overhead=2, field_overhead=4)
+        budget = packed["budget"]
+        budget["max_tokens"] = max_tokens
+        text = dump(packed)
+        # Settle "used" on the size of the text that reports it
+        for _ in range(3):
+            used = estimate_tokens(text)
+            if budget["used"] == used:
+                break
+            budget["used"] = used
+            text = dump(packed)
+        if budget["used"] <= max_tokens or room == 0:
+            if budget["used"] > max_tokens and not budget["over_budget"]:
+                budget["over_budget"] = True
+                text = dump(packed)
+            return text
+        room = max(room - (budget["used"] - max_tokens), 0)
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Mobile Best Practices Search")
-    parser.add_argument("query", help="Search query")
+    parser.add_argument("query", nargs="?", help="Search query (optional with --manifest)")
     parser.add_argument("--domain", "-d", choices=list(CSV_CONFIG.keys()), help="Search domain")
     parser.add_argument("--platform", "-p", choices=AVAILABLE_PLATFORMS, help="Platform-specific search (android, ios, flutter, react-native)")
     parser.add_argument("--stack", "-s", choices=AVAILABLE_STACKS, help="Stack-specific search (compose, swiftui, flutter, react-native, etc.)")
@@ -121,21 +269,114 @@ if __name__ == "__main__":
             "'important' = keep only comments with NOTE/WARNING/WHY/IMPORTANT/etc."
         )
     )
+    parser.add_argument("--max-tokens", "-mt", type=int, default=None, help="Token budget for the output: packs the best results and fields into N tokens, dropping URLs first, and reports what was elided")
     parser.add_argument("--all-domains", "-a", action="store_true", help="Search across all domains at once, ranked by normalised BM25 score")
     parser.add_argument("--fuzzy", "-f", action="store_true", help="Enable fuzzy search: tolerates typos and near-matches via bigram expansion")
+    parser.add_argument("--fast", action="store_true", help="Approximate ranking from 8-bit quantised impacts with bounded work per query (for autocomplete / high-volume callers)")
+    parser.add_argument("--backend", choices=BACKENDS, default="python", help="Ranking engine for domain, platform, stack and --all-domains searches: in-memory BM25 (default) or the SQLite FTS5 database under data/.index/")
+    parser.add_argument("--code", action="store_true", help="Search the code columns of every domain with an identifier-aware tokenizer (camelCase, snake_case, @annotations, imports)")
+    parser.add_argument("--symbol", action="store_true", help="Treat the query as a symbol and list every code field using it, e.g. collectAsStateWithLifecycle, @Composable, androidx.lifecycle")
+    parser.add_argument("--offset", type=int, default=None, help="Skip the first N ranked results (domain and platform searches); the output includes a cursor for the next page")
+    parser.add_argument("--cursor", help="Fetch the next page of an earlier --offset / --cursor search (the query is taken from the cursor)")
+    parser.add_argument("--explain", action="store_true", help="Show how the search ranked its results: cleaned/expanded query, per-term IDF, tf, length normalisation and contributions, coverage, candidate counts and stage timings")
+    parser.add_argument("--id", "--name", dest="keys", nargs="+", metavar="KEY", help="Fetch entries by exact ID / Name (snippet ID, library or Gradle name, Version Catalog Key, guideline, ...) without ranking; several keys in one call, case-insensitive. Takes --domain or --platform, otherwise every domain")
+    parser.add_argument("--related", metavar="ROW_ID", help="List the entries of other domains most closely linked to ROW_ID in the precomputed relation graph: <domain>:<row> as --code and blueprints report it, or <domain>:<ID / Name>, e.g. snippet:viewmodel_basic. Takes --domain, --filter-platform and -n")
+    parser.add_argument("--suggest", action="store_true", help="Treat the query as a prefix and list completions (terms and entry titles); -n sets the count (default: 10)")
+    parser.add_argument("--metrics", nargs="?", const="prometheus", choices=["prometheus", "json"], help="Print this process's search metrics (latency histograms, cache hits, index builds and memory) as Prometheus text (default) or JSON: to stderr after a query, to stdout on their own (all indexes loaded)")
     parser.add_argument("--persist", action="store_true", help="Save results to architecture blueprint file")
     parser.add_argument("--project-name", "-pn", help="Project name for blueprint (default: MyApp)")
     parser.add_argument("--page", help="Generate page-specific blueprint override")
+    parser.add_argument("--manifest", help="With --persist: JSON/YAML/CSV manifest of page -> query; generates MASTER.md and every page in one run")
+    parser.add_argument("--workers", type=int, default=0, help="Processes for --manifest lookups (default: auto, 1 = single process)")
 
     args = parser.parse_args()
+    metrics_only = bool(args.metrics) and args.query is None and not args.cursor and not args.manifest
+    metrics_only = metrics_only and not args.keys and not args.related
+    if args.query is None and not (args.persist and args.manifest) and not args.cursor and not metrics_only and not args.keys and not args.related:
+        parser.error("the following arguments are required: query")
+    if (args.offset is not None or args.cursor) and (args.all_domains or args.stack or args.code or args.symbol or args.suggest or args.persist):
+        parser.error("--offset / --cursor page domain and platform searches only")
+    if args.max_results is not None and args.max_results < 1:
+        parser.error("--max-results must be at least 1")
+    if args.explain and (args.stack or args.code or args.symbol or args.suggest or args.persist or args.offset is not None or args.cursor):
+        parser.error("--explain explains domain, platform and --all-domains searches only")
+    if args.keys and (args.query is not None or args.stack or args.code or args.symbol or args.suggest or args.persist or args.explain
+                      or args.offset is not None or args.cursor or args.fuzzy or args.fast or args.filter_platform or args.max_results is not None):
+        parser.error("--id / --name fetch entries by key: no query or search options, only --domain or --platform")
+    if args.related and (args.query is not None or args.keys or args.platform or args.stack or args.all_domains or args.code or args.symbol
+                         or args.suggest or args.persist or args.explain or args.offset is not None or args.cursor or args.fuzzy or args.fast):
+        parser.error("--related follows relation graph links: no query or search options, only --domain, --filter-platform and -n")
+    if args.backend == "sqlite" and (args.offset is not None or args.cursor or args.persist or args.manifest or args.keys or args.related
+                                     or args.code or args.symbol or args.suggest or args.explain):
+        parser.error("--backend sqlite ranks domain, platform, stack and --all-domains searches only: "
+                     "not with --offset, --cursor, --persist, --manifest, --id, --name, --related, --code, --symbol, --suggest or --explain")
     cs = args.comment_style  # shorthand
+    kb = default_knowledge_base() if args.backend == "python" else KnowledgeBase(backend=args.backend)
     # Resolve max_results: use explicit -n value, else domain-appropriate default
     max_results = args.max_results if args.max_results is not None else (
         ALL_DOMAINS_MAX_RESULTS if args.all_domains else MAX_RESULTS
     )
 
+    # Metrics of a warm process: every index loaded
+    if metrics_only:
+        for path, cols in kb.sources():
+            if path.exists():
+                kb.index(path, cols)
+        print(kb.metrics.render(args.metrics), end="")
+    # Exact-key lookup
+    elif args.keys:
+        result = kb.get(None if args.all_domains else args.domain, args.keys, platform=args.platform)
+        if args.json:
+            print(format_json(result, max_tokens=args.max_tokens))
+        else:
+            print(format_output(result, compact=args.compact, comment_style=cs, max_tokens=args.max_tokens))
+    # Relation graph neighbours
+    elif args.related:
+        result = kb.related(args.related, max_results, domain=args.domain, filter_platform=args.filter_platform)
+        if args.json:
+            print(format_json(result, max_tokens=args.max_tokens))
+        else:
+            print(format_output(result, compact=args.compact, comment_style=cs, max_tokens=args.max_tokens))
+    # Next page of an earlier paged search
+    elif args.cursor:
+        result = kb.search_page(args.cursor, args.max_results)
+        if args.json:
+            print(format_json(result, max_tokens=args.max_tokens))
+        else:
+            print(format_output(result, compact=args.compact, comment_style=cs, max_tokens=args.max_tokens))
+    # Ranking explanation
+    elif args.explain:
+        result = kb.explain(args.query, "all" if args.all_domains else args.domain, max_results, filter_platform=args.filter_platform,
+                            fuzzy=args.fuzzy, fast=args.fast, platform=None if args.all_domains else args.platform)
+        print(format_json(result) if args.json else format_explain(result))
+    # Autocomplete mode
+    elif args.suggest:
+        result = kb.suggest(args.query, args.max_results if args.max_results is not None else 10)
+        print(format_json(result) if args.json else format_suggestions(result))
+    # Code search / symbol lookup
+    elif args.code or args.symbol:
+        lookup = kb.find_symbol if args.symbol else kb.search_code
+        result = lookup(args.query, max_results, filter_platform=args.filter_platform)
+        if args.json:
+            print(format_json(result, max_tokens=args.max_tokens))
+        else:
+            print(format_output(result, compact=args.compact, comment_style=cs, max_tokens=args.max_tokens))
+    # Bulk persist mode
+    elif args.persist and args.manifest:
+        result = persist_blueprint_manifest(
+            args.manifest,
+            project_name=args.project_name,
+            query=args.query,
+            workers=args.workers
+        )
+        if args.json or "error" in result:
+            print(format_json(result))
+        else:
+            for f in result["files"]:
+                print(f"{'Saved' if f['written'] else 'Unchanged'}: {f['file']} ({f['total_entries']} entries)")
+            print(f"Files written: {result['written']}/{len(result['files'])} | Distinct lookups: {result['lookups']}")
     # Persist mode
-    if args.persist:
+    elif args.persist:
         result = persist_blueprint(
             args.query,
             project_name=args.project_name,
@@ -145,37 +386,42 @@ if __name__ == "__main__":
             import json
             print(json.dumps(result, indent=2, ensure_ascii=False))
         else:
-            print(f"Blueprint saved to: {result['file']}")
+            if result["written"]:
+                print(f"Blueprint saved to: {result['file']}")
+                if result["changed_sections"]:
+                    print(f"Updated sections: {', '.join(result['changed_sections'])}")
+            else:
+                print(f"Blueprint unchanged: {result['file']}")
             print(f"Sections: {', '.join(result['sections'])}")
             print(f"Total entries: {result['total_entries']}")
     # Cross-domain search
     elif args.all_domains:
-        result = search_all_domains(args.query, max_results, fuzzy=args.fuzzy, filter_platform=args.filter_platform)
+        result = kb.search_all_domains(args.query, max_results, fuzzy=args.fuzzy, fast=args.fast, filter_platform=args.filter_platform)
         if args.json:
-            import json
-            print(json.dumps(result, indent=2, ensure_ascii=False))
+            print(format_json(result, max_tokens=args.max_tokens))
         else:
-            print(format_output(result, compact=args.compact, comment_style=cs))
+            print(format_output(result, compact=args.compact, comment_style=cs, max_tokens=args.max_tokens))
     # Stack search
     elif args.stack:
-        result = search_stack(args.query, args.stack, max_results, fuzzy=args.fuzzy)
+        result = kb.search_stack(args.query, args.stack, max_results, fuzzy=args.fuzzy, fast=args.fast)
         if args.json:
-            import json
-            print(json.dumps(result, indent=2, ensure_ascii=False))
+            print(format_json(result, max_tokens=args.max_tokens))
         else:
-            print(format_output(result, compact=args.compact, comment_style=cs))
+            print(format_output(result, compact=args.compact, comment_style=cs, max_tokens=args.max_tokens))
     # Platform search takes priority
     elif args.platform:
-        result = search_platform(args.query, args.platform, max_results, fuzzy=args.fuzzy)
+        result = kb.search_platform(args.query, args.platform, max_results, fuzzy=args.fuzzy, fast=args.fast, offset=args.offset)
         if args.json:
-            import json
-            print(json.dumps(result, indent=2, ensure_ascii=False))
+            print(format_json(result, max_tokens=args.max_tokens))
         else:
-            print(format_output(result, compact=args.compact, comment_style=cs))
+            print(format_output(result, compact=args.compact, comment_style=cs, max_tokens=args.max_tokens))
     else:
-        result = search(args.query, args.domain, max_results, filter_platform=args.filter_platform, fuzzy=args.fuzzy)
+        result = kb.search(args.query, args.domain, max_results, filter_platform=args.filter_platform, fuzzy=args.fuzzy, fast=args.fast, offset=args.offset)
         if args.json:
-            import json
-            print(json.dumps(result, indent=2, ensure_ascii=False))
+            print(format_json(result, max_tokens=args.max_tokens))
         else:
-            print(format_output(result, compact=args.compact, comment_style=cs))
+            print(format_output(result, compact=args.compact, comment_style=cs, max_tokens=args.max_tokens))
+
+    if args.metrics and not metrics_only:
+        # stderr, so the results on stdout stay parseable
+        print(kb.metrics.render(args.metrics), end="", file=sys.stderr)